@@ -13,10 +13,47 @@ def _env_bool(name: str, default: bool = False) -> bool:
     return raw.strip().lower() in ("true", "1", "t", "yes", "y", "on")
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./drivium.db")
+# Read replicas (comma-separated, same URL format) for folder listings, download URLs and /users/me; empty = primary only
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# A replica further behind the primary than this gets no reads until it catches up
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# How often the primary's heartbeat row is written and each replica's copy of it read back
+REPLICA_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("REPLICA_HEARTBEAT_INTERVAL_SECONDS", "1"))
+# After a user's write, their reads go to the primary until a replica has it, for at most this long
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "30"))
+REPLICA_STICKY_MAX_USERS = int(os.getenv("REPLICA_STICKY_MAX_USERS", "100000"))
+
+# Connection pool (per worker process; total connections = workers * (size + overflow))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))  # -1 disables
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", default=True)
+
+# Schema migrations run with `python -m app.migrate`; startup only checks the schema version
+# unless MIGRATE_ON_STARTUP is set (handy for SQLite and local development)
+MIGRATE_ON_STARTUP = _env_bool("MIGRATE_ON_STARTUP", default=False)
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))  # rows per backfill transaction
+# How long DDL may wait for a table lock before failing, instead of stalling the queries queued behind it
+MIGRATION_LOCK_TIMEOUT_SECONDS = float(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", "5"))
 
 SECRET_KEY = os.getenv("SECRET_KEY", "snaddad1asvxdcasdas9uasdnu9asd")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
+# "jose" (python-jose) or "pyjwt" (requires the PyJWT package, decodes faster); tokens are the same either way
+JWT_BACKEND = os.getenv("JWT_BACKEND", "jose").strip().lower()
+# Verified tokens are remembered by digest, so repeat requests skip the decode; never past the token's exp
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Argon2id parameters for new hashes; hashes made with other parameters are upgraded on the next login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST_KIB = int(os.getenv("ARGON2_MEMORY_COST_KIB", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+# Threads hashing passwords at once (each holds ARGON2_MEMORY_COST_KIB while it runs)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hashes allowed to wait for a thread; beyond that logins and sign-ups get 503 straight away
+PASSWORD_HASH_QUEUE_MAX = int(os.getenv("PASSWORD_HASH_QUEUE_MAX", "16"))
 
 PROJECT_NAME = os.getenv("PROJECT_NAME", "Drivium")
 PROJECT_DESCRIPTION = os.getenv("PROJECT_DESCRIPTION", "Google Drive clone")
@@ -24,6 +61,13 @@ DEBUG = os.getenv("DEBUG", "True").lower() in ("true", "1", "t")
 
 FILENAME_PATTERN = os.getenv("FILENAME_PATTERN", r"^[a-zA-Z0-9_\-\.() ]+$")
 
+# Adds a Server-Timing header (db time, pool wait, total) to every response
+SERVER_TIMING_ENABLED = _env_bool("SERVER_TIMING_ENABLED", default=DEBUG)
+# Prometheus histograms per route and the /metrics endpoint
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", default=True)
+# Bearer token for /health/stats and /metrics; empty disables both
+MONITORING_TOKEN = os.getenv("MONITORING_TOKEN", "")
+
 # CORS Configuration
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173,http://localhost:5174").split(",")
 CORS_ALLOW_CREDENTIALS = os.getenv("CORS_ALLOW_CREDENTIALS", "true").lower() in ("true", "1", "t")
@@ -31,6 +75,20 @@ CORS_ALLOW_METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
 CORS_ALLOW_HEADERS = ["*"]
 
 MAX_FILE_SIZE_BYTES = int(os.getenv("MAX_FILE_SIZE_BYTES", str(10 * 1024 * 1024 * 1024)))  # 10 GB default
+UPLOAD_BATCH_MAX_FILES = int(os.getenv("UPLOAD_BATCH_MAX_FILES", "1000"))
+UPLOAD_BATCH_MAX_DEPTH = int(os.getenv("UPLOAD_BATCH_MAX_DEPTH", "32"))
+# stat_object calls in flight at once while a batch confirm checks its objects
+UPLOAD_VERIFY_CONCURRENCY = int(os.getenv("UPLOAD_VERIFY_CONCURRENCY", "16"))
+# Shared secret MinIO sends with bucket notifications; empty disables /hooks/minio
+STORAGE_WEBHOOK_TOKEN = os.getenv("STORAGE_WEBHOOK_TOKEN", "")
+# Storage quota per user when user_account.storage_quota is NULL; 0 = unlimited
+DEFAULT_STORAGE_QUOTA_BYTES = int(os.getenv("DEFAULT_STORAGE_QUOTA_BYTES", "0"))
+# Content-hash dedup of uploads that declare a sha256: "off", "user" (reuse only the uploader's
+# own verified objects) or "global" (reuse any user's; lets a client probe whether content exists)
+DEDUP_SCOPE = os.getenv("DEDUP_SCOPE", "user").strip().lower()
+MULTIPART_MIN_PART_SIZE_BYTES = max(int(os.getenv("MULTIPART_MIN_PART_SIZE_BYTES", str(16 * 1024 * 1024))), 5 * 1024 * 1024)  # S3 minimum is 5 MiB
+MULTIPART_MAX_PARTS = min(int(os.getenv("MULTIPART_MAX_PARTS", "10000")), 10000)  # S3 maximum is 10000
+MULTIPART_PRESIGN_MAX_PARTS = int(os.getenv("MULTIPART_PRESIGN_MAX_PARTS", "1000"))  # part URLs signed per request
 
 ALLOWED_MIME_TYPES_DEFAULT = [
     "application/x-msdownload", "application/x-msi", "application/x-executable",
@@ -85,9 +143,86 @@ MINIO_PASS = MINIO_SECRET_KEY
 MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "drivium")
 MINIO_SECURE = _env_bool("MINIO_SECURE", default=False)
 MINIO_PUBLIC_PREFIX = os.getenv("MINIO_PUBLIC_PREFIX", "/storage")
+# Region is fixed so presigning never needs a bucket-location round trip; empty = ask the server
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1").strip() or None
+MINIO_POOL_MAXSIZE = int(os.getenv("MINIO_POOL_MAXSIZE", "50"))  # connections kept per client profile
+MINIO_TCP_KEEPALIVE = _env_bool("MINIO_TCP_KEEPALIVE", default=True)
+MINIO_CONNECT_TIMEOUT_SECONDS = float(os.getenv("MINIO_CONNECT_TIMEOUT_SECONDS", "2.0"))
+MINIO_RETRIES = int(os.getenv("MINIO_RETRIES", "1"))
+# "default" profile: presign, stat, single-object calls; "bulk" profile: batch deletes, listings, multipart
+MINIO_READ_TIMEOUT_SECONDS = float(os.getenv("MINIO_READ_TIMEOUT_SECONDS", "3.0"))
+MINIO_BULK_READ_TIMEOUT_SECONDS = float(os.getenv("MINIO_BULK_READ_TIMEOUT_SECONDS", "30.0"))
+# Circuit breaker: after this many consecutive connection failures storage calls fail fast
+MINIO_BREAKER_FAILURE_THRESHOLD = int(os.getenv("MINIO_BREAKER_FAILURE_THRESHOLD", "5"))
+MINIO_BREAKER_RESET_SECONDS = float(os.getenv("MINIO_BREAKER_RESET_SECONDS", "15"))
 HEALTH_CHECK_TIMEOUT_SECONDS = float(
     os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", os.getenv("HEALTH_CHECK_TIMEOUT", "6.0"))
 )
+# /health serves the result of a background probe refreshed on this interval
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+# a cached result older than this is not trusted (the prober is stuck or not running)
+HEALTH_STALE_AFTER_SECONDS = float(os.getenv("HEALTH_STALE_AFTER_SECONDS", "30"))
 
 PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES: int = 60
-PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES: int = 60
\ No newline at end of file
+PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES: int = 60
+
+# Download URL cache: a signed URL is reused while more than this fraction of its lifetime is left
+DOWNLOAD_URL_CACHE_MAX_ENTRIES = int(os.getenv("DOWNLOAD_URL_CACHE_MAX_ENTRIES", "50000"))
+DOWNLOAD_URL_REUSE_FRACTION = min(max(float(os.getenv("DOWNLOAD_URL_REUSE_FRACTION", "0.5")), 0.0), 1.0)
+DOWNLOAD_URLS_BATCH_MAX = int(os.getenv("DOWNLOAD_URLS_BATCH_MAX", "500"))
+
+# Bulk operations (S3 DeleteObjects accepts at most 1000 keys per request)
+STORAGE_DELETE_BATCH_SIZE = min(int(os.getenv("STORAGE_DELETE_BATCH_SIZE", "1000")), 1000)
+DB_DELETE_BATCH_SIZE = int(os.getenv("DB_DELETE_BATCH_SIZE", "1000"))
+
+# Background jobs
+JOB_RUN_IN_PROCESS = _env_bool("JOB_RUN_IN_PROCESS", default=True)
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "1000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5.0"))
+
+# Storage garbage collection (stale PENDING uploads, objects without a database row)
+GC_INTERVAL_MINUTES = int(os.getenv("GC_INTERVAL_MINUTES", "0"))  # 0 = only runs queued by hand
+GC_DRY_RUN = _env_bool("GC_DRY_RUN", default=False)  # scheduled runs only report what they would remove
+GC_PENDING_GRACE_MINUTES = int(os.getenv("GC_PENDING_GRACE_MINUTES", "60"))  # on top of the upload URL lifetime
+GC_MULTIPART_STALE_HOURS = int(os.getenv("GC_MULTIPART_STALE_HOURS", "24"))
+GC_ORPHAN_MIN_AGE_MINUTES = int(os.getenv("GC_ORPHAN_MIN_AGE_MINUTES", "60"))
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "500"))
+GC_DELETE_RATE = float(os.getenv("GC_DELETE_RATE", "100"))  # objects removed per second; 0 = unlimited
+GC_LIST_RATE = float(os.getenv("GC_LIST_RATE", "1000"))  # objects listed per second; 0 = unlimited
+
+# Folder listing
+FOLDER_PAGE_SIZE_MAX = int(os.getenv("FOLDER_PAGE_SIZE_MAX", "1000"))
+FOLDER_STREAM_BATCH_SIZE = int(os.getenv("FOLDER_STREAM_BATCH_SIZE", "500"))
+
+# Archive downloads (folders and selections streamed as ZIP)
+ARCHIVE_MAX_FILES = int(os.getenv("ARCHIVE_MAX_FILES", "100000"))
+ARCHIVE_SELECTION_MAX = int(os.getenv("ARCHIVE_SELECTION_MAX", "1000"))  # ids per selection request
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", str(1024 * 1024)))  # bytes per storage read; smaller objects are read whole
+ARCHIVE_PREFETCH = int(os.getenv("ARCHIVE_PREFETCH", "8"))  # objects opened ahead of the one being written
+
+# Thumbnails: WebP derivatives of images, rendered by a background job once an upload is confirmed
+THUMBNAILS_ENABLED = _env_bool("THUMBNAILS_ENABLED", default=True)
+THUMBNAIL_SIZES = sorted({int(size) for size in os.getenv("THUMBNAIL_SIZES", "256,1024").split(",") if size.strip()})  # longest edge, px
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_MIME_TYPES = os.getenv(
+    "THUMBNAIL_MIME_TYPES", "image/jpeg,image/png,image/gif,image/webp,image/bmp,image/tiff"
+).split(",")
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(50 * 1024 * 1024)))  # larger originals get no thumbnails
+THUMBNAIL_MAX_PIXELS = int(os.getenv("THUMBNAIL_MAX_PIXELS", "100000000"))  # decompression bomb guard
+THUMBNAIL_PROCESSES = int(os.getenv("THUMBNAIL_PROCESSES", "2"))  # render processes per worker process
+THUMBNAIL_BATCH_SIZE = int(os.getenv("THUMBNAIL_BATCH_SIZE", "8"))  # files per job chunk
+
+# Search: pg_trgm indexes on Postgres, an in-process trigram index per user elsewhere (SQLite dev)
+SEARCH_PAGE_SIZE_MAX = int(os.getenv("SEARCH_PAGE_SIZE_MAX", "100"))
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", "60"))
+SEARCH_INDEX_MAX_OWNERS = int(os.getenv("SEARCH_INDEX_MAX_OWNERS", "100"))
+
+# Authenticated-user cache: "memory" (per process), "redis" (shared between workers) or "none"
+PRINCIPAL_CACHE_BACKEND = os.getenv("PRINCIPAL_CACHE_BACKEND", "memory").strip().lower()
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -1,22 +1,40 @@
 import asyncio
+import logging
+import time
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import JSONResponse
 from minio.error import S3Error
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.registry import Collector
 from sqlalchemy import text
 from starlette.concurrency import run_in_threadpool
 
-from app.core.config import HEALTH_CHECK_TIMEOUT_SECONDS, MINIO_BUCKET_NAME
+from app.core.config import (
+    HEALTH_CHECK_TIMEOUT_SECONDS,
+    HEALTH_PROBE_INTERVAL_SECONDS,
+    HEALTH_STALE_AFTER_SECONDS,
+    METRICS_ENABLED,
+    MINIO_BUCKET_NAME,
+)
+from app.core.principal_cache import principal_cache
+from app.core.security import verified_tokens
 from app.database.database import engine
-from app.database.minio import init_minio_client
+from app.database.pool import LatencyHistogram, pool_stats
+from app.database.replicas import replica_router
+from app.database.minio import init_minio_client, is_connection_error, minio_breaker, minio_pool_stats
+from app.services.drive import download_url_cache
+from app.dependencies import verify_monitoring_token
 
 router = APIRouter(tags=["System"])
 
 
-def _check_database_sync() -> dict[str, object]:
+async def _check_database() -> dict[str, object]:
     try:
-        with engine.connect() as connection:
-            connection.execute(text("SELECT 1"))
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
         return {"status": "ok"}
     except Exception as exc:
         return {
@@ -27,12 +45,20 @@ def _check_database_sync() -> dict[str, object]:
 
 def _check_minio_sync() -> dict[str, object]:
     try:
-        minio_client = init_minio_client()
-        bucket_exists = minio_client.bucket_exists(MINIO_BUCKET_NAME)
+        # the probe bypasses the breaker so it can notice MinIO coming back and close it
+        minio_client = init_minio_client(use_breaker=False)
+        try:
+            bucket_exists = minio_client.bucket_exists(MINIO_BUCKET_NAME)
+        except Exception as exc:
+            if is_connection_error(exc):
+                minio_breaker.record_failure()
+            raise
+        minio_breaker.record_success()
         return {
             "status": "ok",
             "bucket": MINIO_BUCKET_NAME,
             "bucket_exists": bucket_exists,
+            "circuit": minio_breaker.state,
         }
     except HTTPException as exc:
         if isinstance(exc.detail, dict):
@@ -56,12 +82,9 @@ def _check_minio_sync() -> dict[str, object]:
         }
 
 
-async def _run_check_with_timeout(check_name: str, check_fn) -> dict[str, object]:
+async def _run_check_with_timeout(check_name: str, check_coro) -> dict[str, object]:
     try:
-        return await asyncio.wait_for(
-            run_in_threadpool(check_fn),
-            timeout=HEALTH_CHECK_TIMEOUT_SECONDS,
-        )
+        return await asyncio.wait_for(check_coro, timeout=HEALTH_CHECK_TIMEOUT_SECONDS)
     except asyncio.TimeoutError:
         return {
             "status": "error",
@@ -70,23 +93,208 @@ async def _run_check_with_timeout(check_name: str, check_fn) -> dict[str, object
         }
 
 
-@router.get("/health")
-async def health_check() -> JSONResponse:
-    db_task = asyncio.create_task(_run_check_with_timeout("database", _check_database_sync))
-    minio_task = asyncio.create_task(_run_check_with_timeout("minio", _check_minio_sync))
+class HealthProber:
+    """Probes the database and MinIO in the background and keeps the last result.
 
-    db_result, minio_result = await asyncio.gather(db_task, minio_task)
+    Health endpoints read the cached result, so probe traffic from load balancers and
+    the frontend never reaches the dependencies. Refreshes are single-flight, and a MinIO
+    check that outlives its timeout keeps its thread; the next probe reports it as still
+    running instead of piling up another blocked thread.
+    """
 
-    checks = {
-        "database": db_result,
-        "minio": minio_result,
-    }
-    overall_ok = all(result.get("status") == "ok" for result in checks.values())
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL_SECONDS, stale_after: float = HEALTH_STALE_AFTER_SECONDS):
+        self.interval = interval
+        self.stale_after = stale_after
+        self._checks: dict[str, dict[str, object]] | None = None
+        self._checked_at: datetime | None = None
+        self._checked_monotonic = 0.0
+        self._refreshing: asyncio.Task | None = None
+        self._minio_inflight: asyncio.Future | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="health-prober")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logging.exception("Health probe failed")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> None:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._probe())
+        await asyncio.shield(self._refreshing)
+
+    async def _probe(self) -> None:
+        db_result, minio_result = await asyncio.gather(
+            _run_check_with_timeout("database", _check_database()),
+            self._check_minio(),
+        )
+        self._checks = {
+            "database": db_result,
+            "minio": minio_result,
+        }
+        self._checked_at = datetime.now(timezone.utc)
+        self._checked_monotonic = time.monotonic()
+
+    async def _check_minio(self) -> dict[str, object]:
+        if self._minio_inflight is not None and not self._minio_inflight.done():
+            return {
+                "status": "error",
+                "message": "previous minio check is still running",
+            }
+        self._minio_inflight = asyncio.ensure_future(run_in_threadpool(_check_minio_sync))
+        return await _run_check_with_timeout("minio", asyncio.shield(self._minio_inflight))
+
+    def age_seconds(self) -> float | None:
+        if self._checks is None:
+            return None
+        return time.monotonic() - self._checked_monotonic
+
+    async def snapshot(self) -> dict[str, object]:
+        age = self.age_seconds()
+        if age is None or age > self.stale_after:
+            # first call before the prober ran, or the prober is not running: probe inline
+            await self.refresh()
+            age = self.age_seconds()
+        return {
+            "checks": self._checks,
+            "checked_at": self._checked_at.isoformat(),
+            "age_seconds": round(age, 3),
+        }
+
+
+health_prober = HealthProber()
+
+
+@router.get("/health")
+async def health_check() -> JSONResponse:
+    result = await health_prober.snapshot()
+    overall_ok = all(check.get("status") == "ok" for check in result["checks"].values())
 
     return JSONResponse(
         status_code=200 if overall_ok else 503,
         content={
             "status": "ok" if overall_ok else "degraded",
-            "checks": checks,
+            **result,
         },
+        headers={"Cache-Control": "no-store"},
     )
+
+
+# Liveness: the process and its event loop respond; never touches dependencies
+@router.get("/health/live")
+async def liveness() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+# Readiness: the last probe saw the database, which every API route needs. MinIO is
+# reported but does not take the instance out of rotation, since listings and auth work without it.
+@router.get("/health/ready")
+async def readiness() -> JSONResponse:
+    age = health_prober.age_seconds()
+    if age is None or age > health_prober.stale_after:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unknown", "age_seconds": None if age is None else round(age, 3)},
+            headers={"Cache-Control": "no-store"},
+        )
+
+    result = await health_prober.snapshot()
+    ready = result["checks"]["database"].get("status") == "ok"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ok" if ready else "not_ready",
+            **result,
+        },
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+# In-process counters, useful to confirm caches are taking load off the database
+@router.get("/health/stats", dependencies=[Depends(verify_monitoring_token)])
+async def health_stats() -> dict[str, object]:
+    return {
+        "principal_cache": principal_cache.stats(),
+        "token_cache": verified_tokens.stats(),
+        "download_url_cache": download_url_cache.stats(),
+        "database_pool": pool_stats.snapshot(engine.pool),
+        "database_replicas": replica_router.stats(),
+        "minio_pools": minio_pool_stats(),
+        "minio_circuit": minio_breaker.stats(),
+    }
+
+
+def _histogram_seconds(name: str, documentation: str, histogram: LatencyHistogram) -> HistogramMetricFamily:
+    buckets, total_ms = histogram.cumulative()
+    return HistogramMetricFamily(
+        name,
+        documentation,
+        buckets=[("+Inf" if bound == float("inf") else str(bound / 1000), count) for bound, count in buckets],
+        sum_value=total_ms / 1000,
+    )
+
+
+class _RuntimeStatsCollector(Collector):
+    """Exports the /health/stats counters at scrape time, so the hot paths keep their plain counters."""
+
+    def collect(self):
+        pool = engine.pool
+        if hasattr(pool, "checkedout"):
+            yield GaugeMetricFamily("drivium_db_pool_size", "Configured persistent connections", value=pool.size())
+            yield GaugeMetricFamily("drivium_db_pool_checked_out", "Connections currently in use", value=pool.checkedout())
+            yield GaugeMetricFamily("drivium_db_pool_overflow", "Overflow connections currently open", value=max(pool.overflow(), 0))
+        yield CounterMetricFamily("drivium_db_pool_checkout_timeouts", "Checkouts that gave up waiting for a connection", value=pool_stats.checkout_timeouts)
+        yield _histogram_seconds("drivium_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", pool_stats.checkout_wait)
+
+        if replica_router.enabled:
+            replicas = replica_router.stats()
+            reads = CounterMetricFamily("drivium_db_reads", "Read-only sessions by where they were routed and why", labels=["target"])
+            for target in ("replica", "sticky", "lagging"):
+                reads.add_metric([target], replicas[f"{target}_reads"])
+            yield reads
+            lag = GaugeMetricFamily("drivium_db_replica_lag_seconds", "Replica lag measured from the heartbeat row", labels=["replica"])
+            for replica in replicas["replicas"]:
+                if replica["lag_seconds"] is not None:
+                    lag.add_metric([replica["name"]], replica["lag_seconds"])
+            yield lag
+
+        in_use = GaugeMetricFamily("drivium_minio_pool_in_use", "MinIO connections checked out, per client profile", labels=["profile"])
+        maxsize = GaugeMetricFamily("drivium_minio_pool_maxsize", "MinIO connections kept per client profile", labels=["profile"])
+        for profile, stats in minio_pool_stats().items():
+            in_use.add_metric([profile], stats["in_use"])
+            maxsize.add_metric([profile], stats["maxsize"])
+        yield in_use
+        yield maxsize
+        yield GaugeMetricFamily("drivium_minio_circuit_open", "1 while the MinIO circuit breaker rejects calls", value=int(minio_breaker.state == minio_breaker.OPEN))
+        yield CounterMetricFamily("drivium_minio_circuit_rejected", "Storage calls rejected by the open circuit", value=minio_breaker.rejected)
+
+        caches = {"principal": principal_cache.stats(), "token": verified_tokens.stats(), "download_url": download_url_cache.stats()}
+        for counter in ("hits", "misses", "evictions"):
+            metric = CounterMetricFamily(f"drivium_cache_{counter}", f"Cache {counter}", labels=["cache"])
+            for cache_name, stats in caches.items():
+                if counter in stats:
+                    metric.add_metric([cache_name], stats[counter])
+            yield metric
+
+
+if METRICS_ENABLED:
+    REGISTRY.register(_RuntimeStatsCollector())
+
+    @router.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_monitoring_token)])
+    async def metrics() -> Response:
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,33 @@
+"""Thumbnail rendering. Runs in worker processes, so it imports nothing from the app."""
+import io
+from typing import Dict, List
+
+
+class UnsupportedImage(Exception):
+    """The source can't be decoded, or is too large to decode safely."""
+
+
+def render_thumbnails(data: bytes, sizes: List[int], quality: int, max_pixels: int) -> Dict[int, bytes]:
+    """WebP thumbnails of an image, one per size (longest edge in pixels), never upscaled."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, much faster than decoding in full
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise UnsupportedImage(str(e)) from e
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    results = {}
+    # largest first, so each smaller size is resampled from the previous one instead of the original
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+        results[size] = buffer.getvalue()
+    return results
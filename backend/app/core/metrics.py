@@ -0,0 +1,42 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Histogram
+
+# Request metrics are labelled by route template (e.g. /drive/files/{file_id}), never by raw path,
+# so cardinality stays bounded by the number of routes.
+HTTP_REQUEST_DURATION = Histogram(
+    "drivium_http_request_duration_seconds",
+    "Time from request start to the end of the response body",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_REQUEST_DB_STATEMENTS = Histogram(
+    "drivium_http_request_db_statements",
+    "SQL statements executed while handling a request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233),
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "drivium_http_request_db_seconds",
+    "Time spent executing SQL while handling a request",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+STORAGE_OPERATION_DURATION = Histogram(
+    "drivium_storage_operation_seconds",
+    "Duration of object storage calls made by the drive service",
+    ["operation", "outcome"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+@contextmanager
+def time_storage_operation(operation: str):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        STORAGE_OPERATION_DURATION.labels(operation, outcome).observe(time.perf_counter() - started)
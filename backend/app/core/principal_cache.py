@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from app.core.cache import TTLCache
+from app.core.config import (
+    PRINCIPAL_CACHE_BACKEND,
+    PRINCIPAL_CACHE_MAX_ENTRIES,
+    PRINCIPAL_CACHE_TTL_SECONDS,
+    REDIS_URL,
+)
+from app.schemas.user import AuthenticatedUser
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class PrincipalCache:
+    """Caches the authenticated user behind a (user id, token digest) pair.
+
+    Backends only need get/set/invalidate_user; hit and miss counters are kept here
+    so every backend reports them the same way. The base class caches nothing.
+    """
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._pending: set[asyncio.Task] = set()
+
+    async def get(self, user_id: int, digest: str) -> AuthenticatedUser | None:
+        principal = await self._get(user_id, digest)
+        if principal is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return principal
+
+    async def set(self, user_id: int, digest: str, principal: AuthenticatedUser) -> None:
+        await self._set(user_id, digest, principal)
+
+    async def invalidate_user(self, user_id: int) -> None:
+        self.invalidations += 1
+        await self._invalidate_user(user_id)
+
+    def invalidate_user_nowait(self, user_id: int) -> None:
+        # called from synchronous ORM hooks, which run inside the event loop thread
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.invalidate_user(user_id))
+            return
+        task = loop.create_task(self.invalidate_user(user_id))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    async def _get(self, user_id: int, digest: str) -> AuthenticatedUser | None:
+        return None
+
+    async def _set(self, user_id: int, digest: str, principal: AuthenticatedUser) -> None:
+        return None
+
+    async def _invalidate_user(self, user_id: int) -> None:
+        return None
+
+
+class InMemoryPrincipalCache(PrincipalCache):
+    backend = "memory"
+
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_MAX_ENTRIES, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        super().__init__()
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def invalidate_user_nowait(self, user_id: int) -> None:
+        self.invalidations += 1
+        self._cache.delete_where(lambda key: key[0] == user_id)
+
+    async def _get(self, user_id: int, digest: str) -> AuthenticatedUser | None:
+        return self._cache.get((user_id, digest))
+
+    async def _set(self, user_id: int, digest: str, principal: AuthenticatedUser) -> None:
+        self._cache.set((user_id, digest), principal)
+
+    async def _invalidate_user(self, user_id: int) -> None:
+        self._cache.delete_where(lambda key: key[0] == user_id)
+
+    def stats(self) -> dict[str, object]:
+        stats = super().stats()
+        stats["size"] = len(self._cache)
+        stats["maxsize"] = self._cache.maxsize
+        stats["evictions"] = self._cache.evictions
+        return stats
+
+
+class RedisPrincipalCache(PrincipalCache):
+    """Shared cache for multi-worker deployments: one hash per user, one field per token."""
+
+    backend = "redis"
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        super().__init__()
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("PRINCIPAL_CACHE_BACKEND=redis requires the 'redis' package")
+        self._redis = redis_asyncio.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.ttl = ttl
+        self.errors = 0
+
+    def _key(self, user_id: int) -> str:
+        return f"drivium:principal:{user_id}"
+
+    async def _get(self, user_id: int, digest: str) -> AuthenticatedUser | None:
+        try:
+            raw = await self._redis.hget(self._key(user_id), digest)
+        except Exception as exc:
+            # the cache must never break authentication, a failed lookup is just a miss
+            self.errors += 1
+            logging.warning(f"Principal cache lookup failed: {exc}")
+            return None
+        if raw is None:
+            return None
+
+        entry = json.loads(raw)
+        if entry["expires_at"] <= time.time():
+            return None
+        return AuthenticatedUser.model_validate(entry["principal"])
+
+    async def _set(self, user_id: int, digest: str, principal: AuthenticatedUser) -> None:
+        entry = json.dumps({
+            "expires_at": time.time() + self.ttl,
+            "principal": principal.model_dump(mode="json"),
+        })
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.hset(self._key(user_id), digest, entry)
+                pipe.expire(self._key(user_id), int(self.ttl) + 1)
+                await pipe.execute()
+        except Exception as exc:
+            self.errors += 1
+            logging.warning(f"Principal cache store failed: {exc}")
+
+    async def _invalidate_user(self, user_id: int) -> None:
+        try:
+            await self._redis.delete(self._key(user_id))
+        except Exception as exc:
+            self.errors += 1
+            logging.error(f"Principal cache invalidation failed for user {user_id}: {exc}")
+
+    def stats(self) -> dict[str, object]:
+        stats = super().stats()
+        stats["errors"] = self.errors
+        return stats
+
+
+def _create_principal_cache() -> PrincipalCache:
+    if PRINCIPAL_CACHE_BACKEND == "redis":
+        return RedisPrincipalCache()
+    if PRINCIPAL_CACHE_BACKEND == "memory":
+        return InMemoryPrincipalCache()
+    return PrincipalCache()
+
+
+principal_cache = _create_principal_cache()
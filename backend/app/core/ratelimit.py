@@ -0,0 +1,25 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Paces work to at most `rate` units per second, averaged over time.
+
+    Each acquire books its units right away and sleeps until its slot starts, so
+    concurrent callers queue up behind each other. A rate <= 0 disables pacing.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+        self.waited_seconds = 0.0
+
+    async def acquire(self, units: int = 1) -> None:
+        if self.rate <= 0 or units <= 0:
+            return
+        now = time.monotonic()
+        start = max(self._next_slot, now)
+        self._next_slot = start + units / self.rate
+        if start > now:
+            self.waited_seconds += start - now
+            await asyncio.sleep(start - now)
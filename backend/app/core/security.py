@@ -1,18 +1,71 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from app.schemas.auth import TokenData
-from app.core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.cache import TTLCache
+from app.core.principal_cache import token_digest
+from app.core.config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_BACKEND,
+    TOKEN_CACHE_TTL_SECONDS,
+    TOKEN_CACHE_MAX_ENTRIES,
+    ARGON2_TIME_COST,
+    ARGON2_MEMORY_COST_KIB,
+    ARGON2_PARALLELISM,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE_MAX,
+)
 
 # Password Hashing
 
-pwd_context = CryptContext(schemes=["argon2", "bcrypt"], default="argon2", deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST_KIB,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# argon2-cffi and bcrypt release the GIL while hashing, so threads are enough to keep
+# hashes off the event loop and run them in parallel
+_hash_pool = ThreadPoolExecutor(max_workers=max(PASSWORD_HASH_WORKERS, 1), thread_name_prefix="password-hash")
+_hash_slots = threading.BoundedSemaphore(max(PASSWORD_HASH_WORKERS, 1) + max(PASSWORD_HASH_QUEUE_MAX, 0))
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def _run_hash(fn: Callable, *args, db: AsyncSession | None = None):
+    if db is not None:
+        # hashing may wait for a free thread; don't hold the caller's pooled connection meanwhile
+        await db.commit()
+    # a full queue fails fast: waiting longer only turns a burst into timeouts for everyone
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(503, "Too many sign-ins in progress, try again shortly", headers={"Retry-After": "1"})
+    try:
+        future = _hash_pool.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    # released when the hash finishes (or is dropped unstarted), not when a disconnected client stops waiting
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return await asyncio.wrap_future(future)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str, db: AsyncSession | None = None) -> Tuple[bool, str | None]:
+    """Whether the password matches, and a new hash to store when the old one uses outdated parameters.
+
+    With ``db``, its transaction is committed first so the session gives its connection back while hashing.
+    """
+    return await _run_hash(pwd_context.verify_and_update, plain_password, hashed_password, db=db)
+
+async def get_password_hash(password: str, db: AsyncSession | None = None) -> str:
+    return await _run_hash(pwd_context.hash, password, db=db)
 
 # JWT Token 
 def create_access_token(token_data: TokenData, expires_delta: timedelta | None = None) -> str:
@@ -25,9 +78,32 @@ def create_access_token(token_data: TokenData, expires_delta: timedelta | None =
     to_encode["exp"] = expire
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(token: str) -> TokenData | None:
+def _create_jwt_decoder() -> Tuple[Callable[[str], dict], type]:
+    if JWT_BACKEND == "pyjwt":
+        try:
+            import jwt as pyjwt
+        except ImportError:
+            raise RuntimeError("JWT_BACKEND=pyjwt requires the 'PyJWT' package")
+        return lambda token: pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), pyjwt.PyJWTError
+    return lambda token: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), JWTError
+
+_decode_jwt, _jwt_error = _create_jwt_decoder()
+verified_tokens = TTLCache(maxsize=TOKEN_CACHE_MAX_ENTRIES, ttl=TOKEN_CACHE_TTL_SECONDS)
+
+def verify_token(token: str, digest: str | None = None) -> TokenData | None:
+    digest = digest or token_digest(token)
+    token_data = verified_tokens.get(digest)
+    if token_data is not None:
+        return token_data
+
     try:
-        payload_dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return TokenData(**payload_dict)
-    except JWTError:
+        payload_dict = _decode_jwt(token)
+        token_data = TokenData(**payload_dict)
+    except _jwt_error:
         return None
+
+    # a cached token must stop working when the token itself expires
+    remaining = payload_dict.get("exp", 0) - time.time()
+    if remaining > 0:
+        verified_tokens.set(digest, token_data, ttl=min(remaining, TOKEN_CACHE_TTL_SECONDS))
+    return token_data
@@ -0,0 +1,59 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUEST_DB_DURATION, HTTP_REQUEST_DB_STATEMENTS, HTTP_REQUEST_DURATION
+from app.database.pool import pool_stats, start_request_db_timing
+
+
+def _route_template(scope: Scope) -> str:
+    # the router stores the matched route on the scope; unmatched paths share one label
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestTimingMiddleware:
+    """Measures every request: total latency, SQL statement count and DB time.
+
+    Results go to the Prometheus histograms (when record_metrics is set) and, optionally,
+    to a Server-Timing header. DB time in the header covers the work done before the
+    response starts, so for streamed responses it reflects the first batch only.
+    """
+
+    def __init__(self, app: ASGIApp, emit_header: bool = True, record_metrics: bool = True):
+        self.app = app
+        self.emit_header = emit_header
+        self.record_metrics = record_metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timing = start_request_db_timing()
+        status = "500"
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                pool_stats.request_db_time.observe(timing.db_ms)
+                if self.emit_header:
+                    total_ms = (time.perf_counter() - started) * 1000
+                    value = (
+                        f'db;dur={timing.db_ms:.1f};desc="{timing.queries} queries", '
+                        f"db-wait;dur={timing.pool_wait_ms:.1f}, "
+                        f"total;dur={total_ms:.1f}"
+                    )
+                    message.setdefault("headers", []).append((b"server-timing", value.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if self.record_metrics:
+                method, route = scope["method"], _route_template(scope)
+                HTTP_REQUEST_DURATION.labels(method, route, status).observe(time.perf_counter() - started)
+                HTTP_REQUEST_DB_STATEMENTS.labels(method, route).observe(timing.queries)
+                HTTP_REQUEST_DB_DURATION.labels(method, route).observe(timing.db_ms / 1000)
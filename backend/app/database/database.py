@@ -1,15 +1,59 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from app.core.config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE_SECONDS,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+)
+from app.database.pool import InstrumentedQueuePool, instrument_engine
 
-engine_kwargs = {}
-if DATABASE_URL.startswith("sqlite"):
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, **engine_kwargs)
+def _to_async_url(url: str) -> str:
+    # DATABASE_URL is shared with sync tooling, so map sync drivers to their async counterparts.
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+", 1)[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
 
-SessionLocal = sessionmaker(
-    autocommit=False, 
-    autoflush=False, 
-    bind=engine
-)
\ No newline at end of file
+
+ASYNC_DATABASE_URL = _to_async_url(DATABASE_URL)
+
+
+def create_database_engine(url: str) -> AsyncEngine:
+    """An engine with the app's pool settings; used for the primary and for each read replica."""
+    async_url = _to_async_url(url)
+    engine_kwargs = {}
+    if async_url.startswith("sqlite"):
+        engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+    # in-memory SQLite needs its single shared connection, so it keeps SQLAlchemy's default pool
+    if ":memory:" not in async_url:
+        engine_kwargs.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+
+    engine = create_async_engine(async_url, **engine_kwargs)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+def create_sessionmaker(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(
+        bind=engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+engine = create_database_engine(DATABASE_URL)
+SessionLocal = create_sessionmaker(engine)
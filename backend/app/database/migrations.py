@@ -0,0 +1,373 @@
+"""Versioned schema migrations, applied by ``python -m app.migrate``.
+
+Migration 1 builds the whole current schema on an empty database; the later ones
+bring databases created by older releases up to it. So every migration checks before
+it changes anything (a fresh database already has the change), and the
+non-transactional ones must also be safe to rerun after failing half-way.
+"""
+import asyncio
+import logging
+import re
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Awaitable, Callable, List, NamedTuple
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import MIGRATE_ON_STARTUP, MIGRATION_BATCH_SIZE, MIGRATION_LOCK_TIMEOUT_SECONDS
+from app.database.base import Base
+from app.database.database import ASYNC_DATABASE_URL
+from app.database import models  # noqa: F401 (registers the tables on Base.metadata)
+
+# any constant works, it only has to be the same for every migrator
+MIGRATION_LOCK_KEY = 0x64726976
+
+_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    "schema_migrations",
+    _metadata,
+    sa.Column("version", sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column("name", sa.String(128), nullable=False),
+    sa.Column("applied_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+    # False runs it on an autocommit connection, as CREATE INDEX CONCURRENTLY and
+    # backfills that commit batch by batch need
+    transactional: bool = True
+
+
+# HELPERS
+
+def _is_postgres(connection: AsyncConnection) -> bool:
+    return connection.dialect.name == "postgresql"
+
+
+async def _set_lock_timeout(connection: AsyncConnection, seconds: float) -> None:
+    if _is_postgres(connection):
+        await connection.exec_driver_sql(f"SET lock_timeout = {int(seconds * 1000)}")
+
+
+async def add_column(connection: AsyncConnection, table_name: str, column: sa.Column) -> bool:
+    """ADD COLUMN unless it exists; returns whether it was added.
+
+    Only for nullable columns or constant defaults, which Postgres 11+ adds without
+    rewriting the table. The lock it needs is brief, but waiting for it would block
+    every query queued behind, so it gives up after MIGRATION_LOCK_TIMEOUT_SECONDS.
+    """
+    existing = await connection.run_sync(lambda sync: {c["name"] for c in sa.inspect(sync).get_columns(table_name)})
+    if column.name in existing:
+        return False
+    spec = sa.schema.CreateColumn(column).compile(dialect=connection.dialect)
+    await connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {spec}")
+    return True
+
+
+async def create_index(connection: AsyncConnection, name: str, ddl: str) -> None:
+    """Run ``CREATE INDEX IF NOT EXISTS <name> ...``; CONCURRENTLY on Postgres, so writes go on meanwhile."""
+    if not _is_postgres(connection):
+        await connection.exec_driver_sql(ddl)
+        return
+
+    valid = await connection.scalar(sa.text(
+        "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :name"
+    ), {"name": name})
+    if valid:
+        return
+    if valid is False:
+        # left behind by an interrupted build: maintained on every write, never used
+        await connection.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+    # a concurrent build waits for older transactions to finish; that wait blocks nobody
+    await _set_lock_timeout(connection, 0)
+    try:
+        await connection.exec_driver_sql(re.sub(r"^CREATE (UNIQUE )?INDEX", r"CREATE \1INDEX CONCURRENTLY", ddl))
+    finally:
+        await _set_lock_timeout(connection, MIGRATION_LOCK_TIMEOUT_SECONDS)
+
+
+async def create_model_index(connection: AsyncConnection, table_name: str, index_name: str) -> None:
+    index = next(index for index in Base.metadata.tables[table_name].indexes if index.name == index_name)
+    ddl = sa.schema.CreateIndex(index, if_not_exists=True).compile(dialect=connection.dialect)
+    await create_index(connection, index_name, str(ddl))
+
+
+async def backfill(connection: AsyncConnection, statement: sa.TextClause) -> int:
+    """Repeat an UPDATE limited to :batch_size rows until it touches none.
+
+    On an autocommit connection every batch commits on its own, so row locks are
+    held briefly and a failure keeps the batches already done.
+    """
+    total = 0
+    while True:
+        result = await connection.execute(statement, {"batch_size": MIGRATION_BATCH_SIZE})
+        if not result.rowcount:
+            return total
+        total += result.rowcount
+
+
+# MIGRATIONS
+
+async def _initial_schema(connection: AsyncConnection) -> None:
+    # creates missing tables only; columns and indexes added to existing tables come below
+    await connection.run_sync(Base.metadata.create_all)
+
+
+async def _user_storage_usage(connection: AsyncConnection) -> None:
+    await add_column(connection, "user_account", sa.Column("storage_used", sa.BigInteger, nullable=False, server_default="0"))
+    await add_column(connection, "user_account", sa.Column("storage_quota", sa.BigInteger, nullable=True))
+
+    # usage starts at 0 for existing accounts; count it, a range of users per transaction. Accounts
+    # still at 0 that own files are the ones left, so a rerun picks up where a failed run stopped
+    last_id = await connection.scalar(sa.text("SELECT max(id) FROM user_account")) or 0
+    for start in range(0, last_id, MIGRATION_BATCH_SIZE):
+        await connection.execute(sa.text("""
+            UPDATE user_account SET storage_used = (
+                SELECT COALESCE(SUM(files.size), 0) FROM files WHERE files.owner_id = user_account.id
+            )
+            WHERE id > :start AND id <= :stop AND storage_used = 0
+              AND EXISTS (SELECT 1 FROM files WHERE files.owner_id = user_account.id)
+        """), {"start": start, "stop": start + MIGRATION_BATCH_SIZE})
+
+
+async def _folder_paths(connection: AsyncConnection) -> None:
+    await add_column(connection, "folders", sa.Column("path", sa.String(2048), nullable=True))
+    await add_column(connection, "folders", sa.Column("depth", sa.Integer, nullable=False, server_default="0"))
+
+    roots = await backfill(connection, sa.text("""
+        UPDATE folders SET path = '/' || CAST(id AS VARCHAR) || '/', depth = 0
+        WHERE id IN (SELECT id FROM folders WHERE path IS NULL AND parent_folder_id IS NULL LIMIT :batch_size)
+    """))
+    # each batch fills folders whose parent already has a path, so the tree fills top-down
+    children = await backfill(connection, sa.text("""
+        UPDATE folders SET
+            path = (SELECT parent.path FROM folders parent WHERE parent.id = folders.parent_folder_id) || CAST(id AS VARCHAR) || '/',
+            depth = (SELECT parent.depth FROM folders parent WHERE parent.id = folders.parent_folder_id) + 1
+        WHERE id IN (
+            SELECT child.id FROM folders child JOIN folders parent ON parent.id = child.parent_folder_id
+            WHERE child.path IS NULL AND parent.path IS NOT NULL
+            LIMIT :batch_size
+        )
+    """))
+    if roots or children:
+        logging.info(f"Backfilled hierarchy paths for {roots + children} folders")
+
+    await create_model_index(connection, "folders", "ix_folders_owner_path")
+
+
+async def _file_upload_columns(connection: AsyncConnection) -> None:
+    for column in (
+        sa.Column("upload_id", sa.String(1024), nullable=True),
+        sa.Column("part_size", sa.BigInteger, nullable=True),
+        sa.Column("part_count", sa.Integer, nullable=True),
+        sa.Column("etag", sa.String(128), nullable=True),
+        sa.Column("blob_id", sa.Integer, nullable=True),
+        sa.Column("thumbnail_sizes", sa.String(64), nullable=True),
+    ):
+        await add_column(connection, "files", column)
+
+    if _is_postgres(connection):
+        # create_all names it the same way, so a database that already has it is left alone
+        validated = await connection.scalar(sa.text(
+            "SELECT convalidated FROM pg_constraint WHERE conname = 'files_blob_id_fkey'"
+        ))
+        if validated is None:
+            # NOT VALID skips the full-table check under the lock; VALIDATE then scans without blocking writes
+            await connection.exec_driver_sql(
+                "ALTER TABLE files ADD CONSTRAINT files_blob_id_fkey FOREIGN KEY (blob_id) REFERENCES storage_objects (id) NOT VALID"
+            )
+        if not validated:
+            await connection.exec_driver_sql("ALTER TABLE files VALIDATE CONSTRAINT files_blob_id_fkey")
+
+    await create_model_index(connection, "files", "ix_files_blob_id")
+
+
+async def _listing_indexes(connection: AsyncConnection) -> None:
+    await create_model_index(connection, "folders", "ix_folders_owner_parent_name")
+    for name in ("ix_files_owner_folder_uploaded_at", "ix_files_owner_folder_name", "ix_files_owner_folder_size"):
+        await create_model_index(connection, "files", name)
+
+
+async def _search_indexes(connection: AsyncConnection) -> None:
+    if not _is_postgres(connection):
+        return
+
+    for extension in ("pg_trgm", "btree_gin"):
+        try:
+            await connection.exec_driver_sql(f"CREATE EXTENSION IF NOT EXISTS {extension}")
+        except sa.exc.DBAPIError as e:
+            logging.warning(f"Could not install {extension} ({e.orig}); search falls back to unindexed ILIKE")
+
+    # the lower(name) indexes serve queries too short to have a trigram
+    await create_index(connection, "ix_files_owner_lower_name",
+                       "CREATE INDEX IF NOT EXISTS ix_files_owner_lower_name ON files (owner_id, lower(name) text_pattern_ops)")
+    await create_index(connection, "ix_folders_owner_lower_name",
+                       "CREATE INDEX IF NOT EXISTS ix_folders_owner_lower_name ON folders (owner_id, lower(name) text_pattern_ops)")
+
+    installed = await connection.scalar(sa.text("SELECT count(*) FROM pg_extension WHERE extname IN ('pg_trgm', 'btree_gin')"))
+    if installed < 2:
+        return
+    # owner_id leads both trigram indexes (btree_gin), so a search only touches the caller's rows
+    await create_index(connection, "ix_files_owner_name_trgm",
+                       "CREATE INDEX IF NOT EXISTS ix_files_owner_name_trgm ON files USING gin (owner_id, name gin_trgm_ops)")
+    await create_index(connection, "ix_folders_owner_name_trgm",
+                       "CREATE INDEX IF NOT EXISTS ix_folders_owner_name_trgm ON folders USING gin (owner_id, name gin_trgm_ops)")
+
+
+async def _replication_heartbeat(connection: AsyncConnection) -> None:
+    table = Base.metadata.tables["replication_heartbeat"]
+    await connection.run_sync(lambda sync: table.create(sync, checkfirst=True))
+    if not await connection.scalar(sa.select(sa.func.count()).select_from(table)):
+        await connection.execute(table.insert().values(id=1, beat_at=0))
+
+
+async def _uploaded_at_format(connection: AsyncConnection) -> None:
+    if connection.dialect.name != "sqlite":
+        return
+    # rows stamped by CURRENT_TIMESTAMP ('YYYY-MM-DD HH:MM:SS') get the microseconds every other row has
+    await backfill(connection, sa.text("""
+        UPDATE files SET uploaded_at = uploaded_at || '.000000'
+        WHERE id IN (SELECT id FROM files WHERE length(uploaded_at) = 19 LIMIT :batch_size)
+    """))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "user_storage_usage", _user_storage_usage, transactional=False),
+    Migration(3, "folder_paths", _folder_paths, transactional=False),
+    Migration(4, "file_upload_columns", _file_upload_columns, transactional=False),
+    Migration(5, "listing_indexes", _listing_indexes, transactional=False),
+    Migration(6, "search_indexes", _search_indexes, transactional=False),
+    Migration(7, "replication_heartbeat", _replication_heartbeat),
+    Migration(8, "uploaded_at_format", _uploaded_at_format, transactional=False),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# RUNNER
+
+def create_migration_engine() -> AsyncEngine:
+    # no pool: session settings (lock_timeout, autocommit) die with each connection
+    connect_args = {"check_same_thread": False} if ASYNC_DATABASE_URL.startswith("sqlite") else {}
+    return create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool, connect_args=connect_args)
+
+
+async def applied_versions(connection: AsyncConnection) -> dict:
+    if not await connection.run_sync(lambda sync: sa.inspect(sync).has_table("schema_migrations")):
+        return {}
+    rows = await connection.execute(sa.select(schema_migrations.c.version, schema_migrations.c.applied_at))
+    return {row.version: row.applied_at for row in rows}
+
+
+@asynccontextmanager
+async def _migration_connection(engine: AsyncEngine, transactional: bool) -> AsyncIterator[AsyncConnection]:
+    async with engine.connect() as connection:
+        if not transactional:
+            connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        await _set_lock_timeout(connection, MIGRATION_LOCK_TIMEOUT_SECONDS)
+        yield connection
+
+
+@asynccontextmanager
+async def _postgres_migration_lock(connection: AsyncConnection) -> AsyncIterator[None]:
+    """Hold the migration advisory lock on an autocommit connection.
+
+    Polled with pg_try_advisory_lock rather than waited for in pg_advisory_lock: a waiting
+    statement keeps its snapshot open, and CREATE INDEX CONCURRENTLY in the lock holder waits
+    for every older snapshot to go away, which Postgres would end as a deadlock.
+    """
+    await _set_lock_timeout(connection, MIGRATION_LOCK_TIMEOUT_SECONDS)
+    while not await connection.scalar(sa.text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}):
+        logging.info("Waiting for another migrator to finish")
+        await asyncio.sleep(1)
+    try:
+        yield
+    finally:
+        await connection.execute(sa.text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+@asynccontextmanager
+async def _sqlite_write_lock(connection: AsyncConnection) -> AsyncIterator[None]:
+    """Hold SQLite's database write lock (BEGIN IMMEDIATE) on an autocommit connection, then commit.
+
+    SQLite has no advisory locks. This one also keeps every other connection from writing,
+    so whatever runs under it must use this connection.
+    """
+    while True:
+        try:
+            await connection.exec_driver_sql("BEGIN IMMEDIATE")
+            break
+        except sa.exc.OperationalError as e:
+            # another migrator (or a long write) holds it; the driver already waited its busy timeout
+            if "locked" not in str(e):
+                raise
+            logging.info("Waiting for the database write lock to migrate")
+            await asyncio.sleep(1)
+    try:
+        yield
+    except BaseException:
+        await connection.exec_driver_sql("ROLLBACK")
+        raise
+    await connection.exec_driver_sql("COMMIT")
+
+
+async def migrate(engine: AsyncEngine | None = None) -> List[Migration]:
+    """Apply pending migrations in order; returns the ones applied.
+
+    One migrator at a time: on Postgres an advisory lock serialises them, on SQLite the whole
+    chain runs in one BEGIN IMMEDIATE transaction. Either way the others wait, then find
+    nothing left to do.
+    """
+    own_engine = engine is None
+    engine = engine or create_migration_engine()
+    applied: List[Migration] = []
+    try:
+        async with engine.connect() as lock:
+            lock = await lock.execution_options(isolation_level="AUTOCOMMIT")
+            sqlite = lock.dialect.name == "sqlite"
+            if _is_postgres(lock):
+                serialised = _postgres_migration_lock(lock)
+            elif sqlite:
+                serialised = _sqlite_write_lock(lock)
+            else:
+                serialised = nullcontext()
+            async with serialised:
+                await lock.run_sync(_metadata.create_all)
+                done = await applied_versions(lock)
+
+                for migration in MIGRATIONS:
+                    if migration.version in done:
+                        continue
+                    logging.info(f"Applying migration {migration.version} ({migration.name})")
+                    async with nullcontext(lock) if sqlite else _migration_connection(engine, migration.transactional) as connection:
+                        await migration.upgrade(connection)
+                        await connection.execute(schema_migrations.insert().values(version=migration.version, name=migration.name))
+                        if migration.transactional and not sqlite:
+                            await connection.commit()
+                    applied.append(migration)
+    finally:
+        if own_engine:
+            await engine.dispose()
+    return applied
+
+
+async def check_schema(engine: AsyncEngine) -> None:
+    """Startup check: one lookup of the applied versions, no DDL unless MIGRATE_ON_STARTUP is set."""
+    async with engine.connect() as connection:
+        current = max(await applied_versions(connection), default=0)
+
+    if current < LATEST_VERSION:
+        if MIGRATE_ON_STARTUP:
+            await migrate()
+            return
+        raise RuntimeError(
+            f"Database schema is at version {current}, this release needs {LATEST_VERSION}: run `python -m app.migrate`"
+        )
+    if current > LATEST_VERSION:
+        # migrations only add, so an older release keeps working against a newer schema (e.g. during a rollback)
+        logging.warning(f"Database schema version {current} is newer than this release ({LATEST_VERSION})")
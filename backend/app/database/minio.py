@@ -1,35 +1,119 @@
 from fastapi import HTTPException
 from minio import Minio
-from app.core.config import MINIO_BUCKET_NAME, MINIO_ENDPOINT, MINIO_USER, MINIO_PASS, MINIO_SECURE
+from minio.error import S3Error, ServerError
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.config import (
+    MINIO_BREAKER_FAILURE_THRESHOLD,
+    MINIO_BREAKER_RESET_SECONDS,
+    MINIO_BUCKET_NAME,
+    MINIO_BULK_READ_TIMEOUT_SECONDS,
+    MINIO_CONNECT_TIMEOUT_SECONDS,
+    MINIO_ENDPOINT,
+    MINIO_PASS,
+    MINIO_POOL_MAXSIZE,
+    MINIO_READ_TIMEOUT_SECONDS,
+    MINIO_REGION,
+    MINIO_RETRIES,
+    MINIO_SECURE,
+    MINIO_TCP_KEEPALIVE,
+    MINIO_USER,
+)
 import logging
+import socket
+import threading
 import urllib3
-from urllib3.exceptions import MaxRetryError, NewConnectionError
-from minio.error import S3Error
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import HTTPError, MaxRetryError, NewConnectionError
 
-minio_client = None
+# Read timeout per client profile; the SDK has no per-call timeout, so each profile gets its own client
+MINIO_PROFILES = {
+    "default": MINIO_READ_TIMEOUT_SECONDS,
+    "bulk": MINIO_BULK_READ_TIMEOUT_SECONDS,
+}
 
+minio_clients: dict[str, Minio] = {}
+_http_clients: dict[str, urllib3.PoolManager] = {}
+_init_lock = threading.Lock()
+_bucket_ready = False
 
-def init_minio_client():
-    global minio_client
-    if minio_client is None:
-        try:
-            http_client = urllib3.PoolManager(
-                timeout=urllib3.Timeout(connect=2.0, read=3.0),
-                retries=urllib3.Retry(total=1, connect=1, read=1, backoff_factor=0.1),
+minio_breaker = CircuitBreaker("minio", MINIO_BREAKER_FAILURE_THRESHOLD, MINIO_BREAKER_RESET_SECONDS)
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    # S3Error means MinIO answered; only transport failures and 5xx responses count against the breaker
+    return isinstance(exc, (HTTPError, ServerError, OSError)) and not isinstance(exc, S3Error)
+
+
+def storage_unavailable(message: str = "Object storage unavailable") -> HTTPException:
+    return HTTPException(503, message, headers={"Retry-After": str(minio_breaker.retry_after())})
+
+
+def _socket_options() -> list:
+    options = list(HTTPConnection.default_socket_options)
+    if MINIO_TCP_KEEPALIVE:
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30))
+    return options
+
+
+def _build_client(profile: str) -> Minio:
+    http_client = urllib3.PoolManager(
+        maxsize=MINIO_POOL_MAXSIZE,
+        timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT_SECONDS, read=MINIO_PROFILES[profile]),
+        retries=urllib3.Retry(total=MINIO_RETRIES, connect=MINIO_RETRIES, read=MINIO_RETRIES, backoff_factor=0.1),
+        socket_options=_socket_options(),
+    )
+    client = Minio(MINIO_ENDPOINT,
+                   access_key=MINIO_USER,
+                   secret_key=MINIO_PASS,
+                   secure=MINIO_SECURE,
+                   region=MINIO_REGION,
+                   http_client=http_client)
+    _http_clients[profile] = http_client
+    return client
+
+
+def init_minio_client(profile: str = "default", use_breaker: bool = True) -> Minio:
+    """Return the client for a profile, creating it (and the bucket) on first use.
+
+    A failed initialization is not cached, so the next call retries; while the breaker
+    is open callers fail fast instead of each waiting for the connect timeout.
+    """
+    global _bucket_ready
+    client = minio_clients.get(profile)
+    if client is not None:
+        return client
+
+    with _init_lock:
+        client = minio_clients.get(profile)
+        if client is not None:
+            return client
+
+        if use_breaker and not minio_breaker.allow():
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "success": False,
+                    "message": "Storage service unavailable (circuit open)",
+                    "error": "MINIO_CIRCUIT_OPEN",
+                    "service": "minio"
+                },
+                headers={"Retry-After": str(minio_breaker.retry_after())}
             )
 
-            minio_client = Minio(MINIO_ENDPOINT,
-                                access_key=MINIO_USER,
-                                secret_key=MINIO_PASS,
-                                secure=MINIO_SECURE,
-                                http_client=http_client)
-            
-            bucket = MINIO_BUCKET_NAME
-            if not minio_client.bucket_exists(bucket):
-                minio_client.make_bucket(bucket)
-                logging.info(f"Bucket '{bucket}' created")
-        
+        try:
+            client = _build_client(profile)
+
+            if not _bucket_ready:
+                bucket = MINIO_BUCKET_NAME
+                if not client.bucket_exists(bucket):
+                    client.make_bucket(bucket)
+                    logging.info(f"Bucket '{bucket}' created")
+                _bucket_ready = True
+
         except (MaxRetryError, NewConnectionError):
+            minio_breaker.record_failure()
             raise HTTPException(
                 status_code=503,
                 detail={
@@ -40,6 +124,7 @@ def init_minio_client():
                 }
             )
         except S3Error as e:
+            minio_breaker.record_success()
             raise HTTPException(
                 status_code=503,
                 detail={
@@ -50,6 +135,8 @@ def init_minio_client():
                 }
             )
         except Exception as e:
+            if is_connection_error(e):
+                minio_breaker.record_failure()
             logging.error(f"MinIO init failed: {str(e)}")
             raise HTTPException(
                 status_code=503,
@@ -60,4 +147,31 @@ def init_minio_client():
                     "service": "minio"
                 }
             )
-    return minio_client
\ No newline at end of file
+
+        minio_breaker.record_success()
+        minio_clients[profile] = client
+        return client
+
+
+def init_bulk_minio_client() -> Minio:
+    return init_minio_client("bulk")
+
+
+def minio_pool_stats() -> dict[str, dict[str, int]]:
+    """Connections in use per profile; in_use reaching maxsize means the pool is saturated."""
+    stats = {}
+    for profile, http_client in list(_http_clients.items()):
+        in_use = idle = 0
+        for key in http_client.pools.keys():
+            pool = http_client.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            # the queue starts filled with None placeholders; a checked-out connection leaves a gap
+            in_use += pool.pool.maxsize - pool.pool.qsize()
+            idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        stats[profile] = {
+            "maxsize": MINIO_POOL_MAXSIZE,
+            "in_use": in_use,
+            "idle": idle,
+        }
+    return stats
@@ -1,4 +1,5 @@
 import sqlalchemy as sa
+from datetime import datetime, timezone
 from app.database.base import Base
 from enum import Enum as PyEnum # as pyenum to avoid conflict with sqlalchemy Enum
 
@@ -6,6 +7,12 @@ class FileStatus(str, PyEnum):
     PENDING = "PENDING"
     UPLOADED = "UPLOADED"
 
+class JobStatus(str, PyEnum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
 class User(Base):
     __tablename__ = "user_account"
     
@@ -15,6 +22,9 @@ class User(Base):
     password_hash = sa.Column(sa.String(255), nullable=False)
     created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
     is_active = sa.Column(sa.Boolean, default=True)
+    # bytes of all file records (pending uploads included), maintained by QuotaService
+    storage_used = sa.Column(sa.BigInteger, nullable=False, default=0, server_default="0")
+    storage_quota = sa.Column(sa.BigInteger, nullable=True)  # NULL = DEFAULT_STORAGE_QUOTA_BYTES
     
     folders = sa.orm.relationship("Folder", back_populates="owner")
     files = sa.orm.relationship("File", back_populates="owner")
@@ -27,12 +37,22 @@ class Folder(Base):
     parent_folder_id = sa.Column(sa.Integer, sa.ForeignKey("folders.id"), nullable=True, index=True)
     name = sa.Column(sa.String(255), nullable=False)
     created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
+    # materialized path of folder ids from the root down to this folder, e.g. "/1/5/9/"
+    path = sa.Column(sa.String(2048), nullable=True)
+    depth = sa.Column(sa.Integer, nullable=False, default=0, server_default="0")
     
     owner = sa.orm.relationship("User", back_populates="folders")
     parent = sa.orm.relationship("Folder", remote_side=[id], back_populates="subfolders")
     subfolders = sa.orm.relationship("Folder", back_populates="parent")
     files = sa.orm.relationship("File", back_populates="folder")
 
+    __table_args__ = (
+        # varchar_pattern_ops lets Postgres use the index for `path LIKE '/1/5/%'` prefix scans
+        sa.Index("ix_folders_owner_path", "owner_id", "path", postgresql_ops={"path": "varchar_pattern_ops"}),
+        # listings: one folder's subfolders in (name, id) order, created_at included for index-only scans
+        sa.Index("ix_folders_owner_parent_name", "owner_id", "parent_folder_id", "name", "id", postgresql_include=["created_at"]),
+    )
+
 class File(Base):
     __tablename__ = "files"
     
@@ -44,7 +64,83 @@ class File(Base):
     size = sa.Column(sa.BigInteger, nullable=False, default=0)
     mime_type = sa.Column(sa.String(100), nullable=False, default="application/octet-stream")
     status = sa.Column(sa.Enum(FileStatus), default=FileStatus.PENDING, index=True)
-    uploaded_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
+    # stamped in Python: SQLite's CURRENT_TIMESTAMP has no fractional part, and the keyset
+    # cursor compares this column as text there, so every row must share one format
+    uploaded_at = sa.Column(sa.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=sa.func.now())
+    # set while a multipart upload is in progress, cleared on complete
+    upload_id = sa.Column(sa.String(1024), nullable=True)
+    part_size = sa.Column(sa.BigInteger, nullable=True)
+    part_count = sa.Column(sa.Integer, nullable=True)
+    etag = sa.Column(sa.String(128), nullable=True)  # reported by storage when the upload is confirmed
+    # set for uploads that declared a content hash; the object then belongs to the blob, not the file
+    blob_id = sa.Column(sa.Integer, sa.ForeignKey("storage_objects.id"), nullable=True, index=True)
+    # "256,1024" once thumbnails are stored next to the object, "" if the file can't have any
+    thumbnail_sizes = sa.Column(sa.String(64), nullable=True)
     
     owner = sa.orm.relationship("User", back_populates="files")
     folder = sa.orm.relationship("Folder", back_populates="files")
+    blob = sa.orm.relationship("StorageObject")
+
+    # listings: one per sort key, so a page is read in index order (forwards or backwards) without a sort
+    __table_args__ = (
+        sa.Index("ix_files_owner_folder_uploaded_at", "owner_id", "folder_id", "uploaded_at", "id"),
+        sa.Index("ix_files_owner_folder_name", "owner_id", "folder_id", "name", "id"),
+        sa.Index("ix_files_owner_folder_size", "owner_id", "folder_id", "size", "id"),
+    )
+
+    @property
+    def object_name(self) -> str:
+        # blob must be loaded (joinedload) for files that have one
+        if self.blob_id is not None:
+            return self.blob.object_name
+        return f"users/{self.owner_id}/{self.storage_key}"
+
+class StorageObject(Base):
+    """A stored object shared by every File row with the same verified content."""
+    __tablename__ = "storage_objects"
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True, autoincrement=True)
+    owner_id = sa.Column(sa.Integer, sa.ForeignKey("user_account.id"), nullable=True, index=True)  # first uploader
+    object_name = sa.Column(sa.String(1024), unique=True, nullable=False)
+    sha256 = sa.Column(sa.String(64), nullable=True)  # declared by the client, trusted once verified
+    size = sa.Column(sa.BigInteger, nullable=False)
+    verified = sa.Column(sa.Boolean, nullable=False, default=False)
+    ref_count = sa.Column(sa.Integer, nullable=False, default=1)
+    created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
+
+    __table_args__ = (
+        sa.Index("ix_storage_objects_sha256_size", "sha256", "size"),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True, autoincrement=True)
+    owner_id = sa.Column(sa.Integer, sa.ForeignKey("user_account.id"), nullable=True, index=True)
+    kind = sa.Column(sa.String(64), nullable=False)
+    status = sa.Column(sa.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED, index=True)
+    payload = sa.Column(sa.JSON, nullable=False, default=dict)
+    result = sa.Column(sa.JSON, nullable=True)
+    error = sa.Column(sa.Text, nullable=True)
+    progress_done = sa.Column(sa.BigInteger, nullable=False, default=0)
+    progress_total = sa.Column(sa.BigInteger, nullable=True)
+    attempts = sa.Column(sa.Integer, nullable=False, default=0)
+    max_attempts = sa.Column(sa.Integer, nullable=False, default=3)
+    # a job is claimable once run_after has passed and nobody holds an unexpired lease on it
+    run_after = sa.Column(sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now())
+    locked_by = sa.Column(sa.String(128), nullable=True)
+    locked_until = sa.Column(sa.DateTime(timezone=True), nullable=True)
+    created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
+    updated_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now())
+    finished_at = sa.Column(sa.DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        sa.Index("ix_jobs_claim", "status", "run_after"),
+    )
+
+class ReplicationHeartbeat(Base):
+    """One row, stamped on the primary every REPLICA_HEARTBEAT_INTERVAL_SECONDS; a replica's copy tells its lag."""
+    __tablename__ = "replication_heartbeat"
+
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    beat_at = sa.Column(sa.Float, nullable=False, default=0)  # unix time of the last beat
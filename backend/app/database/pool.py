@@ -0,0 +1,138 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+class LatencyHistogram:
+    """Histogram of durations in milliseconds; buckets are cumulative, like Prometheus' le."""
+
+    BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        index = bisect.bisect_left(self.BUCKETS_MS, ms)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+
+    def cumulative(self) -> tuple[list[tuple[float, int]], float]:
+        """(upper bound in ms, observations <= bound) pairs ending with +inf, and the sum in ms."""
+        with self._lock:
+            counts = list(self._counts)
+            total_ms = self.total_ms
+        buckets = []
+        running = 0
+        for bound, n in zip(self.BUCKETS_MS + (float("inf"),), counts):
+            running += n
+            buckets.append((bound, running))
+        return buckets, total_ms
+
+    def snapshot(self) -> dict[str, object]:
+        buckets, total_ms = self.cumulative()
+        return {
+            "count": buckets[-1][1],
+            "total_ms": round(total_ms, 3),
+            "buckets": {f"le_{bound}": n for bound, n in buckets},
+        }
+
+
+@dataclass
+class RequestDbTiming:
+    queries: int = 0
+    db_ms: float = 0.0
+    pool_wait_ms: float = 0.0
+
+
+# set per HTTP request by ServerTimingMiddleware; None outside a request (workers, startup)
+_request_db_timing: ContextVar[RequestDbTiming | None] = ContextVar("request_db_timing", default=None)
+
+
+def start_request_db_timing() -> RequestDbTiming:
+    timing = RequestDbTiming()
+    _request_db_timing.set(timing)
+    return timing
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkout_wait = LatencyHistogram()
+        self.request_db_time = LatencyHistogram()
+        self.checkout_timeouts = 0
+
+    def snapshot(self, pool: Pool) -> dict[str, object]:
+        stats: dict[str, object] = {"pool": type(pool).__name__}
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        stats.update({
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait_ms": self.checkout_wait.snapshot(),
+            "request_db_time_ms": self.request_db_time.snapshot(),
+        })
+        return stats
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            pool_stats.checkout_timeouts += 1
+            raise
+        finally:
+            waited_ms = (time.perf_counter() - started) * 1000
+            pool_stats.checkout_wait.observe(waited_ms)
+            timing = _request_db_timing.get()
+            if timing is not None:
+                timing.pool_wait_ms += waited_ms
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute statement execution time to the current request, if any."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        _finish_query(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        if exception_context.connection is not None:
+            _finish_query(exception_context.connection)
+
+
+def _finish_query(conn) -> None:
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    timing = _request_db_timing.get()
+    if timing is not None:
+        timing.queries += 1
+        timing.db_ms += elapsed_ms
@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import (
+    DATABASE_REPLICA_URLS,
+    REPLICA_HEARTBEAT_INTERVAL_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+    REPLICA_STICKY_MAX_USERS,
+    REPLICA_STICKY_SECONDS,
+)
+from app.database.database import SessionLocal, create_database_engine, create_sessionmaker, engine
+from app.database.models import ReplicationHeartbeat
+
+
+async def _read_heartbeat(replica_engine: AsyncEngine) -> float | None:
+    table = ReplicationHeartbeat.__table__
+    async with replica_engine.connect() as connection:
+        return await connection.scalar(sa.select(table.c.beat_at).where(table.c.id == 1))
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker
+    # primary clock time of the newest heartbeat the replica has replayed: it has every commit before it
+    applied_until: float = 0.0
+    error: str | None = None
+
+    def lag(self, now: float) -> float:
+        return now - self.applied_until
+
+
+class ReplicaRouter:
+    """Sends read-only sessions to a replica that is recent enough for the caller.
+
+    Every commit on a session tagged with a user (see ``track_writes``) records the
+    time of that user's last write. A replica serves the user once it has replayed a
+    heartbeat stamped after that write, and serves nobody while its heartbeat is older
+    than REPLICA_MAX_LAG_SECONDS. Otherwise the read goes to the primary.
+
+    Heartbeats are stamped every REPLICA_HEARTBEAT_INTERVAL_SECONDS, so the measured lag
+    overstates the real one by up to an interval: a replica never looks fresher than it is.
+    Write times are kept per process; with several workers, a user's next read may land on
+    a worker that did not see the write and is only bounded by the lag threshold.
+    """
+
+    def __init__(self, urls: list[str] = DATABASE_REPLICA_URLS, max_lag: float = REPLICA_MAX_LAG_SECONDS,
+                 interval: float = REPLICA_HEARTBEAT_INTERVAL_SECONDS):
+        self.max_lag = max_lag
+        self.interval = interval
+        self.replicas = []
+        for url in urls:
+            replica_engine = create_database_engine(url)
+            self.replicas.append(Replica(
+                name=make_url(url).render_as_string(hide_password=True),
+                engine=replica_engine,
+                sessionmaker=create_sessionmaker(replica_engine),
+            ))
+        # last write per user id; past the TTL the user is treated like anyone else
+        self._writes = TTLCache(maxsize=REPLICA_STICKY_MAX_USERS, ttl=REPLICA_STICKY_SECONDS)
+        self._rotation = itertools.count()
+        self._task: asyncio.Task | None = None
+        self._listening = False
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0  # sent to the primary because no fresh replica had the user's last write yet
+        self.lagging_reads = 0  # sent to the primary because every replica was too far behind or down
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def track_writes(self, db: AsyncSession, user_id: int) -> None:
+        if not self.enabled:
+            return
+        db.info["user_id"] = user_id
+        self._install_listener()
+
+    def mark_write(self, user_id: int) -> None:
+        if self.enabled:
+            self._writes.set(user_id, time.time())
+
+    def _install_listener(self) -> None:
+        if self._listening:
+            return
+        self._listening = True
+
+        def _after_commit(session: Session) -> None:
+            user_id = session.info.get("user_id")
+            if user_id is not None:
+                self.mark_write(user_id)
+
+        event.listen(Session, "after_commit", _after_commit)
+
+    def choose(self, user_id: int) -> Replica | None:
+        if not self.replicas:
+            self.primary_reads += 1
+            return None
+
+        now = time.time()
+        fresh = [replica for replica in self.replicas if replica.error is None and replica.lag(now) <= self.max_lag]
+        written_at = self._writes.get(user_id)
+        if written_at is not None:
+            candidates = [replica for replica in fresh if replica.applied_until > written_at]
+        else:
+            candidates = fresh
+
+        if not candidates:
+            self.primary_reads += 1
+            if fresh:
+                self.sticky_reads += 1
+            else:
+                self.lagging_reads += 1
+            return None
+        self.replica_reads += 1
+        return candidates[next(self._rotation) % len(candidates)]
+
+    def read_session(self, user_id: int) -> AsyncSession:
+        replica = self.choose(user_id)
+        return SessionLocal() if replica is None else replica.sessionmaker()
+
+    async def beat(self) -> None:
+        """Stamp the primary's heartbeat, then read every replica's copy of it."""
+        table = ReplicationHeartbeat.__table__
+        try:
+            async with engine.begin() as connection:
+                stamped = await connection.execute(sa.update(table).where(table.c.id == 1).values(beat_at=time.time()))
+                if not stamped.rowcount:
+                    await connection.execute(table.insert().values(id=1, beat_at=time.time()))
+        except Exception as e:
+            logging.warning(f"Replication heartbeat could not be written: {e}")
+
+        async def check(replica: Replica) -> None:
+            was_serving = replica.error is None and replica.lag(time.time()) <= self.max_lag
+            try:
+                replica.applied_until = await asyncio.wait_for(_read_heartbeat(replica.engine), timeout=self.max_lag) or 0.0
+                replica.error = None
+            except Exception as e:
+                replica.error = str(e) or type(e).__name__
+
+            serving = replica.error is None and replica.lag(time.time()) <= self.max_lag
+            if was_serving and not serving:
+                logging.warning(f"Replica {replica.name} taken out of rotation: {replica.error or f'{replica.lag(time.time()):.1f}s behind'}")
+            elif serving and not was_serving:
+                logging.info(f"Replica {replica.name} back in rotation")
+
+        await asyncio.gather(*(check(replica) for replica in self.replicas))
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="replica-heartbeat")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.beat()
+            except Exception:
+                logging.exception("Replication heartbeat failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict[str, object]:
+        now = time.time()
+        return {
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "lag_seconds": round(replica.lag(now), 3) if replica.applied_until else None,
+                    "serving": replica.error is None and replica.lag(now) <= self.max_lag,
+                    "error": replica.error,
+                }
+                for replica in self.replicas
+            ],
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "lagging_reads": self.lagging_reads,
+            "sticky_users": len(self._writes),
+        }
+
+
+replica_router = ReplicaRouter()
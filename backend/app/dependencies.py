@@ -1,27 +1,45 @@
+import hmac
+from app.core.config import MONITORING_TOKEN, STORAGE_WEBHOOK_TOKEN
 from app.database.database import SessionLocal
-from app.database.minio import init_minio_client
+from app.database.minio import init_bulk_minio_client, init_minio_client, minio_clients
+from app.database.replicas import replica_router
 from minio import Minio
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.principal_cache import principal_cache, token_digest
 from app.core.security import verify_token
-from app.database.models import User
+from app.schemas.user import AuthenticatedUser
 from app.services.user import _user_service
 from app.services.auth import _auth_service
 from app.services.drive import _drive_service
+from app.services.job import _job_service
+from app.services.quota import _quota_service
+from app.services.search import _search_service
+from app.services.archive import _archive_service
+from app.services.thumbnail import _thumbnail_service
 
 from fastapi import Request, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 
 # Databases
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_minio() -> Minio:
-    return init_minio_client()
+async def get_minio() -> Minio:
+    client = minio_clients.get("default")
+    if client is not None:
+        return client
+    # the first call checks/creates the bucket over the network, keep it off the event loop
+    return await run_in_threadpool(init_minio_client)
+
+async def get_bulk_minio() -> Minio:
+    # longer read timeouts, for batch deletes and listings
+    client = minio_clients.get("bulk")
+    if client is not None:
+        return client
+    return await run_in_threadpool(init_bulk_minio_client)
 
 class HTTPBearerCookie(HTTPBearer):
     async def __call__(self, request: Request):
@@ -44,7 +62,7 @@ class HTTPBearerCookie(HTTPBearer):
 
 # Authentication
 security = HTTPBearerCookie()
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_db)) -> AuthenticatedUser:
 
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,15 +70,47 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token_data = verify_token(credentials.credentials)
+    digest = token_digest(credentials.credentials)
+    token_data = verify_token(credentials.credentials, digest)
     if token_data is None or token_data.user_id is None:
         raise credentials_exception
+    # commits on this session count as the user's writes, for read-your-writes on replicas
+    replica_router.track_writes(db, token_data.user_id)
     
-    user = _user_service.get_user(token_data.user_id, db)
+    principal = await principal_cache.get(token_data.user_id, digest)
+    if principal is not None:
+        return principal
+
+    user = await _user_service.get_user(token_data.user_id, db)
     if user is None:
         raise credentials_exception
     
-    return user
+    principal = AuthenticatedUser.model_validate(user)
+    await principal_cache.set(token_data.user_id, digest, principal)
+    return principal
+
+# Read-only routes: a replica that already has the caller's last write, else the primary
+async def get_read_db(current_user: AuthenticatedUser = Depends(get_current_user)):
+    async with replica_router.read_session(current_user.id) as db:
+        yield db
+
+# MinIO bucket notifications authenticate with a shared token (notify_webhook auth_token)
+async def verify_storage_webhook(request: Request) -> None:
+    if not STORAGE_WEBHOOK_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    authorization = request.headers.get("Authorization", "")
+    token = authorization.removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(token.encode(), STORAGE_WEBHOOK_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid webhook token")
+
+# Internal pool, replica and breaker state is for monitoring, not for users of the API
+async def verify_monitoring_token(request: Request) -> None:
+    if not MONITORING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    authorization = request.headers.get("Authorization", "")
+    token = authorization.removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(token.encode(), MONITORING_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid monitoring token")
 
 # Services
 
@@ -71,4 +121,19 @@ def get_auth_service():
     return _auth_service
 
 def get_drive_service():
-    return _drive_service
\ No newline at end of file
+    return _drive_service
+
+def get_job_service():
+    return _job_service
+
+def get_quota_service():
+    return _quota_service
+
+def get_search_service():
+    return _search_service
+
+def get_archive_service():
+    return _archive_service
+
+def get_thumbnail_service():
+    return _thumbnail_service
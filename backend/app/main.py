@@ -2,7 +2,8 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database.database import engine
-from app.database.base import Base
+from app.database.migrations import check_schema
+from app.database.replicas import replica_router
 from app.core.config import (
     PROJECT_NAME, 
     PROJECT_DESCRIPTION, 
@@ -11,19 +12,41 @@ from app.core.config import (
     CORS_ALLOW_CREDENTIALS,
     CORS_ALLOW_METHODS,
     CORS_ALLOW_HEADERS,
+    JOB_RUN_IN_PROCESS,
+    SERVER_TIMING_ENABLED,
+    METRICS_ENABLED,
 )
-from app.core.health import router as health_router
-from app.routes import auth, users, drive
+from app.core.health import health_prober, router as health_router
+from app.core.timing import RequestTimingMiddleware
+from app.routes import auth, users, drive, jobs, hooks
+from app.services.search import _search_service
+from app.worker import JobWorkerPool, schedule_periodic_jobs
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # STARTUP
-    Base.metadata.create_all(bind=engine)
-    print("Tables created")
+    # refuses to start on an outdated schema; `python -m app.migrate` brings it up to date
+    await check_schema(engine)
+    print("Database schema is up to date")
+    await _search_service.detect_trigram(engine)
+
+    job_workers = None
+    if JOB_RUN_IN_PROCESS:
+        job_workers = JobWorkerPool()
+        job_workers.start()
+        await schedule_periodic_jobs()
+
+    health_prober.start()
+    replica_router.start()
 
     yield
 
     # SHUTDOWN - cleanup
+    await health_prober.stop()
+    await replica_router.stop()
+    if job_workers is not None:
+        await job_workers.stop()
+    await engine.dispose()
     print("App shutdown")
 
 app = FastAPI(
@@ -41,10 +64,13 @@ app.add_middleware(
     allow_methods=CORS_ALLOW_METHODS,
     allow_headers=CORS_ALLOW_HEADERS,
 )
+app.add_middleware(RequestTimingMiddleware, emit_header=SERVER_TIMING_ENABLED, record_metrics=METRICS_ENABLED)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(drive.router)
+app.include_router(jobs.router)
+app.include_router(hooks.router)
 app.include_router(health_router)
 
 @app.get("/")
@@ -0,0 +1,48 @@
+"""Schema migrations, run before starting a new release (and by the ``migrate`` service in docker-compose).
+
+    python -m app.migrate            # apply pending migrations
+    python -m app.migrate --status   # list migrations and whether they are applied
+
+Runs alongside the old release: indexes are built CONCURRENTLY on Postgres and
+backfills commit in batches of MIGRATION_BATCH_SIZE rows. Concurrent runs are serialised
+(an advisory lock on Postgres, BEGIN IMMEDIATE on SQLite).
+"""
+import argparse
+import asyncio
+import logging
+
+from app.database.migrations import MIGRATIONS, applied_versions, create_migration_engine, migrate
+
+
+async def status() -> None:
+    engine = create_migration_engine()
+    try:
+        async with engine.connect() as connection:
+            applied = await applied_versions(connection)
+    finally:
+        await engine.dispose()
+    for migration in MIGRATIONS:
+        applied_at = applied.get(migration.version)
+        state = f"applied {applied_at.isoformat()}" if applied_at else "pending"
+        print(f"{migration.version:>4}  {migration.name:<24} {state}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Drivium schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit without applying any")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.status:
+        await status()
+        return
+
+    applied = await migrate()
+    if applied:
+        logging.info(f"Applied {len(applied)} migration(s), schema is at version {applied[-1].version}")
+    else:
+        logging.info("Schema is up to date")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,9 +1,10 @@
-from fastapi import Depends, routing
-from app.dependencies import get_db, get_minio, get_drive_service, get_current_user
-from sqlalchemy.orm import Session
+from typing import Annotated
+from fastapi import Depends, Query, routing
+from fastapi.responses import RedirectResponse, StreamingResponse
+from app.dependencies import get_db, get_read_db, get_minio, get_bulk_minio, get_drive_service, get_job_service, get_search_service, get_archive_service, get_thumbnail_service, get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.drive import *
-from app.core.config import PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES
-from datetime import datetime, timedelta, timezone
+from app.schemas.job import FolderMoveJobRequest, JobResponse
 
 router = routing.APIRouter(prefix="/drive", tags=["drive"])
 
@@ -12,101 +13,276 @@ router = routing.APIRouter(prefix="/drive", tags=["drive"])
 # Generate presigned URL for file upload
 @router.post("/files", response_model=FileUploadResponse)
 async def request_file_upload(file: FileUploadRequest, 
-                              db: Session = Depends(get_db), 
+                              db: AsyncSession = Depends(get_db), 
                               minio = Depends(get_minio), 
                               drive_service = Depends(get_drive_service), 
                               current_user = Depends(get_current_user)):
     
-    return drive_service.get_upload_url(file, db, minio, current_user)
+    return await drive_service.get_upload_url(file, db, minio, current_user)
 
-# Frontend calls this after successful upload to minio - > the status of the file changes to UPLOADED
+# Sign download URLs for many files in one request (galleries, previews)
+@router.post("/files/download-urls", response_model=FileDownloadUrlsResponse)
+async def request_file_downloads(request: FileDownloadUrlsRequest,
+                                 db: AsyncSession = Depends(get_read_db),
+                                 minio = Depends(get_minio),
+                                 drive_service = Depends(get_drive_service),
+                                 current_user = Depends(get_current_user)):
+
+    return await drive_service.get_download_urls(request, db, minio, current_user)
+
+# Start a resumable multipart upload; part size is chosen from the declared file size
+@router.post("/files/multipart", response_model=MultipartUploadResponse)
+async def start_multipart_upload(file: FileUploadRequest,
+                                 db: AsyncSession = Depends(get_db),
+                                 minio = Depends(get_minio),
+                                 drive_service = Depends(get_drive_service),
+                                 current_user = Depends(get_current_user)):
+
+    return await drive_service.initiate_multipart_upload(file, db, minio, current_user)
+
+# Request upload tickets for many files at once; relative_path creates intermediate folders
+@router.post("/files/batch", response_model=FileBatchUploadResponse)
+async def request_batch_file_upload(batch: FileBatchUploadRequest,
+                                    db: AsyncSession = Depends(get_db),
+                                    minio = Depends(get_minio),
+                                    drive_service = Depends(get_drive_service),
+                                    current_user = Depends(get_current_user)):
+
+    return await drive_service.get_batch_upload_urls(batch, db, minio, current_user)
+
+# Confirm (or discard) a batch of uploads in one call
+@router.patch("/files/batch/upload-confirm", response_model=BatchUploadStatusResponse)
+async def confirm_batch_file_upload(request: BatchUploadStatusRequest,
+                                    db: AsyncSession = Depends(get_db),
+                                    minio = Depends(get_minio),
+                                    drive_service = Depends(get_drive_service),
+                                    job_service = Depends(get_job_service),
+                                    current_user = Depends(get_current_user)):
+
+    result = await drive_service.update_upload_status_batch(request, db, minio, current_user)
+    await job_service.enqueue_thumbnails(db, [file.id for file in result.files])
+    return result
+
+# Frontend calls this after successful upload to minio - > the object is checked and the file changes to UPLOADED
 @router.patch("/files/{file_id}/upload-confirm", response_model=FileResponse | None)
 async def confirm_file_upload( file_id: int,
                                file_data: UploadStatusRequest,
-                               db: Session = Depends(get_db), 
+                               db: AsyncSession = Depends(get_db), 
+                               minio = Depends(get_minio),
                                drive_service = Depends(get_drive_service), 
+                               job_service = Depends(get_job_service),
                                current_user = Depends(get_current_user)):
     
-    return drive_service.update_upload_status(file_id, file_data, db, current_user)
+    file = await drive_service.update_upload_status(file_id, file_data, db, minio, current_user)
+    if file is not None:
+        await job_service.enqueue_blob_verify(db, file.id)
+        await job_service.enqueue_thumbnails(db, [file.id])
+    return file
+
+# Presign PUT URLs for a set of parts; parts can be uploaded in parallel
+@router.post("/files/{file_id}/multipart/part-urls", response_model=MultipartPartUrlsResponse)
+async def request_multipart_part_urls(file_id: int,
+                                      request: MultipartPartUrlsRequest,
+                                      db: AsyncSession = Depends(get_db),
+                                      minio = Depends(get_minio),
+                                      drive_service = Depends(get_drive_service),
+                                      current_user = Depends(get_current_user)):
+
+    return await drive_service.get_multipart_part_urls(file_id, request, db, minio, current_user)
+
+# Parts already stored, so an interrupted upload can resume
+@router.get("/files/{file_id}/multipart/parts", response_model=MultipartPartsResponse)
+async def list_multipart_parts(file_id: int,
+                               db: AsyncSession = Depends(get_db),
+                               minio = Depends(get_bulk_minio),
+                               drive_service = Depends(get_drive_service),
+                               current_user = Depends(get_current_user)):
+
+    return await drive_service.list_multipart_parts(file_id, db, minio, current_user)
+
+@router.post("/files/{file_id}/multipart/complete", response_model=FileResponse)
+async def complete_multipart_upload(file_id: int,
+                                    request: MultipartCompleteRequest,
+                                    db: AsyncSession = Depends(get_db),
+                                    minio = Depends(get_bulk_minio),
+                                    drive_service = Depends(get_drive_service),
+                                    job_service = Depends(get_job_service),
+                                    current_user = Depends(get_current_user)):
+
+    file = await drive_service.complete_multipart_upload(file_id, request, db, minio, current_user)
+    await job_service.enqueue_blob_verify(db, file.id)
+    await job_service.enqueue_thumbnails(db, [file.id])
+    return file
+
+@router.delete("/files/{file_id}/multipart")
+async def abort_multipart_upload(file_id: int,
+                                 db: AsyncSession = Depends(get_db),
+                                 minio = Depends(get_minio),
+                                 drive_service = Depends(get_drive_service),
+                                 current_user = Depends(get_current_user)):
+
+    await drive_service.abort_multipart_upload(file_id, db, minio, current_user)
+    return {"message": "Multipart upload aborted."}
 
 # Generate presigned URL for file download
 @router.get("/files/{file_id}/download-url", response_model=FileDownloadResponse)
 async def request_file_download(file_id: int, 
-                                db: Session = Depends(get_db), 
+                                disposition: ContentDisposition = ContentDisposition.ATTACHMENT,
+                                db: AsyncSession = Depends(get_read_db), 
                                 minio = Depends(get_minio), 
                                 drive_service = Depends(get_drive_service), 
                                 current_user = Depends(get_current_user)):
     
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES)
+    return await drive_service.get_download_url(file_id, db, minio, current_user, disposition)
+
+# Redirect to a thumbnail (a size listed in the file's thumbnail_urls); safe to use as an <img> src
+@router.get("/files/{file_id}/thumbnail/{size}", response_class=RedirectResponse, status_code=307)
+async def request_file_thumbnail(file_id: int,
+                                 size: int,
+                                 db: AsyncSession = Depends(get_db),
+                                 minio = Depends(get_minio),
+                                 thumbnail_service = Depends(get_thumbnail_service),
+                                 current_user = Depends(get_current_user)):
 
-    return FileDownloadResponse(
-        url=drive_service.get_download_url(file_id, db, minio, current_user),
-        expires_at=expires_at
-    )
+    url, max_age = await thumbnail_service.get_thumbnail_url(file_id, size, db, minio, current_user)
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={max_age}"})
 
 @router.delete("/files/{file_id}")
 async def delete_file(file_id: int, 
-                      db: Session = Depends(get_db), 
+                      db: AsyncSession = Depends(get_db), 
                       minio = Depends(get_minio), 
                       drive_service = Depends(get_drive_service), 
                       current_user = Depends(get_current_user)):
     
-    drive_service.delete_file(file_id, db, minio, current_user)
+    await drive_service.delete_file(file_id, db, minio, current_user)
     return {"message": "File deleted successfully."}
 
 # Rename or move a file, return updated file metadata
 @router.patch("/files/{file_id}", response_model=FileResponse)
 async def edit_file(file_id: int,
                       request: FileEditRequest,
-                      db: Session = Depends(get_db), 
+                      db: AsyncSession = Depends(get_db), 
                       drive_service = Depends(get_drive_service), 
                       current_user = Depends(get_current_user)):
     
-    return drive_service.edit_file(file_id, request, db, current_user)
+    return await drive_service.edit_file(file_id, request, db, current_user)
 
 # FOLDER OPERATIONS
 
 # Create a new folder
 @router.post("/folders", response_model=FolderCreateResponse)
 async def create_folder(request: FolderCreateRequest,
-                        db: Session = Depends(get_db), 
+                        db: AsyncSession = Depends(get_db), 
                         drive_service = Depends(get_drive_service), 
                         current_user = Depends(get_current_user)):
     
-    return drive_service.create_folder(request, db, current_user)
+    return await drive_service.create_folder(request, db, current_user)
 
-@router.delete("/folders/{folder_id}")
+@router.delete("/folders/{folder_id}", response_model=FolderDeleteResponse)
 async def delete_folder(folder_id: int, 
-                        db: Session = Depends(get_db), 
-                        minio = Depends(get_minio),
+                        db: AsyncSession = Depends(get_db), 
+                        minio = Depends(get_bulk_minio),
                         drive_service = Depends(get_drive_service), 
                         current_user = Depends(get_current_user)):
     
-    drive_service.delete_folder(folder_id, db, minio, current_user)
-    return {"message": "Folder deleted successfully."}
+    return await drive_service.delete_folder(folder_id, db, minio, current_user)
+
+# Delete a folder tree in the background, poll GET /jobs/{job_id} for progress
+@router.post("/folders/{folder_id}/delete-job", response_model=JobResponse, status_code=202)
+async def delete_folder_job(folder_id: int,
+                            db: AsyncSession = Depends(get_db),
+                            job_service = Depends(get_job_service),
+                            current_user = Depends(get_current_user)):
+
+    return await job_service.enqueue_folder_delete(folder_id, db, current_user)
+
+# Move a folder tree in the background
+@router.post("/folders/{folder_id}/move-job", response_model=JobResponse, status_code=202)
+async def move_folder_job(folder_id: int,
+                          request: FolderMoveJobRequest,
+                          db: AsyncSession = Depends(get_db),
+                          job_service = Depends(get_job_service),
+                          current_user = Depends(get_current_user)):
+
+    return await job_service.enqueue_folder_move(folder_id, request, db, current_user)
 
 @router.patch("/folders/{folder_id}", response_model=FolderResponse)
 async def edit_folder(folder_id: int,
                       request: FolderEditRequest,
-                      db: Session = Depends(get_db), 
+                      db: AsyncSession = Depends(get_db), 
                       drive_service = Depends(get_drive_service), 
                       current_user = Depends(get_current_user)):
     
-    return drive_service.edit_folder(folder_id, request, db, current_user)
+    return await drive_service.edit_folder(folder_id, request, db, current_user)
+
+# Subtree totals (descendant folders, files, bytes) for a folder
+@router.get("/folders/{folder_id}/stats", response_model=FolderStatsResponse)
+async def folder_stats(folder_id: int,
+                       db: AsyncSession = Depends(get_db),
+                       drive_service = Depends(get_drive_service),
+                       current_user = Depends(get_current_user)):
+
+    return await drive_service.get_folder_stats(folder_id, db, current_user)
 
-# List contents of root folder
+# Download a folder and its subtree as a ZIP, streamed from storage
+@router.get("/folders/{folder_id}/archive", response_class=StreamingResponse)
+async def download_folder_archive(folder_id: int,
+                                  params: Annotated[ArchiveParams, Query()],
+                                  db: AsyncSession = Depends(get_db),
+                                  minio = Depends(get_bulk_minio),
+                                  archive_service = Depends(get_archive_service),
+                                  current_user = Depends(get_current_user)):
+
+    filename, chunks = await archive_service.archive_folder(folder_id, params.compression, db, minio, current_user)
+    return StreamingResponse(chunks, media_type="application/zip", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# List contents of root folder (pass limit/cursor for keyset pagination)
 @router.get("/folders/contents", response_model=FolderContentResponse)
-async def list_root_folder_contents(db: Session = Depends(get_db), 
+async def list_root_folder_contents(listing: Annotated[FolderListingParams, Query()],
+                                    db: AsyncSession = Depends(get_read_db), 
                                     drive_service = Depends(get_drive_service), 
                                     current_user = Depends(get_current_user)):
     
-    return drive_service.get_folder_content(db, current_user, None)
+    return await drive_service.get_folder_content(db, current_user, None, listing)
+
+# Stream a whole folder listing as NDJSON (one path line, then one line per folder and file)
+@router.get("/folders/contents/stream", response_class=StreamingResponse)
+async def stream_folder_contents(listing: Annotated[FolderStreamParams, Query()],
+                                 db: AsyncSession = Depends(get_read_db),
+                                 drive_service = Depends(get_drive_service),
+                                 current_user = Depends(get_current_user)):
+
+    rows = await drive_service.stream_folder_content(db, current_user, listing)
+    return StreamingResponse(rows, media_type="application/x-ndjson")
 
 # List contents of a folder by id
 @router.get("/folders/contents/{folder_id}", response_model=FolderContentResponse)
 async def list_folder_contents(folder_id: int,
-                               db: Session = Depends(get_db), 
+                               listing: Annotated[FolderListingParams, Query()],
+                               db: AsyncSession = Depends(get_read_db), 
                                drive_service = Depends(get_drive_service), 
                                current_user = Depends(get_current_user)):
     
-    return drive_service.get_folder_content(db, current_user, folder_id)
\ No newline at end of file
+    return await drive_service.get_folder_content(db, current_user, folder_id, listing)
+
+# Download a selection of files and folders as one ZIP
+@router.post("/archive", response_class=StreamingResponse)
+async def download_archive(request: ArchiveRequest,
+                           db: AsyncSession = Depends(get_db),
+                           minio = Depends(get_bulk_minio),
+                           archive_service = Depends(get_archive_service),
+                           current_user = Depends(get_current_user)):
+
+    filename, chunks = await archive_service.archive_selection(request, db, minio, current_user)
+    return StreamingResponse(chunks, media_type="application/zip", headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# SEARCH
+
+# Search file and folder names, best matches first (pass limit/cursor for the next page)
+@router.get("/search", response_model=SearchResponse)
+async def search(params: Annotated[SearchParams, Query()],
+                 db: AsyncSession = Depends(get_db),
+                 search_service = Depends(get_search_service),
+                 current_user = Depends(get_current_user)):
+
+    return await search_service.search(params, db, current_user)
@@ -0,0 +1,19 @@
+from fastapi import Depends, routing
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.dependencies import get_db, get_drive_service, get_job_service, verify_storage_webhook
+from app.schemas.storage_events import StorageEventNotification, StorageEventResponse
+
+router = routing.APIRouter(prefix="/hooks", tags=["hooks"], dependencies=[Depends(verify_storage_webhook)])
+
+# MinIO webhook target: ObjectCreated events confirm pending uploads without a client round trip
+@router.post("/minio", response_model=StorageEventResponse)
+async def storage_events(notification: StorageEventNotification,
+                         db: AsyncSession = Depends(get_db),
+                         drive_service = Depends(get_drive_service),
+                         job_service = Depends(get_job_service)):
+
+    confirmed = await drive_service.confirm_uploads_from_events(notification, db)
+    for file_id in confirmed:
+        await job_service.enqueue_blob_verify(db, file_id)
+    await job_service.enqueue_thumbnails(db, confirmed)
+    return StorageEventResponse(confirmed=confirmed)
@@ -0,0 +1,16 @@
+from fastapi import Depends, routing
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.dependencies import get_db, get_job_service, get_current_user
+from app.schemas.job import JobResponse
+from app.services.job import JobService
+
+router = routing.APIRouter(prefix="/jobs", tags=["jobs"])
+
+# Poll a background job for progress
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: int,
+                  db: AsyncSession = Depends(get_db),
+                  job_service: JobService = Depends(get_job_service),
+                  current_user = Depends(get_current_user)):
+
+    return await job_service.get_job(job_id, db, current_user)
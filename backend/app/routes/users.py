@@ -1,17 +1,29 @@
 from fastapi import Depends, routing
-from app.schemas.user import UserCreate, UserResponse
+from app.schemas.job import JobResponse
+from app.schemas.user import AuthenticatedUser, CurrentUserResponse, UserCreate, UserResponse
+from app.services.job import JobService
+from app.services.quota import QuotaService
 from app.services.user import UserService
-from app.dependencies import get_db, get_user_service
-from sqlalchemy.orm import Session
+from app.dependencies import get_db, get_read_db, get_job_service, get_quota_service, get_user_service
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_current_user
-from app.database.models import User
 
 router = routing.APIRouter(prefix="/users", tags=["users"])
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db), user_service: UserService = Depends(get_user_service)):
-    return user_service.create_user(user_data, db)
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db), user_service: UserService = Depends(get_user_service)):
+    return await user_service.create_user(user_data, db)
 
-@router.get("/me", response_model=UserResponse)
-async def read_current_user(current_user: User = Depends(get_current_user)):
-    return current_user
\ No newline at end of file
+@router.get("/me", response_model=CurrentUserResponse)
+async def read_current_user(db: AsyncSession = Depends(get_read_db),
+                            quota_service: QuotaService = Depends(get_quota_service),
+                            current_user: AuthenticatedUser = Depends(get_current_user)):
+    storage = await quota_service.get_usage(db, current_user.id)
+    return CurrentUserResponse(**current_user.model_dump(), storage=storage)
+
+# Recompute the caller's storage usage from their files in the background
+@router.post("/me/storage/reconcile", response_model=JobResponse, status_code=202)
+async def reconcile_storage(db: AsyncSession = Depends(get_db),
+                            job_service: JobService = Depends(get_job_service),
+                            current_user: AuthenticatedUser = Depends(get_current_user)):
+    return await job_service.enqueue_quota_reconcile(db, current_user)
\ No newline at end of file
@@ -1,8 +1,21 @@
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator, model_validator
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
-from app.core.config import MAX_FILE_SIZE_BYTES, ALLOWED_MIME_TYPES, FILENAME_PATTERN
+import re
+from app.core.config import (
+    ARCHIVE_SELECTION_MAX,
+    DOWNLOAD_URLS_BATCH_MAX,
+    MAX_FILE_SIZE_BYTES,
+    ALLOWED_MIME_TYPES,
+    FILENAME_PATTERN,
+    FOLDER_PAGE_SIZE_MAX,
+    MULTIPART_MAX_PARTS,
+    MULTIPART_PRESIGN_MAX_PARTS,
+    SEARCH_PAGE_SIZE_MAX,
+    UPLOAD_BATCH_MAX_DEPTH,
+    UPLOAD_BATCH_MAX_FILES,
+)
 
 class FileStatus(str, Enum):
     PENDING = "PENDING"
@@ -13,11 +26,10 @@ class Breadcrumb(BaseModel):
     name: str
 
 # FILE
-class FileUploadRequest(BaseModel):
+class FileUploadItem(BaseModel):
     name: str = Field(..., max_length=255,pattern=FILENAME_PATTERN)
     size: int = Field(..., ge=0, le=MAX_FILE_SIZE_BYTES)
     mime_type: str = Field(..., max_length=255)
-    folder_id: int | None = None
 
     @field_validator('mime_type')
     @classmethod
@@ -26,10 +38,100 @@ class FileUploadRequest(BaseModel):
             raise ValueError(f"Invalid file type: {v}.")
         return v
 
+class FileUploadRequest(FileUploadItem):
+    folder_id: int | None = None
+    # optional hex SHA-256 of the content; lets the backend skip the upload when it already has it
+    sha256: str | None = Field(default=None, pattern=r"^[0-9a-fA-F]{64}$")
+
+    @field_validator('sha256')
+    @classmethod
+    def normalize_sha256(cls, v: str | None) -> str | None:
+        return v.lower() if v else v
+
 class FileUploadResponse(BaseModel):
     file_id: int
+    presigned_url: str | None = None # None when deduplicated: nothing to upload
+    deduplicated: bool = False
+
+# MULTIPART UPLOAD
+class MultipartUploadResponse(BaseModel):
+    file_id: int
+    part_size: int # every part but the last must be exactly this size
+    part_count: int # 0 when deduplicated: nothing to upload
+    deduplicated: bool = False
+
+class MultipartPartUrlsRequest(BaseModel):
+    part_numbers: List[int] = Field(..., min_length=1, max_length=MULTIPART_PRESIGN_MAX_PARTS)
+
+    @field_validator('part_numbers')
+    @classmethod
+    def check_part_numbers(cls, v: List[int]) -> List[int]:
+        if any(n < 1 or n > MULTIPART_MAX_PARTS for n in v):
+            raise ValueError(f"Part numbers must be between 1 and {MULTIPART_MAX_PARTS}.")
+        return sorted(set(v))
+
+class MultipartPartUrl(BaseModel):
+    part_number: int
     presigned_url: str
 
+class MultipartPartUrlsResponse(BaseModel):
+    parts: List[MultipartPartUrl]
+    expires_at: datetime
+
+class MultipartPart(BaseModel):
+    part_number: int = Field(..., ge=1, le=MULTIPART_MAX_PARTS)
+    etag: str = Field(..., max_length=255)
+    size: int | None = None
+
+class MultipartPartsResponse(BaseModel):
+    file_id: int
+    part_size: int
+    part_count: int
+    parts: List[MultipartPart] # parts already stored, for resuming
+
+class MultipartCompleteRequest(BaseModel):
+    # omit to complete with the parts the storage reports as uploaded
+    parts: Optional[List[MultipartPart]] = Field(default=None, max_length=MULTIPART_MAX_PARTS)
+
+# BATCH UPLOAD
+class BatchFileUploadItem(FileUploadItem):
+    # folder path relative to the batch's target folder, e.g. "photos/2024"; missing folders are created
+    relative_path: str | None = Field(default=None, max_length=4096)
+
+    @field_validator('relative_path')
+    @classmethod
+    def check_relative_path(cls, v: str | None) -> str | None:
+        if v is None:
+            return v
+        parts = [part for part in v.strip("/").split("/")]
+        if parts == [""]:
+            return None
+        if len(parts) > UPLOAD_BATCH_MAX_DEPTH:
+            raise ValueError(f"Relative path is deeper than {UPLOAD_BATCH_MAX_DEPTH} folders.")
+        for part in parts:
+            if not part or len(part) > 255 or not re.match(FILENAME_PATTERN, part) or part in (".", ".."):
+                raise ValueError(f"Invalid folder name in relative path: {part!r}.")
+        return "/".join(parts)
+
+class FileBatchUploadRequest(BaseModel):
+    folder_id: int | None = None
+    files: List[BatchFileUploadItem] = Field(..., min_length=1, max_length=UPLOAD_BATCH_MAX_FILES)
+
+class BatchUploadTicket(BaseModel):
+    index: int # position in the request's files list
+    file_id: int
+    folder_id: int | None = None
+    presigned_url: str
+
+class FileBatchUploadResponse(BaseModel):
+    files: List[BatchUploadTicket]
+    folders: dict[str, int] # relative path -> folder id, for every folder the batch used or created
+    created_folders: int
+
+def parse_thumbnail_sizes(value: str | None) -> List[int]:
+    # stored as "256,1024"; NULL (not rendered yet) and "" (not an image) both mean none
+    return [int(size) for size in value.split(",") if size] if value else []
+
 class FileResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -39,6 +141,18 @@ class FileResponse(BaseModel):
     status: FileStatus
     uploaded_at: datetime | None = None
     folder_id: int | None = None
+    thumbnail_sizes: List[int] = [] # WebP thumbnails available, longest edge in pixels
+
+    @field_validator('thumbnail_sizes', mode='before')
+    @classmethod
+    def split_thumbnail_sizes(cls, v):
+        return parse_thumbnail_sizes(v) if v is None or isinstance(v, str) else v
+
+    # each redirects to a short-lived storage URL, so it can go straight into an <img src>
+    @computed_field
+    @property
+    def thumbnail_urls(self) -> Dict[str, str]:
+        return {str(size): f"/drive/files/{self.id}/thumbnail/{size}" for size in self.thumbnail_sizes}
 
 class FileEditRequest(BaseModel):
     model_config = ConfigDict(extra="forbid")
@@ -46,10 +160,25 @@ class FileEditRequest(BaseModel):
     new_name: Optional[str] = Field(default=None, max_length=255, pattern=FILENAME_PATTERN)
     new_folder_id: Optional[int] = None
 
+class ContentDisposition(str, Enum):
+    ATTACHMENT = "attachment" # save as, served as application/octet-stream
+    INLINE = "inline" # previews, served with the file's mime type
+
 class FileDownloadResponse(BaseModel):
     url: str
     expires_at: datetime
 
+class FileDownloadUrlsRequest(BaseModel):
+    file_ids: List[int] = Field(..., min_length=1, max_length=DOWNLOAD_URLS_BATCH_MAX)
+    disposition: ContentDisposition = ContentDisposition.ATTACHMENT
+
+class FileDownloadUrl(FileDownloadResponse):
+    file_id: int
+
+class FileDownloadUrlsResponse(BaseModel):
+    urls: List[FileDownloadUrl]
+    missing: List[int] # not found or not owned by the caller
+
 # FOLDER
 class FolderCreateRequest(BaseModel):
     name: str = Field(..., max_length=255,pattern=FILENAME_PATTERN)
@@ -65,6 +194,21 @@ class FolderResponse(BaseModel):
     parent_folder_id: int | None = None
     created_at: datetime
 
+class FolderDeleteResponse(BaseModel):
+    message: str
+    deleted_folders: int
+    deleted_files: int
+    collect_ms: float
+    storage_ms: float
+    database_ms: float
+
+class FolderStatsResponse(BaseModel):
+    folder_id: int
+    depth: int
+    folder_count: int # descendants, not counting the folder itself
+    file_count: int
+    total_size: int
+
 class FolderEditRequest(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
@@ -76,9 +220,104 @@ class FolderEditRequest(BaseModel):
 class UploadStatusRequest(BaseModel):
     success: bool
 
+class BatchUploadStatusRequest(BaseModel):
+    file_ids: List[int] = Field(..., min_length=1, max_length=UPLOAD_BATCH_MAX_FILES)
+    success: bool
+
+class BatchUploadStatusResponse(BaseModel):
+    files: List[FileResponse] # confirmed files, empty when success is false
+    removed: List[int] # pending records dropped after a failed upload
+    skipped: List[int] # not found, not owned by the caller or no longer pending
+    missing: List[int] = [] # still pending: storage has no object for them yet
+
+# LISTING
+
+class FileSortField(str, Enum):
+    UPLOADED_AT = "uploaded_at"
+    NAME = "name"
+    SIZE = "size"
+
+class SortOrder(str, Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+# folders always come first ordered by (name, id), then files ordered by (sort, id)
+class FolderSortParams(BaseModel):
+    sort: FileSortField = FileSortField.UPLOADED_AT
+    order: SortOrder = SortOrder.DESC
+
+class FolderListingParams(FolderSortParams):
+    limit: int | None = Field(default=None, ge=1, le=FOLDER_PAGE_SIZE_MAX) # no limit returns the whole folder
+    cursor: str | None = None # next_cursor from the previous page
+
+class FolderStreamParams(FolderSortParams):
+    folder_id: int | None = None # root when omitted
+
 # returns the contents of a folder and a way to navigate back
 class FolderContentResponse(BaseModel):
     folder_id: int | None = None
     path: List[Breadcrumb] # root relative path for the current folder so that frontend can go back to parent folders
     folders: List[FolderResponse]
     files: List[FileResponse]
+    next_cursor: str | None = None
+
+# ARCHIVE
+
+class ArchiveCompression(str, Enum):
+    STORED = "stored" # no compression: fastest, and most drive content is already compressed
+    DEFLATED = "deflated"
+
+class ArchiveParams(BaseModel):
+    compression: ArchiveCompression = ArchiveCompression.STORED
+
+class ArchiveRequest(ArchiveParams):
+    file_ids: List[int] = Field(default_factory=list, max_length=ARCHIVE_SELECTION_MAX)
+    folder_ids: List[int] = Field(default_factory=list, max_length=ARCHIVE_SELECTION_MAX) # each included with its subtree
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if not self.file_ids and not self.folder_ids:
+            raise ValueError("Select at least one file or folder")
+        return self
+
+# SEARCH
+
+class SearchResultType(str, Enum):
+    FILE = "file"
+    FOLDER = "folder"
+
+class SearchParams(BaseModel):
+    q: str = Field(..., max_length=255) # matched anywhere in the name, case-insensitive
+    type: SearchResultType | None = None
+    mime_type: str | None = None # exact, or a prefix ending in "/" (e.g. image/); files only
+    min_size: int | None = Field(default=None, ge=0) # files only
+    max_size: int | None = Field(default=None, ge=0) # files only
+    modified_after: datetime | None = None # uploaded_at for files, created_at for folders
+    modified_before: datetime | None = None
+    folder_id: int | None = None # restrict to this folder's subtree
+    limit: int = Field(default=50, ge=1, le=SEARCH_PAGE_SIZE_MAX)
+    cursor: str | None = None # next_cursor from the previous page
+
+    @field_validator('q')
+    @classmethod
+    def normalize_query(cls, v: str) -> str:
+        v = " ".join(v.split()).lower()
+        if len(v) < 2:
+            raise ValueError("Search query must be at least 2 characters")
+        return v
+
+class SearchResult(BaseModel):
+    type: SearchResultType
+    id: int
+    name: str
+    score: float # higher is better: 1 for a name prefix match plus trigram similarity
+    folder_id: int | None = None # containing folder
+    size: int | None = None
+    mime_type: str | None = None
+    status: FileStatus | None = None
+    modified_at: datetime | None = None
+    path: List[Breadcrumb] # root relative path of the containing folder
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    next_cursor: str | None = None
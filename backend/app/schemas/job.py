@@ -0,0 +1,30 @@
+from pydantic import BaseModel, ConfigDict
+from enum import Enum
+from typing import Any
+from datetime import datetime
+
+class JobStatus(str, Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+class JobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    status: JobStatus
+    progress_done: int
+    progress_total: int | None = None
+    attempts: int
+    result: dict[str, Any] | None = None
+    error: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    finished_at: datetime | None = None
+
+class FolderMoveJobRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    new_parent_folder_id: int | None = None
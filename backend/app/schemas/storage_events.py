@@ -0,0 +1,29 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List
+
+# Subset of the S3 event notification format MinIO posts to webhook targets
+
+
+class S3EventBucket(BaseModel):
+    name: str
+
+class S3EventObject(BaseModel):
+    key: str # URL-encoded object name
+    size: int | None = None
+    etag: str | None = Field(default=None, alias="eTag")
+
+class S3EventEntity(BaseModel):
+    bucket: S3EventBucket
+    object: S3EventObject
+
+class S3EventRecord(BaseModel):
+    event_name: str = Field(alias="eventName")
+    s3: S3EventEntity
+
+class StorageEventNotification(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    records: List[S3EventRecord] = Field(default=[], alias="Records")
+
+class StorageEventResponse(BaseModel):
+    confirmed: List[int] # file ids marked UPLOADED by this notification
@@ -16,3 +16,24 @@ class UserResponse(UserBase):
     model_config = {
         "from_attributes": True
     }
+
+class StorageUsageResponse(BaseModel):
+    used: int
+    quota: int | None = None # None = unlimited
+    available: int | None = None
+
+class CurrentUserResponse(UserResponse):
+    storage: StorageUsageResponse
+
+# what get_current_user hands to routes; plain data so it can be cached across requests
+class AuthenticatedUser(BaseModel):
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    created_at: datetime | None = None
+
+    model_config = {
+        "from_attributes": True,
+        "frozen": True
+    }
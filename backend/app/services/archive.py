@@ -0,0 +1,285 @@
+import asyncio
+import logging
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, NamedTuple, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from fastapi import HTTPException
+from minio import Minio
+from minio.error import S3Error
+from app.core.config import ARCHIVE_CHUNK_SIZE, ARCHIVE_MAX_FILES, ARCHIVE_PREFETCH
+from app.database.models import File, FileStatus, Folder, StorageObject
+from app.schemas.drive import ArchiveCompression, ArchiveRequest
+from app.schemas.user import AuthenticatedUser
+from app.services.drive import _drive_service
+
+ZIP_COMPRESSION = {
+    ArchiveCompression.STORED: zipfile.ZIP_STORED,
+    ArchiveCompression.DEFLATED: zipfile.ZIP_DEFLATED,
+}
+
+
+class _Entry(NamedTuple):
+    path: str  # inside the archive; directories end with "/"
+    object_name: str | None
+    size: int
+    modified: datetime | None
+
+
+class _ZipSink:
+    """Write-only stream for zipfile; what it wrote is drained and sent after each write.
+
+    It has no tell()/seek(), so zipfile writes sizes and CRCs in data descriptors after
+    each member instead of seeking back, and never needs more than the pending bytes.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _safe_segment(name: str) -> str:
+    # names are validated on the way in, but "." and ".." pass the filename pattern
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    return "_" if name in ("", ".", "..") else name
+
+
+def _zip_time(value: datetime | None) -> Tuple[int, int, int, int, int, int]:
+    # the ZIP format can't express anything before 1980
+    if value is None or value.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return value.timetuple()[:6]
+
+
+def _open_object(minio: Minio, bucket_name: str, object_name: str, size: int):
+    response = minio.get_object(bucket_name, object_name)
+    if size > ARCHIVE_CHUNK_SIZE:
+        return response
+    # small objects are read whole while prefetching, so the connection goes straight back to the pool
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+async def _write(member, data: bytes, compression: ArchiveCompression) -> None:
+    # deflate manages tens of MB/s, so a chunk compressed here would stall every other request
+    if compression == ArchiveCompression.DEFLATED:
+        await run_in_threadpool(member.write, data)
+    else:
+        member.write(data)
+
+
+def _close_object(response) -> None:
+    response.close()
+    response.release_conn()
+
+
+class ArchiveService:
+    """Streams folders and selections as ZIP files, straight from object storage.
+
+    The file list is read up front (one subtree query per folder) and the database
+    connection is released before the first byte is sent. Objects are then opened
+    ARCHIVE_PREFETCH ahead of the one being written and copied in ARCHIVE_CHUNK_SIZE
+    reads, so memory stays bounded whatever the archive size.
+    """
+
+    async def archive_folder(self, folder_id: int, compression: ArchiveCompression, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> Tuple[str, AsyncIterator[bytes]]:
+        folder = await db.get(Folder, folder_id)
+        if not folder:
+            raise HTTPException(404, "Folder not found")
+        if folder.owner_id != current_user.id:
+            raise HTTPException(403, "Not authorized for this folder")
+
+        entries: List[_Entry] = []
+        used: set = set()
+        await self._add_folder(db, folder, entries, used, current_user.id)
+        self._check_size(entries)
+        # nothing below needs the database; don't hold a connection for the whole download
+        await db.commit()
+        return f"{_safe_segment(folder.name)}.zip", self._stream(entries, minio, compression)
+
+    async def archive_selection(self, request: ArchiveRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> Tuple[str, AsyncIterator[bytes]]:
+        entries: List[_Entry] = []
+        used: set = set()
+
+        if request.folder_ids:
+            folders = (await db.scalars(select(Folder).where(
+                Folder.id.in_(request.folder_ids),
+                Folder.owner_id == current_user.id
+            ).order_by(Folder.name, Folder.id))).all()
+            if len(folders) != len(set(request.folder_ids)):
+                raise HTTPException(404, "Folder not found")
+            for folder in folders:
+                await self._add_folder(db, folder, entries, used, current_user.id)
+                self._check_size(entries)
+
+        if request.file_ids:
+            rows = (await db.execute(self._files_query(current_user.id).where(
+                File.id.in_(request.file_ids)
+            ).order_by(File.name, File.id))).all()
+            if len(rows) != len(set(request.file_ids)):
+                raise HTTPException(404, "File not found")
+            entries.extend(self._file_entry(row, self._unique(used, "", row.name)) for row in rows)
+            self._check_size(entries)
+
+        await db.commit()
+        return "download.zip", self._stream(entries, minio, request.compression)
+
+    def _files_query(self, user_id: int):
+        return select(
+            File.name,
+            File.folder_id,
+            File.size,
+            File.uploaded_at,
+            File.owner_id,
+            File.storage_key,
+            StorageObject.object_name
+        ).outerjoin(StorageObject, File.blob_id == StorageObject.id).where(
+            File.owner_id == user_id,
+            File.status == FileStatus.UPLOADED
+        )
+
+    @staticmethod
+    def _file_entry(row, path: str) -> _Entry:
+        object_name = row.object_name or f"users/{row.owner_id}/{row.storage_key}"
+        return _Entry(path, object_name, row.size, row.uploaded_at)
+
+    @staticmethod
+    def _unique(used: set, directory: str, name: str, is_dir: bool = False) -> str:
+        # the drive allows siblings with the same name, a ZIP extracted on most systems doesn't
+        name = _safe_segment(name)
+        stem, dot, extension = name.rpartition(".")
+        if is_dir or not stem:
+            stem, dot, extension = name, "", ""
+        candidate, n = name, 1
+        while (directory + candidate).casefold() in used:
+            candidate = f"{stem} ({n}){dot}{extension}"
+            n += 1
+        used.add((directory + candidate).casefold())
+        return directory + candidate
+
+    async def _add_folder(self, db: AsyncSession, folder: Folder, entries: List[_Entry], used: set, user_id: int) -> None:
+        subtree = (await db.execute(
+            select(Folder.id, Folder.name, Folder.parent_folder_id, Folder.created_at).where(
+                Folder.owner_id == user_id,
+                Folder.path.like(f"{folder.path}%")
+            ).order_by(Folder.depth, Folder.name, Folder.id)
+        )).all()
+
+        # parents come first (ordered by depth), so every folder's directory is known before its children
+        directories: Dict[int, str] = {}
+        for row in subtree:
+            parent = "" if row.id == folder.id else directories.get(row.parent_folder_id)
+            if parent is None:
+                continue
+            directories[row.id] = self._unique(used, parent, row.name, is_dir=True) + "/"
+            entries.append(_Entry(directories[row.id], None, 0, row.created_at))
+
+        rows = await db.execute(
+            self._files_query(user_id).where(
+                File.folder_id.in_(_drive_service._subtree_folders(folder.path, user_id))
+            ).order_by(File.folder_id, File.name, File.id).limit(ARCHIVE_MAX_FILES + 1)
+        )
+        for row in rows:
+            directory = directories.get(row.folder_id)
+            if directory is not None:
+                entries.append(self._file_entry(row, self._unique(used, directory, row.name)))
+
+    @staticmethod
+    def _check_size(entries: List[_Entry]) -> None:
+        if sum(1 for entry in entries if entry.object_name is not None) > ARCHIVE_MAX_FILES:
+            raise HTTPException(413, f"An archive can contain at most {ARCHIVE_MAX_FILES} files")
+
+    async def _prefetch(self, entries: List[_Entry], minio: Minio, opened: asyncio.Queue) -> None:
+        for entry in entries:
+            task = None
+            if entry.object_name is not None:
+                task = asyncio.ensure_future(_drive_service._storage_call(
+                    _open_object, minio, _drive_service.BUCKET_NAME, entry.object_name, entry.size, operation="get_object"
+                ))
+            # the queue is bounded, so at most ARCHIVE_PREFETCH objects are open or buffered at once
+            try:
+                await opened.put((entry, task))
+            except asyncio.CancelledError:
+                if task is not None:
+                    task.add_done_callback(_discard_opened)
+                raise
+        await opened.put(None)
+
+    async def _stream(self, entries: List[_Entry], minio: Minio, compression: ArchiveCompression) -> AsyncIterator[bytes]:
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, mode="w", compression=ZIP_COMPRESSION[compression], allowZip64=True)
+        opened: asyncio.Queue = asyncio.Queue(maxsize=ARCHIVE_PREFETCH)
+        prefetch = asyncio.create_task(self._prefetch(entries, minio, opened))
+        try:
+            while (item := await opened.get()) is not None:
+                entry, task = item
+                if task is None:
+                    archive.writestr(zipfile.ZipInfo(entry.path, date_time=_zip_time(entry.modified)), b"")
+                    continue
+
+                try:
+                    body = await task
+                except S3Error as e:
+                    if e.code != "NoSuchKey":
+                        raise
+                    # a lost object shouldn't cost the user the rest of the archive
+                    logging.warning(f"Archive skipped {entry.object_name}: object is missing")
+                    continue
+
+                info = zipfile.ZipInfo(entry.path, date_time=_zip_time(entry.modified))
+                info.file_size = entry.size  # lets zipfile decide on ZIP64 before the data is written
+                info.compress_type = ZIP_COMPRESSION[compression]
+                info.external_attr = 0o644 << 16
+                with archive.open(info, mode="w") as member:
+                    if isinstance(body, bytes):
+                        await _write(member, body, compression)
+                    else:
+                        try:
+                            while chunk := await run_in_threadpool(body.read, ARCHIVE_CHUNK_SIZE):
+                                await _write(member, chunk, compression)
+                                yield sink.drain()
+                        finally:
+                            await run_in_threadpool(_close_object, body)
+
+                # small members are sent together rather than as one tiny write each
+                if len(sink) >= ARCHIVE_CHUNK_SIZE:
+                    yield sink.drain()
+
+            archive.close()
+            yield sink.drain()
+        finally:
+            prefetch.cancel()
+            # anything still prefetched when the client goes away holds a storage connection
+            while not opened.empty():
+                item = opened.get_nowait()
+                if item is not None and item[1] is not None:
+                    item[1].add_done_callback(_discard_opened)
+
+
+def _discard_opened(task: asyncio.Future) -> None:
+    if task.cancelled() or task.exception() is not None:
+        return
+    if not isinstance(task.result(), bytes):
+        _close_object(task.result())
+
+
+_archive_service = ArchiveService()
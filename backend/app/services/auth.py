@@ -1,19 +1,30 @@
 from app.schemas.auth import UserLogin, TokenData
 from app.database.models import User
-from app.core.security import create_access_token, verify_password
-from sqlalchemy.orm import Session
+from app.core.security import create_access_token, verify_and_update_password
+from app.database.replicas import replica_router
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
 class AuthService:
-    def login(self, user_data: UserLogin, db: Session):
-        user = db.query(User).filter(User.username == user_data.username).first()
+    async def login(self, user_data: UserLogin, db: AsyncSession):
+        user = await db.scalar(select(User).where(User.username == user_data.username))
 
-        if not user or not verify_password(user_data.password, user.password_hash):
+        if not user:
             raise HTTPException(status_code=401, detail="Invalid username or password")
+        valid, new_hash = await verify_and_update_password(user_data.password, user.password_hash, db)
+        if not valid:
+            raise HTTPException(status_code=401, detail="Invalid username or password")
+        if new_hash is not None:
+            # hashed with older parameters (or bcrypt); upgraded while the password is at hand
+            user.password_hash = new_hash
+            await db.commit()
 
+        # a brand-new account may not have reached the replicas yet: start the session on the primary
+        replica_router.mark_write(user.id)
         token_data = TokenData(username=user.username, user_id=user.id)
         access_token = create_access_token(token_data)
 
         return {"access_token": access_token, "token_type": "bearer"}
     
-_auth_service = AuthService()
\ No newline at end of file
+_auth_service = AuthService()
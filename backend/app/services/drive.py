@@ -1,21 +1,70 @@
+import asyncio
+import base64
+import json
 import logging
-from typing import List
+import math
+import time
+from typing import AsyncIterator, List, Tuple
 import uuid
-from urllib.parse import urlsplit, urlunsplit
-from sqlalchemy.orm import Session
+from collections import Counter, defaultdict
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+import sqlalchemy as sa
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from app.schemas.drive import *
+from app.schemas.storage_events import StorageEventNotification
+from app.schemas.user import AuthenticatedUser
+from app.core.cache import TTLCache
+from app.core.metrics import time_storage_operation
+from app.database.minio import is_connection_error, minio_breaker, storage_unavailable
+from app.services.quota import _quota_service
 from app.core.config import (
+    DB_DELETE_BATCH_SIZE,
+    DEDUP_SCOPE,
+    DOWNLOAD_URL_CACHE_MAX_ENTRIES,
+    DOWNLOAD_URL_REUSE_FRACTION,
+    FOLDER_STREAM_BATCH_SIZE,
     MINIO_BUCKET_NAME,
     MINIO_PUBLIC_PREFIX,
+    MULTIPART_MAX_PARTS,
+    MULTIPART_MIN_PART_SIZE_BYTES,
     PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES,
     PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES,
+    STORAGE_DELETE_BATCH_SIZE,
+    THUMBNAIL_SIZES,
+    UPLOAD_VERIFY_CONCURRENCY,
 )
-from app.database.models import File, Folder, User
+from app.database.models import File, Folder, StorageObject
 from fastapi import HTTPException
 from minio import Minio
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 from datetime import datetime, timedelta, timezone
 
+
+def _chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# derived objects live next to their source, so they can be found (and removed) from its name alone
+THUMBNAIL_KEY_MARKER = ".thumb-"
+
+
+def thumbnail_object_name(object_name: str, size: int) -> str:
+    return f"{object_name}{THUMBNAIL_KEY_MARKER}{size}.webp"
+
+
+# (file_id, disposition) -> (url, expires_at, signed_for); entries drop out of the cache
+# once less than DOWNLOAD_URL_REUSE_FRACTION of the URL's lifetime remains
+download_url_cache = TTLCache(
+    maxsize=DOWNLOAD_URL_CACHE_MAX_ENTRIES,
+    ttl=PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES * 60 * (1 - DOWNLOAD_URL_REUSE_FRACTION)
+)
+
 class DriveService:
     def __init__(self):
         self.BUCKET_NAME = MINIO_BUCKET_NAME
@@ -31,14 +80,157 @@ class DriveService:
         parsed = urlsplit(presigned_url)
         return urlunsplit(("", "", f"{prefix}{parsed.path}", parsed.query, ""))
 
-    def get_upload_url(self, file_data: FileUploadRequest, db: Session, minio: Minio, current_user: User) -> FileUploadResponse:
+    async def _storage_call(self, fn, *args, operation: str | None = None, breaker: bool = True, **kwargs):
+        # fail fast while MinIO is known to be down instead of tying up a thread per request;
+        # presigned URLs are signed locally (MINIO_REGION is fixed) and pass breaker=False, so they
+        # neither wait on an open circuit nor count as evidence that MinIO is up
+        if breaker and not minio_breaker.allow():
+            raise storage_unavailable()
+
+        # the MinIO SDK is blocking (urllib3), so every storage call runs in the threadpool
+        with time_storage_operation(operation or fn.__name__.lstrip("_")):
+            try:
+                result = await run_in_threadpool(fn, *args, **kwargs)
+            except Exception as e:
+                if not is_connection_error(e):
+                    if breaker:
+                        minio_breaker.record_success()
+                    raise
+                if breaker:
+                    minio_breaker.record_failure()
+                logging.warning(f"Object storage call failed: {type(e).__name__}: {e}")
+                raise storage_unavailable()
+            except BaseException:
+                # cancelled, e.g. the client went away: without this a half-open trial would never end
+                if breaker:
+                    minio_breaker.release_trial()
+                raise
+        if breaker:
+            minio_breaker.record_success()
+        return result
+
+    # CONTENT DEDUP
+    @staticmethod
+    def _dedup_enabled(file_data: FileUploadRequest) -> bool:
+        return bool(file_data.sha256) and DEDUP_SCOPE in ("user", "global")
+
+    async def _claim_blob(self, db: AsyncSession, sha256: str, size: int, user_id: int) -> int | None:
+        # only verified blobs are candidates: a declared hash alone proves nothing about the content
+        query = select(StorageObject.id).where(
+            StorageObject.sha256 == sha256,
+            StorageObject.size == size,
+            StorageObject.verified.is_(True)
+        )
+        if DEDUP_SCOPE == "user":
+            query = query.where(StorageObject.owner_id == user_id)
+
+        for blob_id in (await db.scalars(query.order_by(StorageObject.id).limit(5))).all():
+            # a blob whose last file is being deleted concurrently is skipped rather than resurrected
+            claimed = await db.scalar(
+                sa.update(StorageObject)
+                .where(StorageObject.id == blob_id, StorageObject.ref_count > 0)
+                .values(ref_count=StorageObject.ref_count + 1)
+                .returning(StorageObject.id)
+                .execution_options(synchronize_session=False)
+            )
+            if claimed is not None:
+                return claimed
+        return None
+
+    async def _link_duplicate(self, db: AsyncSession, file_data: FileUploadRequest, user_id: int) -> File | None:
+        if not self._dedup_enabled(file_data):
+            return None
+
+        try:
+            blob_id = await self._claim_blob(db, file_data.sha256, file_data.size, user_id)
+            if blob_id is None:
+                return None
+
+            db_file = File(
+                name=file_data.name,
+                storage_key=str(uuid.uuid4()),
+                size=file_data.size,
+                mime_type=file_data.mime_type,
+                folder_id=file_data.folder_id,
+                status=FileStatus.UPLOADED,
+                uploaded_at=datetime.now(timezone.utc),
+                owner_id=user_id,
+                blob_id=blob_id,
+                # thumbnails belong to the object, so an earlier copy's are this file's too
+                thumbnail_sizes=await db.scalar(select(File.thumbnail_sizes).where(
+                    File.blob_id == blob_id,
+                    File.thumbnail_sizes.is_not(None)
+                ).limit(1))
+            )
+            db.add(db_file)
+            await db.commit()
+            return db_file
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(500, f"Failed to link duplicate content: {str(e)}")
+
+    def _attach_new_blob(self, db: AsyncSession, db_file: File, sha256: str) -> None:
+        # the object keeps the first uploader's key; later duplicates only add references
+        db_file.blob = StorageObject(
+            owner_id=db_file.owner_id,
+            object_name=f"users/{db_file.owner_id}/{db_file.storage_key}",
+            sha256=sha256,
+            size=db_file.size,
+            verified=False,
+            ref_count=1
+        )
+        db.add(db_file.blob)
+
+    async def _unref_blobs(self, db: AsyncSession, blob_ids: List[int]) -> List[str]:
+        """Drop one reference per entry in blob_ids and delete blobs nothing references any more.
+
+        Returns the object names of the deleted blobs. The caller removes those objects only
+        after committing, so a rolled back delete never loses content another file still uses.
+        """
+        if not blob_ids:
+            return []
+
+        # the referencing file rows must be gone before their blob rows can be
+        await db.flush()
+
+        by_count = defaultdict(list)
+        for blob_id, count in Counter(blob_ids).items():
+            by_count[count].append(blob_id)
+        for count, ids in by_count.items():
+            await db.execute(
+                sa.update(StorageObject)
+                .where(StorageObject.id.in_(ids))
+                .values(ref_count=StorageObject.ref_count - count)
+                .execution_options(synchronize_session=False)
+            )
+
+        return list((await db.scalars(
+            sa.delete(StorageObject)
+            .where(StorageObject.id.in_(set(blob_ids)), StorageObject.ref_count <= 0)
+            .returning(StorageObject.object_name)
+        )).all())
+
+    async def _remove_released_objects(self, minio: Minio, object_names: List[str]) -> None:
+        # the rows are already gone, so an object left behind here only wastes space until GC
+        try:
+            await self._remove_objects(minio, object_names)
+        except HTTPException as e:
+            logging.warning(f"Failed to remove {len(object_names)} unreferenced objects: {e.detail}")
+
+    async def get_upload_url(self, file_data: FileUploadRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> FileUploadResponse:
         if file_data.folder_id is not None:
-            folder = db.query(Folder).filter(Folder.id == file_data.folder_id).first()
+            folder = await db.get(Folder, file_data.folder_id)
             if not folder:
                 raise HTTPException(404, "Folder not found")
             if folder.owner_id != current_user.id:
                 raise HTTPException(403, "Not authorized for this folder")
 
+        await _quota_service.reserve(db, current_user.id, file_data.size)
+
+        duplicate = await self._link_duplicate(db, file_data, current_user.id)
+        if duplicate is not None:
+            return FileUploadResponse(file_id=duplicate.id, deduplicated=True)
+
         db_file = File(
             name=file_data.name,
             storage_key=str(uuid.uuid4()),
@@ -48,9 +240,11 @@ class DriveService:
             status=FileStatus.PENDING,
             owner_id=current_user.id
         )
+        if self._dedup_enabled(file_data):
+            self._attach_new_blob(db, db_file, file_data.sha256)
 
         db.add(db_file)
-        db.flush()
+        await db.flush()
         file_id = db_file.id
 
         if not file_id:
@@ -59,13 +253,15 @@ class DriveService:
         try:
             object_name = f"users/{current_user.id}/{db_file.storage_key}"
                         
-            presigned_url = minio.presigned_put_object(
+            presigned_url = await self._storage_call(
+                minio.presigned_put_object,
                 self.BUCKET_NAME, 
                 object_name, 
-                expires=timedelta(minutes=PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES)
+                expires=timedelta(minutes=PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES),
+                breaker=False
             )
             
-            db.commit()
+            await db.commit()
             
             return FileUploadResponse(
                 file_id=file_id,
@@ -74,86 +270,581 @@ class DriveService:
             
         except S3Error as e:
             logging.error(f"S3Error details: code={e.code}, message='{e.message}', bucket={self.BUCKET_NAME}, object={object_name}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(503, "Object storage unavailable")
+        except HTTPException:
+            await db.rollback()
+            raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(500, f"Failed to generate upload URL: {str(e)}")
         
-    def update_upload_status(self,file_id: int, status_data: UploadStatusRequest, db: Session, current_user: User) -> FileResponse | None:
+    async def update_upload_status(self,file_id: int, status_data: UploadStatusRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> FileResponse | None:
         try:
-            file = db.query(File).filter(
-                File.id == file_id, 
-            ).first()
+            file = await db.get(File, file_id, options=[joinedload(File.blob)])
 
             if not file:
                 raise HTTPException(404, "File not found")
             
             if file.owner_id != current_user.id:
                 raise HTTPException(403, "Not authorized for this file")
+
+            # the storage webhook may have confirmed the upload before the client got to it
+            if file.status == FileStatus.UPLOADED and status_data.success and not file.upload_id:
+                return FileResponse.model_validate(file)
             
             if file.status != FileStatus.PENDING:
                 raise HTTPException(400, "File upload status cannot be updated from current state")
 
             if status_data.success:
-                file.status = FileStatus.UPLOADED
-                file.uploaded_at = datetime.now(timezone.utc)
-                db.commit()
-                return FileResponse(
-                    id=file.id,
-                    name=file.name,
-                    size=file.size,
-                    status=file.status,
-                    uploaded_at=file.uploaded_at,
-                    folder_id=file.folder_id
-                )
+                if file.upload_id:
+                    raise HTTPException(400, "Complete multipart uploads through the multipart endpoint")
+                stat = (await self._stat_objects(minio, [file.object_name]))[0]
+                if stat is None:
+                    raise HTTPException(409, "Object not found in storage, upload it before confirming")
+                try:
+                    await self._mark_uploaded(db, file, stat.size, stat.etag)
+                except HTTPException as e:
+                    if e.status_code == 507:
+                        await self._discard_over_quota(db, minio, [file])
+                    raise
+                await db.commit()
+                return FileResponse.model_validate(file)
             else:
-                db.delete(file)
-                db.commit()
+                if file.upload_id:
+                    raise HTTPException(400, "Abort multipart uploads through the multipart endpoint")
+                await _quota_service.release(db, current_user.id, file.size)
+                await db.delete(file)
+                # nothing was stored, so there is no object to remove along with the blob
+                if file.blob_id is not None:
+                    await self._unref_blobs(db, [file.blob_id])
+                await db.commit()
                 return None
         except HTTPException:
-            db.rollback()
+            await db.rollback()
             raise
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(500, "Failed to update upload status")
 
-    def get_download_url(self, file_id: int, db: Session, minio: Minio, current_user: User) -> str:    
-        
-        file = db.query(File).filter(
-            File.id == file_id, 
-        ).first()
-        
+    async def _stat_objects(self, minio: Minio, object_names: List[str]) -> list:
+        """stat_object for every name, UPLOAD_VERIFY_CONCURRENCY at a time; None where the object doesn't exist."""
+        semaphore = asyncio.Semaphore(UPLOAD_VERIFY_CONCURRENCY)
+
+        async def stat(object_name: str):
+            async with semaphore:
+                try:
+                    return await self._storage_call(minio.stat_object, self.BUCKET_NAME, object_name)
+                except S3Error as e:
+                    if e.code in ("NoSuchKey", "NoSuchObject"):
+                        return None
+                    raise HTTPException(503, "Object storage unavailable")
+
+        return await asyncio.gather(*(stat(object_name) for object_name in object_names))
+
+    async def _mark_uploaded(self, db: AsyncSession, file: File, size: int | None, etag: str | None) -> None:
+        await self._correct_size(db, file, size)
+        file.etag = etag
+        file.status = FileStatus.UPLOADED
+        file.uploaded_at = datetime.now(timezone.utc)
+        file.upload_id = None
+
+    async def _correct_size(self, db: AsyncSession, file: File, size: int | None) -> None:
+        # the stored object is authoritative: the declared size is corrected and the quota with it
+        if size is not None and size != file.size:
+            if size > file.size:
+                await _quota_service.reserve(db, file.owner_id, size - file.size)
+            else:
+                await _quota_service.release(db, file.owner_id, file.size - size)
+            if file.blob_id is not None:
+                await db.execute(
+                    sa.update(StorageObject).where(StorageObject.id == file.blob_id).values(size=size)
+                    .execution_options(synchronize_session=False)
+                )
+            file.size = size
+
+    async def _discard_over_quota(self, db: AsyncSession, minio: Minio, files: List[File]) -> None:
+        # the object grew past the quota after its ticket was issued: it must not stay in storage
+        # unaccounted for, so it is removed and the file left PENDING for the client to re-upload
+        # or cancel. A pending file's blob is unverified, so no other file can share the object.
+        object_names = [f"users/{file.owner_id}/{file.storage_key}" for file in files]
+        await db.rollback()
+        await self._remove_released_objects(minio, object_names)
+
+    async def confirm_uploads_from_events(self, notification: StorageEventNotification, db: AsyncSession) -> List[int]:
+        """Mark PENDING files UPLOADED from MinIO ObjectCreated notifications; returns their ids."""
+        confirmed = []
+        for record in notification.records:
+            if not record.event_name.startswith("s3:ObjectCreated:") or record.s3.bucket.name != self.BUCKET_NAME:
+                continue
+
+            owner, _, storage_key = unquote_plus(record.s3.object.key).removeprefix("users/").partition("/")
+            if not owner.isdigit() or not storage_key:
+                continue
+
+            file = await db.scalar(select(File).where(
+                File.owner_id == int(owner),
+                File.storage_key == storage_key,
+                File.status == FileStatus.PENDING
+            ))
+            if file is None:
+                continue
+
+            try:
+                await self._mark_uploaded(db, file, record.s3.object.size, record.s3.object.etag)
+            except HTTPException as e:
+                # over quota: stays PENDING and the client's confirm reports the error
+                logging.warning(f"Not confirming file {file.id} from storage event: {e.detail}")
+                continue
+            confirmed.append(file.id)
+
+        try:
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise HTTPException(500, "Failed to apply storage events")
+        return confirmed
+
+    # MULTIPART UPLOAD
+    # The Minio client has no public calls for a client-driven multipart upload, so this flow
+    # (and storage GC) uses its private _create_multipart_upload, _list_parts,
+    # _complete_multipart_upload and _abort_multipart_upload on purpose; minio is pinned in
+    # requirements.txt, check these signatures before upgrading it.
+    @staticmethod
+    def _choose_part_size(size: int) -> int:
+        # smallest whole-MiB part size that keeps the upload under MULTIPART_MAX_PARTS parts
+        mib = 1024 * 1024
+        part_size = max(MULTIPART_MIN_PART_SIZE_BYTES, math.ceil(size / MULTIPART_MAX_PARTS))
+        return math.ceil(part_size / mib) * mib
+
+    async def initiate_multipart_upload(self, file_data: FileUploadRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> MultipartUploadResponse:
+        if file_data.folder_id is not None:
+            folder = await db.get(Folder, file_data.folder_id)
+            if not folder:
+                raise HTTPException(404, "Folder not found")
+            if folder.owner_id != current_user.id:
+                raise HTTPException(403, "Not authorized for this folder")
+
+        await _quota_service.reserve(db, current_user.id, file_data.size)
+
+        duplicate = await self._link_duplicate(db, file_data, current_user.id)
+        if duplicate is not None:
+            return MultipartUploadResponse(file_id=duplicate.id, part_size=0, part_count=0, deduplicated=True)
+
+        part_size = self._choose_part_size(file_data.size)
+        db_file = File(
+            name=file_data.name,
+            storage_key=str(uuid.uuid4()),
+            size=file_data.size,
+            mime_type=file_data.mime_type,
+            folder_id=file_data.folder_id,
+            status=FileStatus.PENDING,
+            owner_id=current_user.id,
+            part_size=part_size,
+            part_count=max(1, math.ceil(file_data.size / part_size))
+        )
+        object_name = f"users/{current_user.id}/{db_file.storage_key}"
+
+        try:
+            db_file.upload_id = await self._storage_call(
+                minio._create_multipart_upload,
+                self.BUCKET_NAME,
+                object_name,
+                {"Content-Type": file_data.mime_type}
+            )
+            db.add(db_file)
+            if self._dedup_enabled(file_data):
+                self._attach_new_blob(db, db_file, file_data.sha256)
+            await db.commit()
+        except S3Error as e:
+            logging.error(f"S3Error details: code={e.code}, message='{e.message}', bucket={self.BUCKET_NAME}, object={object_name}")
+            await db.rollback()
+            raise HTTPException(503, "Object storage unavailable")
+        except HTTPException:
+            await db.rollback()
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(500, f"Failed to start multipart upload: {str(e)}")
+
+        return MultipartUploadResponse(file_id=db_file.id, part_size=db_file.part_size, part_count=db_file.part_count)
+
+    async def _get_multipart_file(self, db: AsyncSession, file_id: int, current_user: AuthenticatedUser) -> File:
+        file = await db.get(File, file_id)
         if not file:
             raise HTTPException(404, "File not found")
-        
         if file.owner_id != current_user.id:
             raise HTTPException(403, "Not authorized for this file")
-        
+        if file.status != FileStatus.PENDING or not file.upload_id:
+            raise HTTPException(400, "File has no multipart upload in progress")
+        return file
+
+    async def get_multipart_part_urls(self, file_id: int, request: MultipartPartUrlsRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> MultipartPartUrlsResponse:
+        file = await self._get_multipart_file(db, file_id, current_user)
+
+        if request.part_numbers[-1] > file.part_count:
+            raise HTTPException(400, f"Upload only has {file.part_count} parts")
+
+        object_name = f"users/{current_user.id}/{file.storage_key}"
+        expires = timedelta(minutes=PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES)
+        expires_at = datetime.now(timezone.utc) + expires
+
+        try:
+            # signing is local, so the whole batch goes through one threadpool hop
+            urls = await self._storage_call(
+                lambda: [
+                    minio.get_presigned_url(
+                        "PUT",
+                        self.BUCKET_NAME,
+                        object_name,
+                        expires=expires,
+                        extra_query_params={"partNumber": str(part_number), "uploadId": file.upload_id}
+                    )
+                    for part_number in request.part_numbers
+                ],
+                operation="presign_upload_parts",
+                breaker=False
+            )
+        except S3Error:
+            raise HTTPException(503, "Object storage unavailable")
+
+        return MultipartPartUrlsResponse(
+            parts=[
+                MultipartPartUrl(part_number=part_number, presigned_url=self._to_public_storage_url(url))
+                for part_number, url in zip(request.part_numbers, urls)
+            ],
+            expires_at=expires_at
+        )
+
+    def _list_uploaded_parts(self, minio: Minio, object_name: str, upload_id: str) -> List[Part]:
+        parts: List[Part] = []
+        marker = None
+        while True:
+            result = minio._list_parts(self.BUCKET_NAME, object_name, upload_id, max_parts=1000, part_number_marker=marker)
+            parts.extend(result.parts)
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    async def list_multipart_parts(self, file_id: int, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> MultipartPartsResponse:
+        file = await self._get_multipart_file(db, file_id, current_user)
+        object_name = f"users/{current_user.id}/{file.storage_key}"
+
+        try:
+            parts = await self._storage_call(self._list_uploaded_parts, minio, object_name, file.upload_id)
+        except S3Error as e:
+            if e.code == "NoSuchUpload":
+                raise HTTPException(410, "Multipart upload no longer exists")
+            raise HTTPException(503, "Object storage unavailable")
+
+        return MultipartPartsResponse(
+            file_id=file.id,
+            part_size=file.part_size,
+            part_count=file.part_count,
+            parts=[MultipartPart(part_number=part.part_number, etag=part.etag, size=part.size) for part in parts]
+        )
+
+    async def complete_multipart_upload(self, file_id: int, request: MultipartCompleteRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> FileResponse:
+        file = await self._get_multipart_file(db, file_id, current_user)
+        object_name = f"users/{current_user.id}/{file.storage_key}"
+
+        try:
+            uploaded = await self._storage_call(self._list_uploaded_parts, minio, object_name, file.upload_id)
+            if request.parts is None:
+                parts = uploaded
+            else:
+                parts = [Part(part_number=part.part_number, etag=part.etag) for part in request.parts]
+
+            parts = sorted({part.part_number: part for part in parts}.values(), key=lambda part: part.part_number)
+            if [part.part_number for part in parts] != list(range(1, file.part_count + 1)):
+                raise HTTPException(400, f"Expected parts 1..{file.part_count}, got {len(parts)}")
+
+            sizes = {part.part_number: part.size for part in uploaded}
+            missing = [part.part_number for part in parts if part.part_number not in sizes]
+            if missing:
+                raise HTTPException(400, f"Parts not uploaded yet: {missing[:10]}")
+            # book the final size before storage assembles the object: over quota, the upload is
+            # still there for the client to abort instead of a PENDING row pointing at nothing
+            await self._correct_size(db, file, sum(sizes[part.part_number] for part in parts))
+
+            await self._storage_call(minio._complete_multipart_upload, self.BUCKET_NAME, object_name, file.upload_id, parts)
+
+            stat = (await self._stat_objects(minio, [object_name]))[0]
+            if stat is None:
+                raise HTTPException(503, "Completed object not found in storage")
+            await self._mark_uploaded(db, file, stat.size, stat.etag)
+            await db.commit()
+            return FileResponse.model_validate(file)
+        except HTTPException:
+            await db.rollback()
+            raise
+        except S3Error as e:
+            await db.rollback()
+            if e.code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall"):
+                raise HTTPException(400, f"Storage rejected the parts: {e.message}")
+            if e.code == "NoSuchUpload":
+                raise HTTPException(410, "Multipart upload no longer exists")
+            raise HTTPException(503, "Object storage unavailable")
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(500, f"Failed to complete multipart upload: {str(e)}")
+
+    async def abort_multipart_upload(self, file_id: int, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> None:
+        file = await self._get_multipart_file(db, file_id, current_user)
         object_name = f"users/{current_user.id}/{file.storage_key}"
+
+        try:
+            await self._storage_call(minio._abort_multipart_upload, self.BUCKET_NAME, object_name, file.upload_id)
+        except S3Error as e:
+            if e.code != "NoSuchUpload":
+                raise HTTPException(503, "Object storage unavailable")
+
+        try:
+            await _quota_service.release(db, current_user.id, file.size)
+            await db.delete(file)
+            if file.blob_id is not None:
+                await self._unref_blobs(db, [file.blob_id])
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(500, f"Failed to delete file record: {str(e)}")
+
+    async def get_batch_upload_urls(self, batch: FileBatchUploadRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> FileBatchUploadResponse:
+        target = None
+        if batch.folder_id is not None:
+            target = await db.get(Folder, batch.folder_id)
+            if not target:
+                raise HTTPException(404, "Folder not found")
+            if target.owner_id != current_user.id:
+                raise HTTPException(403, "Not authorized for this folder")
+
+        try:
+            await _quota_service.reserve(db, current_user.id, sum(item.size for item in batch.files))
+            folders, created = await self._resolve_relative_folders(
+                db, target, current_user.id, {item.relative_path for item in batch.files if item.relative_path}
+            )
+
+            db_files = [
+                File(
+                    name=item.name,
+                    storage_key=str(uuid.uuid4()),
+                    size=item.size,
+                    mime_type=item.mime_type,
+                    folder_id=folders[item.relative_path].id if item.relative_path else batch.folder_id,
+                    status=FileStatus.PENDING,
+                    owner_id=current_user.id
+                )
+                for item in batch.files
+            ]
+            # one multi-row INSERT ... RETURNING for the whole batch
+            db.add_all(db_files)
+            await db.flush()
+
+            object_names = [f"users/{current_user.id}/{db_file.storage_key}" for db_file in db_files]
+            presigned_urls = await self._storage_call(
+                lambda: [
+                    minio.presigned_put_object(
+                        self.BUCKET_NAME,
+                        object_name,
+                        expires=timedelta(minutes=PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES)
+                    )
+                    for object_name in object_names
+                ],
+                operation="presign_put_batch",
+                breaker=False
+            )
+
+            await db.commit()
+        except HTTPException:
+            await db.rollback()
+            raise
+        except S3Error as e:
+            logging.error(f"S3Error details: code={e.code}, message='{e.message}', bucket={self.BUCKET_NAME}")
+            await db.rollback()
+            raise HTTPException(503, "Object storage unavailable")
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(500, f"Failed to generate upload URLs: {str(e)}")
+
+        return FileBatchUploadResponse(
+            files=[
+                BatchUploadTicket(
+                    index=index,
+                    file_id=db_file.id,
+                    folder_id=db_file.folder_id,
+                    presigned_url=self._to_public_storage_url(url)
+                )
+                for index, (db_file, url) in enumerate(zip(db_files, presigned_urls))
+            ],
+            folders={path: folder.id for path, folder in folders.items()},
+            created_folders=created
+        )
+
+    async def _resolve_relative_folders(self, db: AsyncSession, target: Folder | None, owner_id: int, paths: set) -> Tuple[dict, int]:
+        """Map every relative path (and each of its prefixes) to a folder under target.
+
+        Existing folders with a matching name are reused so a large folder upload can be
+        split over several batches; missing ones are created level by level.
+        """
+        wanted = set()
+        for path in paths:
+            parts = path.split("/")
+            wanted.update("/".join(parts[:depth]) for depth in range(1, len(parts) + 1))
+
+        folders: dict = {}
+        created = 0
+        for path in sorted(wanted, key=lambda p: (p.count("/"), p)):
+            parent_path, _, name = path.rpartition("/")
+            parent = folders[parent_path] if parent_path else target
+            parent_id = parent.id if parent is not None else None
+
+            existing = await db.scalar(
+                select(Folder).where(
+                    Folder.owner_id == owner_id,
+                    Folder.parent_folder_id == parent_id,
+                    Folder.name == name
+                ).order_by(Folder.id).limit(1)
+            )
+            if existing is None:
+                existing = await self._insert_folder(db, name, parent, owner_id)
+                created += 1
+            folders[path] = existing
+
+        return folders, created
+
+    async def update_upload_status_batch(self, request: BatchUploadStatusRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> BatchUploadStatusResponse:
+        requested = list(dict.fromkeys(request.file_ids))
+        try:
+            files = (await db.scalars(select(File).options(joinedload(File.blob)).where(
+                File.id.in_(requested),
+                File.owner_id == current_user.id,
+                File.status == FileStatus.PENDING,
+                File.upload_id.is_(None)
+            ))).all()
+            found = {file.id for file in files}
+            skipped = [file_id for file_id in requested if file_id not in found]
+
+            if not request.success:
+                await self._delete_files(db, list(found), current_user.id)
+                await db.commit()
+                return BatchUploadStatusResponse(files=[], removed=sorted(found), skipped=skipped)
+
+            stats = await self._stat_objects(minio, [file.object_name for file in files])
+            confirmed, missing = [], []
+            for file, stat in zip(files, stats):
+                if stat is None:
+                    missing.append(file.id)
+                    continue
+                try:
+                    await self._mark_uploaded(db, file, stat.size, stat.etag)
+                except HTTPException as e:
+                    if e.status_code == 507:
+                        await self._discard_over_quota(db, minio, [file])
+                    raise
+                confirmed.append(file)
+            await db.commit()
+
+            return BatchUploadStatusResponse(
+                files=[FileResponse.model_validate(file) for file in confirmed],
+                removed=[],
+                skipped=skipped,
+                missing=missing
+            )
+        except HTTPException:
+            await db.rollback()
+            raise
+        except Exception:
+            await db.rollback()
+            raise HTTPException(500, "Failed to update upload status")
+
+    async def get_download_url(self, file_id: int, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser, disposition: ContentDisposition = ContentDisposition.ATTACHMENT) -> FileDownloadResponse:
+        file = await db.get(File, file_id, options=[joinedload(File.blob)])
         
-        response_headers = {
-            'response-content-disposition': f'attachment; filename="{self._get_file_name_for_download(db, current_user, file_id)}"',
-            'response-content-type': 'application/octet-stream'
+        if not file:
+            raise HTTPException(404, "File not found")
+        
+        if file.owner_id != current_user.id:
+            raise HTTPException(403, "Not authorized for this file")
+
+        return (await self._sign_download_urls(minio, [file], disposition))[0]
+
+    async def get_download_urls(self, request: FileDownloadUrlsRequest, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> FileDownloadUrlsResponse:
+        requested = list(dict.fromkeys(request.file_ids))
+        files = {
+            file.id: file
+            for file in (await db.scalars(select(File).options(joinedload(File.blob)).where(
+                File.id.in_(requested),
+                File.owner_id == current_user.id
+            ))).all()
         }
+        ordered = [files[file_id] for file_id in requested if file_id in files]
+
+        signed = await self._sign_download_urls(minio, ordered, request.disposition)
+        return FileDownloadUrlsResponse(
+            urls=[
+                FileDownloadUrl(file_id=file.id, url=result.url, expires_at=result.expires_at)
+                for file, result in zip(ordered, signed)
+            ],
+            missing=[file_id for file_id in requested if file_id not in files]
+        )
+
+    async def _sign_download_urls(self, minio: Minio, files: List[File], disposition: ContentDisposition) -> List[FileDownloadResponse]:
+        results: List[FileDownloadResponse | None] = []
+        to_sign = []
+        for file in files:
+            # a rename or re-upload changes what the URL must carry, so it doesn't count as a hit
+            signed_for = (file.object_name, file.name, file.mime_type)
+            cached = download_url_cache.get((file.id, disposition))
+            if cached is not None and cached[2] == signed_for:
+                results.append(FileDownloadResponse(url=cached[0], expires_at=cached[1]))
+            else:
+                results.append(None)
+                to_sign.append((len(results) - 1, file, signed_for))
+
+        if not to_sign:
+            return results
+
+        expires = timedelta(minutes=PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES)
+        expires_at = datetime.now(timezone.utc) + expires
+
+        def sign_all() -> List[str]:
+            return [
+                minio.presigned_get_object(
+                    bucket_name=self.BUCKET_NAME,
+                    object_name=file.object_name,
+                    expires=expires,
+                    response_headers={
+                        'response-content-disposition': f'{disposition.value}; filename="{file.name}"',
+                        'response-content-type': file.mime_type if disposition == ContentDisposition.INLINE else 'application/octet-stream'
+                    }
+                )
+                for _, file, _ in to_sign
+            ]
 
         try:
-            url = minio.presigned_get_object(
-                bucket_name=self.BUCKET_NAME,
-                object_name=object_name,
-                expires=timedelta(minutes=PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES),
-                response_headers=response_headers
-            )
-            return self._to_public_storage_url(url)
+            urls = await self._storage_call(sign_all, operation="presign_get_batch", breaker=False)
         except S3Error:
             raise HTTPException(503, "Object storage unavailable")
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(500, f"Failed to generate download URL: {str(e)}")
+
+        for (position, file, signed_for), url in zip(to_sign, urls):
+            url = self._to_public_storage_url(url)
+            download_url_cache.set((file.id, disposition), (url, expires_at, signed_for))
+            results[position] = FileDownloadResponse(url=url, expires_at=expires_at)
+        return results
+
+    @staticmethod
+    def _forget_download_urls(file_id: int) -> None:
+        for disposition in ContentDisposition:
+            download_url_cache.pop((file_id, disposition))
+        for size in THUMBNAIL_SIZES:
+            download_url_cache.pop((file_id, size))
     
-    def delete_file(self, file_id: int, db: Session, minio: Minio, current_user: User) -> None:
-        file = db.query(File).filter(
-            File.id == file_id, 
-        ).first()
+    async def delete_file(self, file_id: int, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> None:
+        file = await db.get(File, file_id, options=[joinedload(File.blob)])
 
         if not file:
             raise HTTPException(404, "File not found")
@@ -161,28 +852,38 @@ class DriveService:
         if file.owner_id != current_user.id:
             raise HTTPException(403, "Not authorized for this file")
         
-        object_name = f"users/{current_user.id}/{file.storage_key}"
+        object_name = file.object_name
         
-        try:
-            minio.remove_object(self.BUCKET_NAME, object_name)
-        except S3Error:
-            raise HTTPException(503, "Object storage unavailable")
-        except Exception as e:
-            raise HTTPException(500, f"Failed to delete file from storage: {str(e)}")
+        if file.upload_id:
+            try:
+                await self._storage_call(minio._abort_multipart_upload, self.BUCKET_NAME, object_name, file.upload_id)
+            except S3Error as e:
+                if e.code != "NoSuchUpload":
+                    raise HTTPException(503, "Object storage unavailable")
+
+        # a shared object is only removed once its last reference goes, after the commit below
+        if file.blob_id is None:
+            await self._remove_objects(minio, [object_name])
         
         try:
-            db.delete(file)
-            db.commit()
+            await _quota_service.release(db, current_user.id, file.size)
+            await db.delete(file)
+            released = await self._unref_blobs(db, [file.blob_id]) if file.blob_id is not None else []
+            await db.commit()
+            self._forget_download_urls(file_id)
         except Exception as e:
             raise HTTPException(500, f"Failed to delete file record: {str(e)}")
 
-    def edit_file(self, file_id: int, edit: FileEditRequest, db: Session, current_user: User) -> File:
+        if released:
+            await self._remove_released_objects(minio, released)
+
+    async def edit_file(self, file_id: int, edit: FileEditRequest, db: AsyncSession, current_user: AuthenticatedUser) -> File:
         update = edit.model_dump(exclude_unset=True)
 
         if not update:
             raise HTTPException(400, "No fields provided to update")
 
-        file = db.query(File).filter(File.id == file_id).first()
+        file = await db.get(File, file_id)
         if not file:
             raise HTTPException(404, "File not found")
 
@@ -196,7 +897,7 @@ class DriveService:
             new_folder_id = update["new_folder_id"]
 
             if new_folder_id is not None:
-                new_folder = db.query(Folder).filter(Folder.id == new_folder_id).first()
+                new_folder = await db.get(Folder, new_folder_id)
                 if not new_folder:
                     raise HTTPException(404, "New folder not found")
                 if new_folder.owner_id != current_user.id:
@@ -205,72 +906,75 @@ class DriveService:
             file.folder_id = new_folder_id
 
         try:
-            db.commit()
-            db.refresh(file)
+            await db.commit()
+            await db.refresh(file)
             return file
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(500, "Failed to edit file")
 
-    def create_folder(self, folder_data: FolderCreateRequest, db: Session, current_user: User) -> FolderCreateResponse:
+    async def create_folder(self, folder_data: FolderCreateRequest, db: AsyncSession, current_user: AuthenticatedUser) -> FolderCreateResponse:
+        parent_folder = None
         if folder_data.parent_folder_id is not None:
-            parent_folder = db.query(Folder).filter(Folder.id == folder_data.parent_folder_id).first()
+            parent_folder = await db.get(Folder, folder_data.parent_folder_id)
             if not parent_folder:
                 raise HTTPException(404, "Parent folder not found")
             if parent_folder.owner_id != current_user.id:
                 raise HTTPException(403, "Not authorized for parent folder")
 
-        db_folder = Folder(
-            name=folder_data.name,
-            parent_folder_id=folder_data.parent_folder_id,
-            owner_id=current_user.id
-        )
-
         try:
-            db.add(db_folder)
-            db.flush()
+            db_folder = await self._insert_folder(db, folder_data.name, parent_folder, current_user.id)
             folder_id = db_folder.id
             
-            db.commit()
+            await db.commit()
             return FolderCreateResponse(id=folder_id, name=folder_data.name)
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(500, "Failed to create folder")
 
-    def delete_folder(self, folder_id: int, db: Session, minio: Minio, current_user: User) -> None:
-        # might be problematic, revisit
-        folder = db.query(Folder).filter(
-            Folder.id == folder_id,
-        ).first()
+    async def delete_folder(self, folder_id: int, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> FolderDeleteResponse:
+        folder = await db.get(Folder, folder_id)
 
         if not folder:
             raise HTTPException(404, "Folder not found")
         
         if folder.owner_id != current_user.id:
             raise HTTPException(403, "Not authorized for this folder")
-        
-        all_files = self._get_all_files_in_folder_recursive(db, folder_id, current_user.id)
-        
-        try:
-            for file in all_files:
-                object_name = f"users/{current_user.id}/{file.storage_key}"
-                try:
-                    minio.remove_object(self.BUCKET_NAME, object_name)
-                except S3Error:
-                    raise HTTPException(503, "Object storage unavailable")
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(500, f"Failed to delete files from object storage: {str(e)}")
-        
-        self._delete_folder_from_database(db, folder_id)
 
-    def edit_folder(self, folder_id: int, edit: FolderEditRequest, db: Session, current_user: User) -> Folder:
+        started = time.perf_counter()
+        folder_ids, files = await self._collect_subtree(db, folder_id, current_user.id)
+        collected = time.perf_counter()
+
+        object_names = [f"users/{current_user.id}/{storage_key}" for _, storage_key, blob_id in files if blob_id is None]
+        await self._remove_objects(minio, object_names)
+        removed = time.perf_counter()
+
+        released = await self._delete_subtree_rows(db, folder_ids, [file_id for file_id, _, _ in files], current_user.id)
+        finished = time.perf_counter()
+        if released:
+            await self._remove_released_objects(minio, released)
+
+        result = FolderDeleteResponse(
+            message="Folder deleted successfully.",
+            deleted_folders=len(folder_ids),
+            deleted_files=len(files),
+            collect_ms=round((collected - started) * 1000, 2),
+            storage_ms=round((removed - collected) * 1000, 2),
+            database_ms=round((finished - removed) * 1000, 2),
+        )
+        logging.info(
+            f"Deleted folder {folder_id} (user {current_user.id}): {result.deleted_folders} folders, "
+            f"{result.deleted_files} files, collect={result.collect_ms}ms storage={result.storage_ms}ms "
+            f"database={result.database_ms}ms"
+        )
+        return result
+
+    async def edit_folder(self, folder_id: int, edit: FolderEditRequest, db: AsyncSession, current_user: AuthenticatedUser) -> Folder:
         update = edit.model_dump(exclude_unset=True)
         if not update:
             raise HTTPException(400, "No fields provided to update")
 
-        folder = db.query(Folder).filter(Folder.id == folder_id).first()
+        folder = await db.get(Folder, folder_id)
         if not folder:
             raise HTTPException(404, "Folder not found")
 
@@ -286,120 +990,209 @@ class DriveService:
             if new_parent_id == folder.id:
                 raise HTTPException(400, "Folder cannot be moved into itself")
 
+            new_parent = None
             if new_parent_id is not None:
-                new_parent = db.query(Folder).filter(Folder.id == new_parent_id).first()
+                new_parent = await db.get(Folder, new_parent_id)
                 if not new_parent:
                     raise HTTPException(404, "New parent folder not found")
                 if new_parent.owner_id != current_user.id:
                     raise HTTPException(403, "Not authorized for new parent folder")
+                if new_parent.path.startswith(folder.path):
+                    raise HTTPException(400, "Folder cannot be moved into its own subfolder")
 
+            if new_parent_id != folder.parent_folder_id:
+                await self._move_subtree(db, folder, new_parent)
             folder.parent_folder_id = new_parent_id
 
         try:
-            db.commit()
-            db.refresh(folder)
+            await db.commit()
+            await db.refresh(folder)
             return folder
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(500, "Failed to edit folder")
 
-    def _get_all_files_in_folder_recursive(self, db: Session, folder_id: int, user_id: int) -> List[File]:
-        files = []
-        
-        files.extend(db.query(File).filter(
-            File.folder_id == folder_id,
-            File.owner_id == user_id
-        ).all())
-        
-        subfolders = db.query(Folder).filter(
-            Folder.parent_folder_id == folder_id,
-            Folder.owner_id == user_id
-        ).all()
-        
-        for subfolder in subfolders:
-            files.extend(self._get_all_files_in_folder_recursive(db, subfolder.id, user_id))
-        
-        return files
+    def _child_path(self, parent: Folder | None, folder_id: int) -> str:
+        return f"{parent.path if parent is not None else '/'}{folder_id}/"
 
-    def _get_all_subfolders(self, db: Session, folder_id: int, user_id: int) -> List[Folder]:
-        subfolders = []
-        
-        direct = db.query(Folder).filter(
-            Folder.parent_folder_id == folder_id,
-            Folder.owner_id == user_id
-        ).all()
-        
-        for folder in direct:
-            subfolders.append(folder)
-            subfolders.extend(self._get_all_subfolders(db, folder.id, user_id))
-        
-        return subfolders
+    async def _insert_folder(self, db: AsyncSession, name: str, parent: Folder | None, owner_id: int) -> Folder:
+        db_folder = Folder(
+            name=name,
+            parent_folder_id=parent.id if parent is not None else None,
+            owner_id=owner_id,
+            depth=parent.depth + 1 if parent is not None else 0
+        )
+        db.add(db_folder)
+        await db.flush()
+        # the path ends with the folder's own id, so it can only be set once the row has one
+        db_folder.path = self._child_path(parent, db_folder.id)
+        await db.flush()
+        return db_folder
 
-    def _delete_folder_from_database(self, db: Session, folder_id: int):
+    async def _move_subtree(self, db: AsyncSession, folder: Folder, new_parent: Folder | None) -> None:
+        old_prefix = folder.path
+        new_prefix = self._child_path(new_parent, folder.id)
+        depth_delta = (new_parent.depth + 1 if new_parent is not None else 0) - folder.depth
+
+        # rewrite the prefix of every descendant's path in one statement
+        await db.execute(
+            sa.update(Folder).where(
+                Folder.owner_id == folder.owner_id,
+                Folder.path.like(f"{old_prefix}%")
+            ).values(
+                path=sa.literal(new_prefix) + sa.func.substr(Folder.path, len(old_prefix) + 1),
+                depth=Folder.depth + depth_delta
+            ).execution_options(synchronize_session=False)
+        )
+
+    async def _get_folder_path(self, db: AsyncSession, folder_id: int, user_id: int) -> str | None:
+        return await db.scalar(select(Folder.path).where(Folder.id == folder_id, Folder.owner_id == user_id))
+
+    def _subtree_folders(self, path: str, user_id: int):
+        return select(Folder.id).where(
+            Folder.owner_id == user_id,
+            Folder.path.like(f"{path}%")
+        )
+
+    async def _collect_subtree_files(self, db: AsyncSession, folder_id: int, user_id: int, limit: int | None = None) -> List[Tuple[int, str, int | None]]:
+        path = await self._get_folder_path(db, folder_id, user_id)
+        if path is None:
+            return []
+
+        query = select(File.id, File.storage_key, File.blob_id).where(
+            File.owner_id == user_id,
+            File.folder_id.in_(self._subtree_folders(path, user_id))
+        ).order_by(File.id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        rows = await db.execute(query)
+        return [(row.id, row.storage_key, row.blob_id) for row in rows]
+
+    async def _collect_subtree_folders(self, db: AsyncSession, folder_id: int, user_id: int, limit: int | None = None) -> List[int]:
+        path = await self._get_folder_path(db, folder_id, user_id)
+        if path is None:
+            return []
+
+        # deepest first, so deleting in this order never removes a parent before its children
+        query = self._subtree_folders(path, user_id).order_by(Folder.depth.desc(), Folder.id)
+        if limit is not None:
+            query = query.limit(limit)
+
+        rows = await db.execute(query)
+        return list(rows.scalars())
+
+    async def _collect_subtree(self, db: AsyncSession, folder_id: int, user_id: int) -> Tuple[List[int], List[Tuple[int, str, int | None]]]:
+        folder_ids = await self._collect_subtree_folders(db, folder_id, user_id)
+        files = await self._collect_subtree_files(db, folder_id, user_id)
+        return folder_ids, files
+
+    async def _subtree_stats(self, db: AsyncSession, path: str, user_id: int) -> Tuple[int, int, int]:
+        subtree = self._subtree_folders(path, user_id)
+        folder_count = await db.scalar(select(sa.func.count()).select_from(subtree.subquery()))
+        file_count, total_size = (await db.execute(
+            select(sa.func.count(File.id), sa.func.coalesce(sa.func.sum(File.size), 0)).where(
+                File.owner_id == user_id,
+                File.folder_id.in_(subtree)
+            )
+        )).one()
+        return folder_count or 0, file_count or 0, total_size or 0
+
+    async def _count_subtree(self, db: AsyncSession, folder_id: int, user_id: int) -> Tuple[int, int]:
+        path = await self._get_folder_path(db, folder_id, user_id)
+        if path is None:
+            return 0, 0
+        folder_count, file_count, _ = await self._subtree_stats(db, path, user_id)
+        return folder_count, file_count
+
+    async def _remove_objects(self, minio: Minio, object_names: List[str]) -> None:
+        # thumbnails go with their source; keys that were never written are simply reported as deleted
+        object_names = list(dict.fromkeys(object_names + [
+            thumbnail_object_name(name, size)
+            for name in object_names if THUMBNAIL_KEY_MARKER not in name
+            for size in THUMBNAIL_SIZES
+        ]))
+        for chunk in _chunked(object_names, STORAGE_DELETE_BATCH_SIZE):
+            try:
+                # remove_objects is lazy, the request is only sent while the error iterator is consumed
+                errors = await self._storage_call(
+                    lambda names: list(minio.remove_objects(self.BUCKET_NAME, [DeleteObject(name) for name in names])),
+                    chunk,
+                    operation="remove_objects"
+                )
+            except S3Error:
+                raise HTTPException(503, "Object storage unavailable")
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(500, f"Failed to delete files from object storage: {str(e)}")
+
+            if errors:
+                for error in errors[:10]:
+                    logging.error(f"Failed to remove object {error.name}: {error.code} {error.message}")
+                raise HTTPException(503, f"Failed to delete {len(errors)} objects from storage")
+
+    async def _delete_subtree_rows(self, db: AsyncSession, folder_ids: List[int], file_ids: List[int], owner_id: int) -> List[str]:
+        """Delete the rows and commit; returns the objects of blobs that lost their last reference."""
+        released = []
         try:
-            subfolders = db.query(Folder).filter(Folder.parent_folder_id == folder_id).all()
-            
-            for subfolder in subfolders:
-                self._delete_folder_from_database(db, subfolder.id)
-            
-            files = db.query(File).filter(File.folder_id == folder_id).all()
-            for file in files:
-                db.delete(file)
-            
-            folder = db.query(Folder).filter(Folder.id == folder_id).first()
-            if folder:
-                db.delete(folder)
-            
-            db.commit()
+            for chunk in _chunked(file_ids, DB_DELETE_BATCH_SIZE):
+                released.extend(await self._delete_files(db, chunk, owner_id))
+            # folder_ids are ordered deepest first, so a chunk never removes a parent before its children
+            for chunk in _chunked(folder_ids, DB_DELETE_BATCH_SIZE):
+                await db.execute(sa.delete(Folder).where(Folder.id.in_(chunk)))
+            await db.commit()
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(500, "Failed to delete folder from database")
+        return released
 
-    def _build_breadcrumbs(self, db: Session, current_user: User, folder_id: int | None = None) -> List[Breadcrumb]:
-        breadcrumbs = [{"id": None, "name": "Root"}]
-        
-        if folder_id is None:
-            return [Breadcrumb(**b) for b in breadcrumbs]
-        
-        current = folder_id
-        path_stack = []
-        visited = set()
-        
-        while current:
-            if current in visited:
-                raise HTTPException(500, "Circular folder reference detected")
-            visited.add(current)
-            
-            folder = db.query(Folder).filter(
-                Folder.id == current,
-                Folder.owner_id == current_user.id
-            ).first()
-            
-            if not folder:
-                raise HTTPException(404, "Folder not found or access denied")
-                
-            path_stack.append({"id": folder.id, "name": folder.name})
-            current = folder.parent_folder_id
-        
-        breadcrumbs.extend(reversed(path_stack))
+    async def _delete_files(self, db: AsyncSession, file_ids: List[int], owner_id: int) -> List[str]:
+        # RETURNING hands back sizes and blobs, so quota and references need no extra query
+        rows = (await db.execute(sa.delete(File).where(File.id.in_(file_ids)).returning(File.size, File.blob_id))).all()
+        await _quota_service.release(db, owner_id, sum(row.size for row in rows))
+        return await self._unref_blobs(db, [row.blob_id for row in rows if row.blob_id is not None])
+
+    async def _build_breadcrumbs(self, db: AsyncSession, current_user: AuthenticatedUser, folder: Folder | None = None) -> List[Breadcrumb]:
+        breadcrumbs = [Breadcrumb(id=None, name="Root")]
         
-        return [Breadcrumb(**b) for b in breadcrumbs]
+        if folder is None:
+            return breadcrumbs
 
-    def _get_file_name_for_download(self, db: Session, current_user: User, file_id: int) -> str:
-        file = db.query(File).filter(
-            File.id == file_id,
-            File.owner_id == current_user.id
-        ).first()
-        if not file:
-            raise HTTPException(404, "File not found or access denied")
-        return file.name
+        # the materialized path already lists every ancestor, so one query resolves all names
+        ancestor_ids = [int(part) for part in folder.path.strip("/").split("/")]
+        rows = await db.execute(select(Folder.id, Folder.name).where(
+            Folder.id.in_(ancestor_ids),
+            Folder.owner_id == current_user.id
+        ))
+        names = {row.id: row.name for row in rows}
+
+        if len(names) != len(ancestor_ids):
+            raise HTTPException(404, "Folder not found or access denied")
+
+        breadcrumbs.extend(Breadcrumb(id=ancestor_id, name=names[ancestor_id]) for ancestor_id in ancestor_ids)
+        return breadcrumbs
+
+    async def get_folder_stats(self, folder_id: int, db: AsyncSession, current_user: AuthenticatedUser) -> FolderStatsResponse:
+        folder = await db.get(Folder, folder_id)
+        if not folder:
+            raise HTTPException(404, "Folder not found")
+        if folder.owner_id != current_user.id:
+            raise HTTPException(403, "Not authorized for this folder")
+
+        folder_count, file_count, total_size = await self._subtree_stats(db, folder.path, current_user.id)
+        return FolderStatsResponse(
+            folder_id=folder.id,
+            depth=folder.depth,
+            folder_count=folder_count - 1,
+            file_count=file_count,
+            total_size=total_size,
+        )
 
-    def get_folder_content(self, db: Session, current_user: User, folder_id: int | None) -> FolderContentResponse:
+    async def _get_listing_folder(self, db: AsyncSession, current_user: AuthenticatedUser, folder_id: int | None) -> Folder | None:
         current_folder = None
         if folder_id is not None:
-            current_folder = db.query(Folder).filter(
-                Folder.id == folder_id,
-            ).first()
+            current_folder = await db.get(Folder, folder_id)
             
             if not current_folder:
                 raise HTTPException(404, "Folder not found or access denied")
@@ -407,17 +1200,79 @@ class DriveService:
         if current_folder and current_folder.owner_id != current_user.id:
             raise HTTPException(403, "Not authorized for this folder")
 
-        subfolders = db.query(Folder).filter(
-            Folder.owner_id == current_user.id,
+        return current_folder
+
+    def _folders_query(self, user_id: int, folder_id: int | None, after: list | None = None):
+        query = select(Folder.id, Folder.name, Folder.parent_folder_id, Folder.created_at).where(
+            Folder.owner_id == user_id,
             Folder.parent_folder_id == folder_id
-        ).order_by(Folder.name.asc()).all()
+        )
+        if after is not None:
+            query = query.where(sa.tuple_(Folder.name, Folder.id) > tuple(after))
+        # the parent is constant, but Postgres doesn't treat "IS NULL" as pinning it: without it in
+        # the ORDER BY, root listings sort instead of reading the index in order
+        return query.order_by(Folder.parent_folder_id, Folder.name.asc(), Folder.id.asc())
 
-        files = db.query(File).filter(
-            File.owner_id == current_user.id,
+    def _files_query(self, user_id: int, folder_id: int | None, listing: FolderSortParams, after: list | None = None):
+        key = FILE_SORT_COLUMNS[listing.sort]
+        query = select(File.id, File.name, File.size, File.status, File.uploaded_at, File.folder_id, File.thumbnail_sizes).where(
+            File.owner_id == user_id,
             File.folder_id == folder_id
-        ).order_by(File.uploaded_at.desc(), File.id.desc()).all()
+        )
+        if listing.order == SortOrder.DESC:
+            if after is not None:
+                query = query.where(sa.tuple_(key, File.id) < tuple(after))
+            return query.order_by(File.folder_id.desc(), key.desc(), File.id.desc())
+
+        if after is not None:
+            query = query.where(sa.tuple_(key, File.id) > tuple(after))
+        # folder_id leads for the same reason as in _folders_query
+        return query.order_by(File.folder_id, key.asc(), File.id.asc())
+
+    async def get_folder_content(self, db: AsyncSession, current_user: AuthenticatedUser, folder_id: int | None, listing: FolderListingParams | None = None) -> FolderContentResponse:
+        listing = listing or FolderListingParams()
+        current_folder = await self._get_listing_folder(db, current_user, folder_id)
+        breadcrumbs = await self._build_breadcrumbs(db, current_user, current_folder)
 
-        breadcrumbs = self._build_breadcrumbs(db, current_user, folder_id)
+        phase, after = "folders", None
+        if listing.cursor:
+            phase, after = _decode_cursor(listing.cursor, listing)
+
+        remaining = listing.limit
+        next_cursor = None
+        folder_rows, file_rows = [], []
+
+        if phase == "folders":
+            query = self._folders_query(current_user.id, folder_id, after)
+            if remaining is not None:
+                query = query.limit(remaining + 1)
+            folder_rows = (await db.execute(query)).all()
+
+            if remaining is not None and len(folder_rows) > remaining:
+                folder_rows = folder_rows[:remaining]
+                last = folder_rows[-1]
+                next_cursor = _encode_cursor("folders", [last.name, last.id], listing)
+            else:
+                phase, after = "files", None
+                if remaining is not None:
+                    remaining -= len(folder_rows)
+
+        if phase == "files" and next_cursor is None:
+            if remaining == 0:
+                # the page filled up exactly at the folder/file boundary
+                has_files = await db.scalar(self._files_query(current_user.id, folder_id, listing).limit(1))
+                if has_files is not None:
+                    next_cursor = _encode_cursor("files", None, listing)
+            else:
+                query = self._files_query(current_user.id, folder_id, listing, after)
+                if remaining is not None:
+                    query = query.limit(remaining + 1)
+                file_rows = (await db.execute(query)).all()
+
+                if remaining is not None and len(file_rows) > remaining:
+                    file_rows = file_rows[:remaining]
+                    last = file_rows[-1]
+                    next_cursor = _encode_cursor("files", [getattr(last, listing.sort.value), last.id], listing)
 
         folder_responses = [
             FolderResponse(
@@ -426,7 +1281,7 @@ class DriveService:
                 parent_folder_id=f.parent_folder_id,
                 created_at=f.created_at,
             )
-            for f in subfolders
+            for f in folder_rows
         ]
 
         file_responses = [
@@ -436,18 +1291,86 @@ class DriveService:
                 size=f.size,
                 status=f.status,
                 uploaded_at=f.uploaded_at,
-                folder_id=f.folder_id
+                folder_id=f.folder_id,
+                thumbnail_sizes=f.thumbnail_sizes
             )
-            for f in files
+            for f in file_rows
         ]
 
         return FolderContentResponse(
             folder_id=folder_id,
             path=breadcrumbs,
             folders=folder_responses,
-            files=file_responses
+            files=file_responses,
+            next_cursor=next_cursor
         )
 
+    async def stream_folder_content(self, db: AsyncSession, current_user: AuthenticatedUser, listing: FolderStreamParams) -> AsyncIterator[bytes]:
+        folder_id = listing.folder_id
+        # ownership and breadcrumbs are resolved before streaming starts so errors still get a proper status code
+        current_folder = await self._get_listing_folder(db, current_user, folder_id)
+        breadcrumbs = await self._build_breadcrumbs(db, current_user, current_folder)
+
+        async def rows() -> AsyncIterator[bytes]:
+            yield _ndjson({"type": "path", "folder_id": folder_id, "path": [b.model_dump() for b in breadcrumbs]})
+
+            folders = await db.stream(
+                self._folders_query(current_user.id, folder_id).execution_options(yield_per=FOLDER_STREAM_BATCH_SIZE)
+            )
+            async for batch in folders.partitions():
+                yield b"".join(_ndjson({"type": "folder", **row._asdict()}) for row in batch)
+
+            files = await db.stream(
+                self._files_query(current_user.id, folder_id, listing).execution_options(yield_per=FOLDER_STREAM_BATCH_SIZE)
+            )
+            async for batch in files.partitions():
+                yield b"".join(
+                    _ndjson({"type": "file", **row._asdict(), "thumbnail_sizes": parse_thumbnail_sizes(row.thumbnail_sizes)})
+                    for row in batch
+                )
+
+        return rows()
+
+
+FILE_SORT_COLUMNS = {
+    FileSortField.UPLOADED_AT: File.uploaded_at,
+    FileSortField.NAME: File.name,
+    FileSortField.SIZE: File.size,
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _ndjson(item: dict) -> bytes:
+    return json.dumps(item, default=_json_default, separators=(",", ":")).encode() + b"\n"
+
+
+def _encode_cursor(phase: str, key: list | None, listing: FolderListingParams) -> str:
+    payload = {"p": phase, "k": key, "s": listing.sort.value, "o": listing.order.value}
+    raw = json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, listing: FolderListingParams) -> Tuple[str, list | None]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        phase, key = payload["p"], payload["k"]
+        if phase not in ("folders", "files"):
+            raise ValueError(phase)
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+
+    if payload.get("s") != listing.sort.value or payload.get("o") != listing.order.value:
+        raise HTTPException(400, "Cursor does not match the requested sort order")
+
+    if key is not None and phase == "files" and listing.sort == FileSortField.UPLOADED_AT:
+        key = [datetime.fromisoformat(key[0]), key[1]]
+    return phase, key
+
 
 _drive_service = DriveService()
 
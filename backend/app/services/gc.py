@@ -0,0 +1,195 @@
+import itertools
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+import sqlalchemy as sa
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from minio import Minio
+from minio.error import S3Error
+from app.core.config import (
+    GC_BATCH_SIZE,
+    GC_DELETE_RATE,
+    GC_LIST_RATE,
+    GC_MULTIPART_STALE_HOURS,
+    GC_ORPHAN_MIN_AGE_MINUTES,
+    GC_PENDING_GRACE_MINUTES,
+    PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES,
+)
+from app.core.ratelimit import RateLimiter
+from app.database.models import File, FileStatus, StorageObject
+from app.services.drive import THUMBNAIL_KEY_MARKER, _chunked, _drive_service
+from app.services.quota import _quota_service
+
+# shared by every GC run in the process, so concurrent chunks can't add up past the limits
+_delete_limiter = RateLimiter(GC_DELETE_RATE)
+_list_limiter = RateLimiter(GC_LIST_RATE)
+
+MISSING_SAMPLE_SIZE = 20
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class StorageGC:
+    """Finds storage the database no longer accounts for, and the reverse.
+
+    Work is done in bounded batches driven by StorageGCJob. Database changes are
+    committed before objects are removed: a failure in between leaves an orphaned
+    object for the next run, never a row without its object.
+    """
+
+    def _stale_pending(self, now: datetime):
+        # single PUT URLs are useless after they expire; multipart uploads can be resumed, so they get longer
+        return sa.and_(
+            File.status == FileStatus.PENDING,
+            sa.or_(
+                sa.and_(
+                    File.upload_id.is_(None),
+                    File.uploaded_at < now - timedelta(minutes=PRESIGNED_UPLOAD_URL_EXPIRES_MINUTES + GC_PENDING_GRACE_MINUTES)
+                ),
+                sa.and_(
+                    File.upload_id.is_not(None),
+                    File.uploaded_at < now - timedelta(hours=GC_MULTIPART_STALE_HOURS)
+                )
+            )
+        )
+
+    async def sweep_pending(self, db: AsyncSession, minio: Minio, after_id: int, dry_run: bool) -> Tuple[int, int | None]:
+        """Remove one batch of stale PENDING uploads with id > after_id.
+
+        Returns the number of uploads found and the last id looked at, or None once there are no more.
+        """
+        now = _utcnow()
+        ids = (await db.scalars(
+            select(File.id).where(File.id > after_id, self._stale_pending(now)).order_by(File.id).limit(GC_BATCH_SIZE)
+        )).all()
+        if not ids:
+            return 0, None
+        if dry_run:
+            return len(ids), ids[-1]
+
+        # re-checked in the DELETE, so an upload confirmed in the meantime is left alone
+        rows = (await db.execute(
+            sa.delete(File).where(File.id.in_(ids), self._stale_pending(now)).returning(
+                File.owner_id, File.storage_key, File.size, File.upload_id, File.blob_id
+            )
+        )).all()
+
+        sizes: Dict[int, int] = defaultdict(int)
+        for row in rows:
+            sizes[row.owner_id] += row.size
+        for owner_id, size in sizes.items():
+            await _quota_service.release(db, owner_id, size)
+        released = await _drive_service._unref_blobs(db, [row.blob_id for row in rows if row.blob_id is not None])
+        await db.commit()
+
+        for row in rows:
+            if row.upload_id:
+                await self._abort_upload(minio, f"users/{row.owner_id}/{row.storage_key}", row.upload_id)
+        await self._remove(minio, [f"users/{row.owner_id}/{row.storage_key}" for row in rows if row.blob_id is None] + released)
+
+        logging.info(f"GC removed {len(rows)} stale pending uploads")
+        return len(rows), ids[-1]
+
+    async def reconcile_window(self, db: AsyncSession, minio: Minio, owner_id: int, after_key: str, dry_run: bool) -> Tuple[str | None, Dict[str, object]]:
+        """Compare one window of users/{owner_id}/ in the bucket with the owner's rows.
+
+        Both sides are read in key order, starting after after_key, up to GC_BATCH_SIZE
+        entries each; the window ends at the smallest last key of a side that filled up,
+        so everything up to it has been seen on both sides. Returns the key to resume
+        after, or None once the owner's prefix is done.
+        """
+        prefix = f"users/{owner_id}/"
+        now = _utcnow()
+        settled_before = now - timedelta(minutes=GC_ORPHAN_MIN_AGE_MINUTES)
+
+        # storage first: an object never exists before its row, so a key missing below is a real orphan
+        await _list_limiter.acquire(GC_BATCH_SIZE)
+        listed = await _drive_service._storage_call(
+            self._list_page, minio, prefix, after_key, GC_BATCH_SIZE, operation="list_objects"
+        )
+
+        # storage keys are lowercase UUIDs, so the database orders them like S3 under any collation
+        files = (await db.execute(
+            select(File.storage_key, sa.and_(File.status == FileStatus.UPLOADED, File.uploaded_at < settled_before).label("settled"))
+            .where(File.owner_id == owner_id, File.blob_id.is_(None), File.storage_key > after_key)
+            .order_by(File.storage_key)
+            .limit(GC_BATCH_SIZE)
+        )).all()
+        blobs = (await db.execute(
+            select(StorageObject.object_name, StorageObject.verified)
+            .where(StorageObject.owner_id == owner_id, StorageObject.object_name > prefix + after_key)
+            .order_by(StorageObject.object_name)
+            .limit(GC_BATCH_SIZE)
+        )).all()
+        # the window's rows are read; don't hold the connection while paced deletes run
+        await db.commit()
+
+        stored = {key: modified for key, modified in listed}
+        expected = {row.storage_key: bool(row.settled) for row in files}
+        expected.update({row.object_name[len(prefix):]: bool(row.verified) for row in blobs})
+
+        full_pages = [page[-1] for page in (
+            [key for key, _ in listed],
+            [row.storage_key for row in files],
+            [row.object_name[len(prefix):] for row in blobs]
+        ) if len(page) == GC_BATCH_SIZE]
+        bound = min(full_pages) if full_pages else None
+
+        def in_window(key: str) -> bool:
+            return bound is None or key <= bound
+
+        def unexpected(key: str) -> bool:
+            # thumbnails live and die with their source object
+            source, derived, _ = key.partition(THUMBNAIL_KEY_MARKER)
+            if not derived:
+                return key not in expected
+            # a source at or before after_key was judged in an earlier window
+            return source > after_key and source not in expected
+
+        orphaned = [
+            prefix + key for key, modified in stored.items()
+            if in_window(key) and unexpected(key) and modified is not None and modified < settled_before
+        ]
+        # pending uploads and unverified blobs may legitimately have no object yet
+        missing = [prefix + key for key, settled in expected.items() if in_window(key) and settled and key not in stored]
+        if missing:
+            logging.warning(f"GC found {len(missing)} objects missing for user {owner_id}, e.g. {missing[0]}")
+
+        if orphaned and not dry_run:
+            await self._remove(minio, orphaned)
+
+        stats = {"scanned_objects": sum(1 for key in stored if in_window(key)), "orphaned_objects": len(orphaned), "missing": missing}
+        return bound, stats
+
+    def _list_page(self, minio: Minio, prefix: str, after_key: str, limit: int) -> List[Tuple[str, datetime | None]]:
+        objects = minio.list_objects(
+            _drive_service.BUCKET_NAME,
+            prefix=prefix,
+            recursive=True,
+            start_after=prefix + after_key if after_key else None
+        )
+        return [(obj.object_name[len(prefix):], obj.last_modified) for obj in itertools.islice(objects, limit)]
+
+    async def _abort_upload(self, minio: Minio, object_name: str, upload_id: str) -> None:
+        await _delete_limiter.acquire()
+        try:
+            # private SDK call, see the MULTIPART UPLOAD note in DriveService
+            await _drive_service._storage_call(minio._abort_multipart_upload, _drive_service.BUCKET_NAME, object_name, upload_id)
+        except S3Error as e:
+            if e.code != "NoSuchUpload":
+                logging.warning(f"GC failed to abort multipart upload of {object_name}: {e.code}")
+        except HTTPException as e:
+            logging.warning(f"GC failed to abort multipart upload of {object_name}: {e.detail}")
+
+    async def _remove(self, minio: Minio, object_names: List[str]) -> None:
+        for chunk in _chunked(object_names, GC_BATCH_SIZE):
+            await _delete_limiter.acquire(len(chunk))
+            await _drive_service._remove_released_objects(minio, chunk)
+
+
+_gc_service = StorageGC()
@@ -0,0 +1,482 @@
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+import sqlalchemy as sa
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from starlette.concurrency import run_in_threadpool
+from fastapi import HTTPException
+from minio import Minio
+from minio.error import S3Error
+from app.core.config import (
+    GC_DRY_RUN,
+    GC_INTERVAL_MINUTES,
+    JOB_CHUNK_SIZE,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF_SECONDS,
+    THUMBNAIL_BATCH_SIZE,
+    THUMBNAIL_MAX_SOURCE_BYTES,
+    THUMBNAIL_MIME_TYPES,
+    THUMBNAILS_ENABLED,
+)
+from app.database.models import File, FileStatus, Folder, Job, JobStatus, StorageObject, User
+from app.schemas.drive import FolderEditRequest
+from app.schemas.job import FolderMoveJobRequest, JobResponse
+from app.schemas.user import AuthenticatedUser
+from app.services.drive import _drive_service
+from app.services.gc import MISSING_SAMPLE_SIZE, _gc_service
+from app.services.quota import _quota_service
+from app.services.thumbnail import _thumbnail_service
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobContext:
+    """What a handler gets to work with while processing one chunk of a job."""
+
+    def __init__(self, db: AsyncSession, minio_factory: Callable[[], Minio]):
+        self.db = db
+        self._minio_factory = minio_factory
+
+    async def minio(self) -> Minio:
+        return await run_in_threadpool(self._minio_factory)
+
+
+class JobHandler(ABC):
+    kind: str = ""
+
+    @abstractmethod
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        """Process one bounded chunk of work and return True once the job is complete.
+
+        The worker commits after every chunk and puts unfinished jobs back in the queue,
+        so a single huge job cannot starve the others.
+        """
+
+
+class FolderDeleteJob(JobHandler):
+    kind = "folder_delete"
+
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        db = ctx.db
+        folder_id = job.payload["folder_id"]
+
+        if job.progress_total is None:
+            folder = await db.get(Folder, folder_id)
+            if not folder or folder.owner_id != job.owner_id:
+                raise HTTPException(404, "Folder not found")
+            folder_count, file_count = await _drive_service._count_subtree(db, folder_id, job.owner_id)
+            job.progress_total = folder_count + file_count
+            job.result = {"deleted_folders": 0, "deleted_files": 0}
+
+        files = await _drive_service._collect_subtree_files(db, folder_id, job.owner_id, limit=JOB_CHUNK_SIZE)
+        if files:
+            minio = await ctx.minio()
+            await _drive_service._remove_objects(minio, [f"users/{job.owner_id}/{key}" for _, key, blob_id in files if blob_id is None])
+            released = await _drive_service._delete_files(db, [file_id for file_id, _, _ in files], job.owner_id)
+            self._advance(job, deleted_files=len(files))
+            if released:
+                # shared objects may only go once the reference drop is committed
+                await db.commit()
+                await _drive_service._remove_released_objects(minio, released)
+            return False
+
+        # deepest folders come first, so the requested folder itself is removed in the last chunk
+        folder_ids = await _drive_service._collect_subtree_folders(db, folder_id, job.owner_id, limit=JOB_CHUNK_SIZE)
+        if folder_ids:
+            await db.execute(sa.delete(Folder).where(Folder.id.in_(folder_ids)))
+            self._advance(job, deleted_folders=len(folder_ids))
+        return folder_id in folder_ids or not folder_ids
+
+    def _advance(self, job: Job, deleted_files: int = 0, deleted_folders: int = 0) -> None:
+        result = dict(job.result or {})
+        result["deleted_files"] = result.get("deleted_files", 0) + deleted_files
+        result["deleted_folders"] = result.get("deleted_folders", 0) + deleted_folders
+        job.result = result
+        job.progress_done = (job.progress_done or 0) + deleted_files + deleted_folders
+
+
+class FolderMoveJob(JobHandler):
+    kind = "folder_move"
+
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        owner = await ctx.db.get(User, job.owner_id)
+        if owner is None:
+            raise HTTPException(404, "User not found")
+
+        edit = FolderEditRequest(new_parent_folder_id=job.payload["new_parent_folder_id"])
+        folder = await _drive_service.edit_folder(job.payload["folder_id"], edit, ctx.db, AuthenticatedUser.model_validate(owner))
+        job.progress_total = job.progress_done = 1
+        job.result = {"folder_id": folder.id, "parent_folder_id": folder.parent_folder_id}
+        return True
+
+
+class QuotaReconcileJob(JobHandler):
+    """Recompute storage_used from the files table, one chunk of users per run.
+
+    payload {"user_id": n} limits the job to one user; an empty payload walks all users.
+    """
+    kind = "quota_reconcile"
+
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        db = ctx.db
+        user_id = job.payload.get("user_id")
+        result = dict(job.result or {"after_id": 0, "corrected": 0})
+
+        query = select(User.id).where(User.id > result["after_id"]).order_by(User.id).limit(JOB_CHUNK_SIZE)
+        if user_id is not None:
+            query = query.where(User.id == user_id)
+        user_ids = (await db.scalars(query)).all()
+
+        if job.progress_total is None:
+            job.progress_total = 1 if user_id is not None else await db.scalar(select(sa.func.count(User.id)))
+
+        if user_ids:
+            result["corrected"] += await _quota_service.reconcile(db, user_ids)
+            result["after_id"] = user_ids[-1]
+            job.progress_done = (job.progress_done or 0) + len(user_ids)
+        job.result = result
+        return len(user_ids) < JOB_CHUNK_SIZE
+
+
+def _hash_object(minio: Minio, bucket_name: str, object_name: str) -> str:
+    response = minio.get_object(bucket_name, object_name)
+    try:
+        digest = hashlib.sha256()
+        for chunk in response.stream(1024 * 1024):
+            digest.update(chunk)
+        return digest.hexdigest()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+class BlobVerifyJob(JobHandler):
+    """Hash a blob's stored object and trust its declared sha256 only if they match.
+
+    Unverified blobs are never offered as dedup targets, so declaring a hash is not
+    enough to get a reference to content one never uploaded.
+    """
+    kind = "blob_verify"
+
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        blob = await ctx.db.get(StorageObject, job.payload["blob_id"])
+        job.progress_total = job.progress_done = 1
+        if blob is None or blob.verified or blob.sha256 is None:
+            return True
+
+        minio = await ctx.minio()
+        try:
+            digest = await _drive_service._storage_call(
+                _hash_object, minio, _drive_service.BUCKET_NAME, blob.object_name, operation="hash_object"
+            )
+        except S3Error as e:
+            if e.code != "NoSuchKey":
+                raise
+            digest = None
+
+        if digest == blob.sha256:
+            blob.verified = True
+        else:
+            logging.warning(f"Blob {blob.id} does not match its declared sha256, excluding it from dedup")
+            blob.sha256 = None
+        job.result = {"blob_id": blob.id, "verified": blob.verified}
+        return True
+
+
+class ThumbnailJob(JobHandler):
+    """Render thumbnails for confirmed uploads, THUMBNAIL_BATCH_SIZE files per chunk.
+
+    A file is only marked once its thumbnails are stored and marked files are skipped,
+    so a retried chunk redoes at most the files that didn't finish.
+    """
+    kind = "thumbnails"
+
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        db = ctx.db
+        file_ids = job.payload["file_ids"]
+        done = job.progress_done or 0
+        job.progress_total = len(file_ids)
+        batch = file_ids[done:done + THUMBNAIL_BATCH_SIZE]
+
+        files = (await db.scalars(select(File).options(joinedload(File.blob)).where(
+            File.id.in_(batch),
+            File.status == FileStatus.UPLOADED,
+            File.thumbnail_sizes.is_(None)
+        ))).all()
+
+        # deduplicated files share an object, so it is rendered once for all of them
+        sources: Dict[str, Tuple[List[int], int | None]] = {}
+        for file in files:
+            if _thumbnail_service.supports(file.mime_type, file.size):
+                sources.setdefault(file.object_name, ([], file.blob_id))[0].append(file.id)
+
+        results = []
+        if sources:
+            minio = await ctx.minio()
+            results = await asyncio.gather(
+                *(_thumbnail_service.generate(minio, object_name) for object_name in sources),
+                return_exceptions=True
+            )
+
+        result = dict(job.result or {"rendered": 0, "unsupported": 0})
+        failure = None
+        for (ids, blob_id), sizes in zip(sources.values(), results):
+            if isinstance(sizes, BaseException):
+                failure = failure or sizes
+                continue
+            marked = File.id.in_(ids)
+            if blob_id is not None:
+                marked = sa.or_(marked, sa.and_(File.blob_id == blob_id, File.thumbnail_sizes.is_(None)))
+            await db.execute(
+                sa.update(File).where(marked).values(thumbnail_sizes=sizes).execution_options(synchronize_session=False)
+            )
+            result["rendered" if sizes else "unsupported"] += 1
+        job.result = result
+
+        if failure is not None:
+            # keep what finished; the retry of this chunk skips those files
+            await db.commit()
+            raise failure
+
+        job.progress_done = done + len(batch)
+        return job.progress_done >= len(file_ids)
+
+
+class StorageGCJob(JobHandler):
+    """Remove stale PENDING uploads, then reconcile each user's prefix in the bucket with the database.
+
+    payload {"dry_run": true} only counts what would be removed. Runs queued by the
+    scheduler carry {"scheduled": true} and queue the next run when they finish.
+    """
+    kind = "storage_gc"
+
+    async def run_chunk(self, job: Job, ctx: JobContext) -> bool:
+        db = ctx.db
+        dry_run = bool(job.payload.get("dry_run"))
+        result = dict(job.result or {
+            "phase": "pending", "after_id": 0, "owner_id": None, "after_key": "", "last_owner_id": 0,
+            "stale_uploads": 0, "scanned_objects": 0, "orphaned_objects": 0, "missing_objects": 0, "missing_sample": [],
+        })
+        if job.progress_total is None:
+            job.progress_total = await db.scalar(select(sa.func.count(User.id)))
+            job.progress_done = 0
+        minio = await ctx.minio()
+
+        if result["phase"] == "pending":
+            count, last_id = await _gc_service.sweep_pending(db, minio, result["after_id"], dry_run)
+            result["stale_uploads"] += count
+            if last_id is None:
+                result["phase"] = "objects"
+            else:
+                result["after_id"] = last_id
+            job.result = result
+            return False
+
+        owner_id = result["owner_id"]
+        if owner_id is None:
+            owner_id = await db.scalar(select(User.id).where(User.id > result["last_owner_id"]).order_by(User.id).limit(1))
+            if owner_id is None:
+                job.result = result
+                await self._schedule_next(job, db)
+                return True
+            result["owner_id"], result["after_key"] = owner_id, ""
+
+        after_key, stats = await _gc_service.reconcile_window(db, minio, owner_id, result["after_key"], dry_run)
+        result["scanned_objects"] += stats["scanned_objects"]
+        result["orphaned_objects"] += stats["orphaned_objects"]
+        result["missing_objects"] += len(stats["missing"])
+        result["missing_sample"] = (result["missing_sample"] + stats["missing"])[:MISSING_SAMPLE_SIZE]
+        if after_key is None:
+            result["last_owner_id"], result["owner_id"] = owner_id, None
+            job.progress_done = (job.progress_done or 0) + 1
+        else:
+            result["after_key"] = after_key
+        job.result = result
+        return False
+
+    async def _schedule_next(self, job: Job, db: AsyncSession) -> None:
+        if job.payload.get("scheduled") and GC_INTERVAL_MINUTES > 0:
+            await _job_service.schedule_storage_gc(db, exclude_job_id=job.id)
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    handler.kind: handler for handler in (
+        FolderDeleteJob(), FolderMoveJob(), QuotaReconcileJob(), BlobVerifyJob(), ThumbnailJob(), StorageGCJob()
+    )
+}
+
+
+class JobService:
+    async def enqueue(self, db: AsyncSession, kind: str, payload: Dict[str, Any], owner_id: int | None = None, run_after: datetime | None = None) -> Job:
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = Job(
+            owner_id=owner_id,
+            kind=kind,
+            status=JobStatus.QUEUED,
+            payload=payload,
+            progress_done=0,
+            attempts=0,
+            max_attempts=JOB_MAX_ATTEMPTS,
+            run_after=run_after or _utcnow(),
+        )
+        try:
+            db.add(job)
+            await db.commit()
+            await db.refresh(job)
+            return job
+        except Exception:
+            await db.rollback()
+            raise HTTPException(500, "Failed to enqueue job")
+
+    async def enqueue_folder_delete(self, folder_id: int, db: AsyncSession, current_user: AuthenticatedUser) -> JobResponse:
+        await self._check_folder(db, folder_id, current_user)
+        job = await self.enqueue(db, FolderDeleteJob.kind, {"folder_id": folder_id}, current_user.id)
+        return JobResponse.model_validate(job)
+
+    async def enqueue_folder_move(self, folder_id: int, request: FolderMoveJobRequest, db: AsyncSession, current_user: AuthenticatedUser) -> JobResponse:
+        await self._check_folder(db, folder_id, current_user)
+        payload = {"folder_id": folder_id, "new_parent_folder_id": request.new_parent_folder_id}
+        job = await self.enqueue(db, FolderMoveJob.kind, payload, current_user.id)
+        return JobResponse.model_validate(job)
+
+    async def enqueue_quota_reconcile(self, db: AsyncSession, current_user: AuthenticatedUser) -> JobResponse:
+        job = await self.enqueue(db, QuotaReconcileJob.kind, {"user_id": current_user.id}, current_user.id)
+        return JobResponse.model_validate(job)
+
+    async def enqueue_blob_verify(self, db: AsyncSession, file_id: int) -> None:
+        """Queue verification of the blob behind a freshly uploaded file, if it has an unverified one."""
+        blob_id = await db.scalar(
+            select(StorageObject.id).join(File, File.blob_id == StorageObject.id).where(
+                File.id == file_id,
+                StorageObject.verified.is_(False),
+                StorageObject.sha256.is_not(None)
+            )
+        )
+        if blob_id is None:
+            return
+        try:
+            await self.enqueue(db, BlobVerifyJob.kind, {"blob_id": blob_id})
+        except HTTPException:
+            # the upload itself is committed; an unverified blob just never becomes a dedup target
+            logging.warning(f"Failed to queue verification of blob {blob_id}")
+
+    async def enqueue_thumbnails(self, db: AsyncSession, file_ids: List[int]) -> None:
+        """Queue thumbnail rendering for the images among freshly confirmed files."""
+        if not THUMBNAILS_ENABLED or not file_ids:
+            return
+        eligible = (await db.scalars(select(File.id).where(
+            File.id.in_(file_ids),
+            File.status == FileStatus.UPLOADED,
+            File.thumbnail_sizes.is_(None),
+            File.mime_type.in_(THUMBNAIL_MIME_TYPES),
+            File.size <= THUMBNAIL_MAX_SOURCE_BYTES
+        ).order_by(File.id))).all()
+        if not eligible:
+            return
+        try:
+            await self.enqueue(db, ThumbnailJob.kind, {"file_ids": list(eligible)})
+        except HTTPException:
+            # the upload itself is committed; the file just shows a generic icon
+            logging.warning(f"Failed to queue thumbnails for {len(eligible)} files")
+
+    async def schedule_storage_gc(self, db: AsyncSession, exclude_job_id: int | None = None) -> Job | None:
+        """Queue the next periodic GC run unless one is already queued or running."""
+        query = select(Job.id).where(
+            Job.kind == StorageGCJob.kind,
+            Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])
+        )
+        if exclude_job_id is not None:
+            query = query.where(Job.id != exclude_job_id)
+        if await db.scalar(query.limit(1)) is not None:
+            return None
+
+        run_after = _utcnow() + timedelta(minutes=GC_INTERVAL_MINUTES)
+        return await self.enqueue(db, StorageGCJob.kind, {"dry_run": GC_DRY_RUN, "scheduled": True}, run_after=run_after)
+
+    async def get_job(self, job_id: int, db: AsyncSession, current_user: AuthenticatedUser) -> JobResponse:
+        job = await db.get(Job, job_id)
+        if not job:
+            raise HTTPException(404, "Job not found")
+        if job.owner_id != current_user.id:
+            raise HTTPException(403, "Not authorized for this job")
+        return JobResponse.model_validate(job)
+
+    async def _check_folder(self, db: AsyncSession, folder_id: int, current_user: AuthenticatedUser) -> None:
+        folder = await db.get(Folder, folder_id)
+        if not folder:
+            raise HTTPException(404, "Folder not found")
+        if folder.owner_id != current_user.id:
+            raise HTTPException(403, "Not authorized for this folder")
+
+    # Worker side
+
+    async def claim_next(self, db: AsyncSession, worker_id: str) -> Job | None:
+        now = _utcnow()
+        claimable = sa.and_(
+            Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]),
+            Job.run_after <= now,
+            sa.or_(Job.locked_until.is_(None), Job.locked_until < now),
+        )
+        candidates = await db.scalars(
+            select(Job.id).where(claimable).order_by(Job.run_after, Job.id).limit(5).with_for_update(skip_locked=True)
+        )
+
+        # the conditional UPDATE is what actually takes the lease, so this is also safe
+        # on databases without SKIP LOCKED (SQLite)
+        for job_id in candidates.all():
+            claimed = await db.execute(
+                sa.update(Job).where(Job.id == job_id, claimable).values(
+                    status=JobStatus.RUNNING,
+                    locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                )
+            )
+            if claimed.rowcount == 1:
+                await db.commit()
+                return await db.get(Job, job_id, populate_existing=True)
+
+        await db.commit()
+        return None
+
+    def release(self, job: Job) -> None:
+        job.locked_by = None
+        job.locked_until = None
+        job.run_after = _utcnow()
+
+    def succeed(self, job: Job) -> None:
+        job.status = JobStatus.SUCCEEDED
+        job.locked_by = None
+        job.locked_until = None
+        job.error = None
+        job.finished_at = _utcnow()
+
+    async def fail(self, db: AsyncSession, job_id: int, error: str, permanent: bool) -> None:
+        job = await db.get(Job, job_id, populate_existing=True)
+        if job is None:
+            return
+
+        job.attempts = (job.attempts or 0) + 1
+        job.error = error
+        job.locked_by = None
+        job.locked_until = None
+        if permanent or job.attempts >= job.max_attempts:
+            job.status = JobStatus.FAILED
+            job.finished_at = _utcnow()
+            logging.error(f"Job {job.id} ({job.kind}) failed: {error}")
+        else:
+            job.run_after = _utcnow() + timedelta(seconds=JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+            logging.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying: {error}")
+        await db.commit()
+
+
+_job_service = JobService()
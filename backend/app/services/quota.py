@@ -0,0 +1,76 @@
+from typing import List
+import sqlalchemy as sa
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from app.core.config import DEFAULT_STORAGE_QUOTA_BYTES
+from app.database.models import File, User
+from app.schemas.user import StorageUsageResponse
+
+
+def _effective_quota():
+    return sa.func.coalesce(User.storage_quota, DEFAULT_STORAGE_QUOTA_BYTES)
+
+
+class QuotaService:
+    """Keeps user_account.storage_used in step with the files table.
+
+    Every method only issues statements; the caller commits, so the counter changes in
+    the same transaction as the file rows it accounts for.
+    """
+
+    async def reserve(self, db: AsyncSession, user_id: int, size: int) -> None:
+        # one conditional UPDATE checks and books the space, so concurrent tickets can't overshoot
+        used = await db.scalar(
+            sa.update(User)
+            .where(
+                User.id == user_id,
+                sa.or_(_effective_quota() == 0, User.storage_used + size <= _effective_quota())
+            )
+            .values(storage_used=User.storage_used + size)
+            .returning(User.storage_used)
+            .execution_options(synchronize_session=False)
+        )
+        if used is None:
+            raise HTTPException(507, "Storage quota exceeded")
+
+    async def release(self, db: AsyncSession, user_id: int, size: int) -> None:
+        if not size:
+            return
+        await db.execute(
+            sa.update(User)
+            .where(User.id == user_id)
+            .values(storage_used=sa.case((User.storage_used > size, User.storage_used - size), else_=0))
+            .execution_options(synchronize_session=False)
+        )
+
+    async def get_usage(self, db: AsyncSession, user_id: int) -> StorageUsageResponse:
+        row = (await db.execute(
+            select(User.storage_used, _effective_quota().label("quota")).where(User.id == user_id)
+        )).one_or_none()
+        if row is None:
+            raise HTTPException(404, "User not found")
+
+        quota = row.quota or None
+        return StorageUsageResponse(
+            used=row.storage_used or 0,
+            quota=quota,
+            available=max(quota - (row.storage_used or 0), 0) if quota else None
+        )
+
+    async def reconcile(self, db: AsyncSession, user_ids: List[int]) -> int:
+        """Recompute the counter of the given users from the files table; returns how many were off."""
+        actual = sa.func.coalesce(
+            select(sa.func.sum(File.size)).where(File.owner_id == User.id).correlate(User).scalar_subquery(),
+            0
+        )
+        result = await db.execute(
+            sa.update(User)
+            .where(User.id.in_(user_ids), User.storage_used != actual)
+            .values(storage_used=actual)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount or 0
+
+
+_quota_service = QuotaService()
@@ -0,0 +1,393 @@
+import base64
+import itertools
+import json
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Tuple
+import sqlalchemy as sa
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from app.core.cache import TTLCache
+from app.core.config import SEARCH_INDEX_MAX_OWNERS, SEARCH_INDEX_TTL_SECONDS
+from app.database.models import File, FileStatus, Folder
+from app.schemas.drive import Breadcrumb, SearchParams, SearchResponse, SearchResult, SearchResultType
+from app.schemas.user import AuthenticatedUser
+from app.services.drive import _drive_service
+
+class _Hit(NamedTuple):
+    type: str
+    id: int
+    name: str
+    parent_id: int | None
+    size: int | None
+    mime_type: str | None
+    status: FileStatus | None
+    date: datetime | None
+    score: float = 0.0
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _windows(text: str) -> set:
+    # every 3-character substring: a name contains the query only if it has all of the query's
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _word_trigrams(text: str) -> set:
+    # pg_trgm's trigrams: each alphanumeric word padded with two spaces in front and one behind
+    grams = set()
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _similarity(name: str, query: str) -> float:
+    a, b = _word_trigrams(name), _word_trigrams(query)
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class _OwnerNameIndex:
+    """Trigram inverted index over one user's file and folder names."""
+
+    def __init__(self, entries: List[_Hit]):
+        self.entries = entries
+        self.names = [entry.name.lower() for entry in entries]
+        self.postings: Dict[str, set] = defaultdict(set)
+        for position, name in enumerate(self.names):
+            for gram in _windows(name):
+                self.postings[gram].add(position)
+
+    def matches(self, query: str):
+        if len(query) < 3:
+            # too short for a trigram: prefix matches only, like the database path
+            return (entry for entry, name in zip(self.entries, self.names) if name.startswith(query))
+        postings = sorted((self.postings.get(gram, set()) for gram in _windows(query)), key=len)
+        return (self.entries[position] for position in set.intersection(*postings) if query in self.names[position])
+
+
+class SearchService:
+    def __init__(self):
+        self.trigram_enabled = False
+        # per-owner indexes for databases without pg_trgm; dropped on writes and after the TTL
+        self._indexes = TTLCache(maxsize=SEARCH_INDEX_MAX_OWNERS, ttl=SEARCH_INDEX_TTL_SECONDS)
+        self._listening = False
+
+    async def detect_trigram(self, engine: AsyncEngine) -> None:
+        # pg_trgm and the search indexes are installed by migration 6 (search_indexes)
+        if engine.dialect.name != "postgresql":
+            return
+        async with engine.connect() as connection:
+            installed = await connection.scalar(sa.text("SELECT count(*) FROM pg_extension WHERE extname = 'pg_trgm'"))
+        self.trigram_enabled = bool(installed)
+        if not self.trigram_enabled:
+            logging.warning("pg_trgm is not installed, search falls back to unindexed ILIKE without similarity ranking")
+
+    async def search(self, params: SearchParams, db: AsyncSession, current_user: AuthenticatedUser) -> SearchResponse:
+        subtree = None
+        if params.folder_id is not None:
+            subtree = await db.get(Folder, params.folder_id)
+            if not subtree:
+                raise HTTPException(404, "Folder not found")
+            if subtree.owner_id != current_user.id:
+                raise HTTPException(403, "Not authorized for this folder")
+
+        after = _decode_cursor(params.cursor, params.q) if params.cursor else None
+
+        if db.get_bind().dialect.name == "postgresql":
+            hits = await self._search_database(db, current_user.id, params, subtree, after)
+        else:
+            hits = await self._search_index(db, current_user.id, params, subtree, after)
+
+        next_cursor = None
+        if len(hits) > params.limit:
+            hits = hits[:params.limit]
+            next_cursor = _encode_cursor(params.q, hits[-1])
+
+        paths = await self._resolve_paths(db, current_user.id, {hit.parent_id for hit in hits})
+        return SearchResponse(
+            results=[
+                SearchResult(
+                    type=SearchResultType(hit.type),
+                    id=hit.id,
+                    name=hit.name,
+                    score=round(hit.score, 6),
+                    folder_id=hit.parent_id,
+                    size=hit.size,
+                    mime_type=hit.mime_type,
+                    status=hit.status,
+                    modified_at=hit.date,
+                    path=paths.get(hit.parent_id, paths[None])
+                )
+                for hit in hits
+            ],
+            next_cursor=next_cursor
+        )
+
+    @staticmethod
+    def _include(params: SearchParams) -> Tuple[bool, bool]:
+        file_only_filters = params.mime_type is not None or params.min_size is not None or params.max_size is not None
+        include_files = params.type in (None, SearchResultType.FILE)
+        include_folders = params.type in (None, SearchResultType.FOLDER) and not file_only_filters
+        return include_files, include_folders
+
+    # Postgres: pg_trgm
+
+    def _match(self, column, query: str):
+        if len(query) < 3:
+            return sa.func.lower(column).like(_escape_like(query) + "%", escape="\\")
+        return column.ilike(f"%{_escape_like(query)}%", escape="\\")
+
+    def _score(self, column, query: str):
+        prefix = sa.case((sa.func.lower(column).like(_escape_like(query) + "%", escape="\\"), 1.0), else_=0.0)
+        if self.trigram_enabled:
+            return sa.cast(prefix + sa.func.similarity(column, query), sa.Float)
+        return sa.cast(prefix, sa.Float)
+
+    async def _search_database(self, db: AsyncSession, user_id: int, params: SearchParams, subtree: Folder | None, after: tuple | None) -> List[_Hit]:
+        include_files, include_folders = self._include(params)
+        query = params.q
+        selects = []
+
+        if include_files:
+            files = select(
+                sa.literal("file").label("type"),
+                File.id,
+                File.name,
+                File.folder_id.label("parent_id"),
+                File.size,
+                File.mime_type,
+                File.status,
+                File.uploaded_at.label("date"),
+                self._score(File.name, query).label("score")
+            ).where(
+                File.owner_id == user_id,
+                File.status == FileStatus.UPLOADED,
+                self._match(File.name, query)
+            )
+            if params.mime_type is not None:
+                files = files.where(
+                    File.mime_type.startswith(params.mime_type, autoescape=True) if params.mime_type.endswith("/")
+                    else File.mime_type == params.mime_type
+                )
+            if params.min_size is not None:
+                files = files.where(File.size >= params.min_size)
+            if params.max_size is not None:
+                files = files.where(File.size <= params.max_size)
+            if params.modified_after is not None:
+                files = files.where(File.uploaded_at >= params.modified_after)
+            if params.modified_before is not None:
+                files = files.where(File.uploaded_at < params.modified_before)
+            if subtree is not None:
+                files = files.where(File.folder_id.in_(_drive_service._subtree_folders(subtree.path, user_id)))
+            selects.append(files)
+
+        if include_folders:
+            folders = select(
+                sa.literal("folder").label("type"),
+                Folder.id,
+                Folder.name,
+                Folder.parent_folder_id.label("parent_id"),
+                sa.cast(sa.null(), sa.BigInteger).label("size"),
+                sa.cast(sa.null(), sa.String).label("mime_type"),
+                sa.cast(sa.null(), File.status.type).label("status"),
+                Folder.created_at.label("date"),
+                self._score(Folder.name, query).label("score")
+            ).where(
+                Folder.owner_id == user_id,
+                self._match(Folder.name, query)
+            )
+            if params.modified_after is not None:
+                folders = folders.where(Folder.created_at >= params.modified_after)
+            if params.modified_before is not None:
+                folders = folders.where(Folder.created_at < params.modified_before)
+            if subtree is not None:
+                folders = folders.where(Folder.path.like(f"{subtree.path}%"), Folder.id != subtree.id)
+            selects.append(folders)
+
+        if not selects:
+            return []
+
+        hits = (sa.union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+        ranked = select(hits).order_by(hits.c.score.desc(), hits.c.type, hits.c.id).limit(params.limit + 1)
+        if after is not None:
+            score, kind, last_id = after
+            ranked = ranked.where(sa.or_(
+                hits.c.score < score,
+                sa.and_(hits.c.score == score, sa.tuple_(hits.c.type, hits.c.id) > (kind, last_id))
+            ))
+
+        return [_Hit(*row) for row in (await db.execute(ranked)).all()]
+
+    # Everything else (SQLite dev): in-process trigram index
+
+    async def _search_index(self, db: AsyncSession, user_id: int, params: SearchParams, subtree: Folder | None, after: tuple | None) -> List[_Hit]:
+        include_files, include_folders = self._include(params)
+        index = await self._get_index(db, user_id)
+
+        subtree_ids = None
+        if subtree is not None:
+            subtree_ids = set((await db.scalars(_drive_service._subtree_folders(subtree.path, user_id))).all())
+
+        modified_after, modified_before = _as_utc(params.modified_after), _as_utc(params.modified_before)
+        hits = []
+        for entry in index.matches(params.q):
+            if entry.type == "file":
+                if not include_files:
+                    continue
+                if params.mime_type is not None and not (
+                    entry.mime_type.startswith(params.mime_type) if params.mime_type.endswith("/") else entry.mime_type == params.mime_type
+                ):
+                    continue
+                if params.min_size is not None and entry.size < params.min_size:
+                    continue
+                if params.max_size is not None and entry.size > params.max_size:
+                    continue
+                if subtree_ids is not None and entry.parent_id not in subtree_ids:
+                    continue
+            else:
+                if not include_folders:
+                    continue
+                if subtree_ids is not None and (entry.id not in subtree_ids or entry.id == subtree.id):
+                    continue
+
+            date = _as_utc(entry.date)
+            if modified_after is not None and (date is None or date < modified_after):
+                continue
+            if modified_before is not None and (date is None or date >= modified_before):
+                continue
+
+            score = (1.0 if entry.name.lower().startswith(params.q) else 0.0) + _similarity(entry.name, params.q)
+            hits.append(entry._replace(score=score))
+
+        hits.sort(key=lambda hit: (-hit.score, hit.type, hit.id))
+        if after is not None:
+            score, kind, last_id = after
+            hits = [hit for hit in hits if hit.score < score or (hit.score == score and (hit.type, hit.id) > (kind, last_id))]
+        return hits[:params.limit + 1]
+
+    async def _get_index(self, db: AsyncSession, user_id: int) -> _OwnerNameIndex:
+        self._install_invalidation()
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        files = (await db.execute(
+            select(File.id, File.name, File.folder_id, File.size, File.mime_type, File.status, File.uploaded_at)
+            .where(File.owner_id == user_id, File.status == FileStatus.UPLOADED)
+        )).all()
+        folders = (await db.execute(
+            select(Folder.id, Folder.name, Folder.parent_folder_id, Folder.created_at).where(Folder.owner_id == user_id)
+        )).all()
+
+        index = _OwnerNameIndex(
+            [_Hit("file", *row) for row in files]
+            + [_Hit("folder", row.id, row.name, row.parent_folder_id, None, None, None, row.created_at) for row in folders]
+        )
+        self._indexes.set(user_id, index)
+        return index
+
+    def _install_invalidation(self) -> None:
+        if self._listening:
+            return
+        self._listening = True
+
+        # owners are dropped at flush and again at commit, so an index rebuilt in between
+        # from the old rows doesn't outlive the transaction that changed them
+        def _after_commit(session: Session) -> None:
+            if session.info.pop("search_all", False):
+                self._indexes.clear()
+            for owner_id in session.info.pop("search_owners", set()):
+                self._indexes.pop(owner_id)
+
+        def _after_rollback(session: Session) -> None:
+            session.info.pop("search_all", None)
+            session.info.pop("search_owners", None)
+
+        def _after_flush(session: Session, flush_context) -> None:
+            owners = set()
+            for obj in itertools.chain(session.new, session.dirty, session.deleted):
+                if isinstance(obj, (File, Folder)):
+                    # read from the instance dict: an expired attribute can't be loaded here
+                    owners.add(sa.inspect(obj).dict.get("owner_id"))
+            if None in owners:
+                self._indexes.clear()
+                session.info["search_all"] = True
+            for owner_id in owners - {None}:
+                self._indexes.pop(owner_id)
+            session.info.setdefault("search_owners", set()).update(owners - {None})
+
+        def _do_orm_execute(state) -> None:
+            # bulk UPDATE/DELETE statements don't say which owners they touch
+            if (state.is_update or state.is_delete or state.is_insert) and any(
+                mapper.class_ in (File, Folder) for mapper in state.all_mappers
+            ):
+                self._indexes.clear()
+                state.session.info["search_all"] = True
+
+        event.listen(Session, "after_flush", _after_flush)
+        event.listen(Session, "do_orm_execute", _do_orm_execute)
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
+
+    async def _resolve_paths(self, db: AsyncSession, user_id: int, parent_ids: set) -> Dict[int | None, List[Breadcrumb]]:
+        """Breadcrumbs for every containing folder of a result page, in two queries."""
+        root = Breadcrumb(id=None, name="Root")
+        paths: Dict[int | None, List[Breadcrumb]] = {None: [root]}
+        folder_ids = [folder_id for folder_id in parent_ids if folder_id is not None]
+        if not folder_ids:
+            return paths
+
+        folder_paths = {
+            row.id: [int(part) for part in row.path.strip("/").split("/")]
+            for row in (await db.execute(select(Folder.id, Folder.path).where(
+                Folder.id.in_(folder_ids),
+                Folder.owner_id == user_id
+            ))).all()
+            if row.path
+        }
+        ancestor_ids = set(itertools.chain.from_iterable(folder_paths.values()))
+        names = {
+            row.id: row.name
+            for row in (await db.execute(select(Folder.id, Folder.name).where(
+                Folder.id.in_(ancestor_ids),
+                Folder.owner_id == user_id
+            ))).all()
+        }
+
+        for folder_id, ancestors in folder_paths.items():
+            paths[folder_id] = [root] + [Breadcrumb(id=ancestor, name=names[ancestor]) for ancestor in ancestors if ancestor in names]
+        return paths
+
+
+def _encode_cursor(query: str, hit: _Hit) -> str:
+    payload = {"q": query, "s": hit.score, "t": hit.type, "i": hit.id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, query: str) -> tuple:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        after = (float(payload["s"]), str(payload["t"]), int(payload["i"]))
+    except Exception:
+        raise HTTPException(400, "Invalid cursor")
+    if payload.get("q") != query:
+        raise HTTPException(400, "Cursor does not match the search query")
+    return after
+
+
+_search_service = SearchService()
@@ -0,0 +1,142 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from fastapi import HTTPException
+from minio import Minio
+from minio.error import S3Error
+from app.core.config import (
+    PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES,
+    THUMBNAIL_MAX_PIXELS,
+    THUMBNAIL_MAX_SOURCE_BYTES,
+    THUMBNAIL_MIME_TYPES,
+    THUMBNAIL_PROCESSES,
+    THUMBNAIL_QUALITY,
+    THUMBNAIL_SIZES,
+    THUMBNAILS_ENABLED,
+)
+from app.core.imaging import UnsupportedImage, render_thumbnails
+from app.database.models import File
+from app.schemas.drive import FileStatus, parse_thumbnail_sizes
+from app.schemas.user import AuthenticatedUser
+from app.services.drive import _drive_service, download_url_cache, thumbnail_object_name
+
+
+def _read_object(minio: Minio, bucket_name: str, object_name: str) -> bytes:
+    response = minio.get_object(bucket_name, object_name)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+class ThumbnailService:
+    """Renders image thumbnails in a process pool, off the event loop and the GIL.
+
+    Each worker process keeps at most two sources per render process in flight (one
+    rendering, one downloaded and waiting); further work waits for a slot instead of
+    piling source images up in memory.
+    """
+
+    def __init__(self):
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots = asyncio.Semaphore(max(THUMBNAIL_PROCESSES, 1) * 2)
+
+    @staticmethod
+    def supports(mime_type: str, size: int) -> bool:
+        return THUMBNAILS_ENABLED and bool(THUMBNAIL_SIZES) and mime_type in THUMBNAIL_MIME_TYPES and size <= THUMBNAIL_MAX_SOURCE_BYTES
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawned, not forked: a fork of a process running an event loop and threads is not safe
+            self._pool = ProcessPoolExecutor(max_workers=max(THUMBNAIL_PROCESSES, 1), mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def generate(self, minio: Minio, object_name: str) -> str:
+        """Render and store every configured size for one object; returns the value for File.thumbnail_sizes.
+
+        Derived keys only depend on the source object, so running this again after a
+        failure overwrites the same objects.
+        """
+        async with self._slots:
+            try:
+                data = await _drive_service._storage_call(
+                    _read_object, minio, _drive_service.BUCKET_NAME, object_name, operation="get_object"
+                )
+            except S3Error as e:
+                if e.code != "NoSuchKey":
+                    raise
+                logging.warning(f"Thumbnail source {object_name} is missing")
+                return ""
+
+            loop = asyncio.get_running_loop()
+            try:
+                rendered = await loop.run_in_executor(
+                    self._executor(), render_thumbnails, data, THUMBNAIL_SIZES, THUMBNAIL_QUALITY, THUMBNAIL_MAX_PIXELS
+                )
+            except UnsupportedImage as e:
+                logging.info(f"No thumbnails for {object_name}: {e}")
+                return ""
+            except BrokenProcessPool:
+                # a render process died (out of memory, a crashing decoder); start a fresh pool for the retry
+                self.shutdown()
+                raise
+            del data
+
+        for size, thumbnail in rendered.items():
+            await _drive_service._storage_call(
+                minio.put_object,
+                _drive_service.BUCKET_NAME,
+                thumbnail_object_name(object_name, size),
+                io.BytesIO(thumbnail),
+                len(thumbnail),
+                content_type="image/webp",
+                operation="put_object"
+            )
+        return ",".join(str(size) for size in sorted(rendered))
+
+    async def get_thumbnail_url(self, file_id: int, size: int, db: AsyncSession, minio: Minio, current_user: AuthenticatedUser) -> Tuple[str, int]:
+        """A presigned URL for one thumbnail and how many seconds a client may keep reusing it."""
+        file = await db.get(File, file_id, options=[joinedload(File.blob)])
+        if not file:
+            raise HTTPException(404, "File not found")
+        if file.owner_id != current_user.id:
+            raise HTTPException(403, "Not authorized for this file")
+        if file.status != FileStatus.UPLOADED or size not in parse_thumbnail_sizes(file.thumbnail_sizes):
+            raise HTTPException(404, "Thumbnail not found")
+
+        now = datetime.now(timezone.utc)
+        object_name = thumbnail_object_name(file.object_name, size)
+        cached = download_url_cache.get((file.id, size))
+        if cached is not None and cached[2] == object_name:
+            url, expires_at = cached[0], cached[1]
+        else:
+            expires = timedelta(minutes=PRESIGNED_DOWNLOAD_URL_EXPIRES_MINUTES)
+            try:
+                url = await _drive_service._storage_call(
+                    minio.presigned_get_object, _drive_service.BUCKET_NAME, object_name, expires, operation="presign_get",
+                    breaker=False
+                )
+            except S3Error:
+                raise HTTPException(503, "Object storage unavailable")
+            url = _drive_service._to_public_storage_url(url)
+            expires_at = now + expires
+            download_url_cache.set((file.id, size), (url, expires_at, object_name))
+
+        # browsers may cache the redirect only while the URL it points to stays valid
+        return url, max(int((expires_at - now).total_seconds() / 2), 0)
+
+
+_thumbnail_service = ThumbnailService()
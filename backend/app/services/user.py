@@ -1,29 +1,51 @@
 from app.schemas.user import UserCreate, UserResponse
 from app.database.models import User
 from app.core.security import get_password_hash
-from sqlalchemy.orm import Session
+from app.core.principal_cache import principal_cache
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 from fastapi import HTTPException
 
+_STALE_PRINCIPALS = "stale_principal_ids"
+
+# Cached principals are dropped once a change to the user row is committed.
+# Bulk UPDATE statements bypass these hooks and must call principal_cache.invalidate_user themselves.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_principal_stale(mapper, connection, target: User):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_STALE_PRINCIPALS, set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stale_principals(session: Session):
+    for user_id in session.info.pop(_STALE_PRINCIPALS, ()):
+        principal_cache.invalidate_user_nowait(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_stale_principals(session: Session):
+    session.info.pop(_STALE_PRINCIPALS, None)
+
 class UserService:
-    def get_user(self, user_id: int, db: Session) -> User | None:
-        return db.query(User).filter(User.id == user_id).first()
+    async def get_user(self, user_id: int, db: AsyncSession) -> User | None:
+        return await db.get(User, user_id)
 
-    def create_user(self, user_data: UserCreate, db: Session) -> User:
-        if db.query(User).filter(User.email == user_data.email).first():
+    async def create_user(self, user_data: UserCreate, db: AsyncSession) -> User:
+        if await db.scalar(select(User.id).where(User.email == user_data.email)):
             raise HTTPException(status_code=400, detail="Email already registered")
-        if db.query(User).filter(User.username == user_data.username).first():
+        if await db.scalar(select(User.id).where(User.username == user_data.username)):
             raise HTTPException(status_code=400, detail="Username already taken")
-
         db_user = User(
             username=user_data.username,
             email=user_data.email,
-            password_hash=get_password_hash(user_data.password)
+            password_hash=await get_password_hash(user_data.password, db)
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
 
         return UserResponse.model_validate(db_user)
 
-_user_service = UserService()
\ No newline at end of file
+_user_service = UserService()
@@ -0,0 +1,150 @@
+"""Background job worker.
+
+Runs inside the API process when JOB_RUN_IN_PROCESS is enabled, or standalone:
+
+    python -m app.worker
+    python -m app.worker --reconcile-quotas   # queue a storage usage recount for all users and exit
+    python -m app.worker --gc [--dry-run]     # queue a storage garbage collection run and exit
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Callable, List
+
+from fastapi import HTTPException
+from minio import Minio
+
+from app.core.config import GC_INTERVAL_MINUTES, JOB_POLL_INTERVAL_SECONDS, JOB_WORKER_CONCURRENCY
+from app.database.database import SessionLocal, engine
+from app.database.migrations import check_schema
+from app.database.minio import init_bulk_minio_client
+from app.services.job import JOB_HANDLERS, JobContext, QuotaReconcileJob, StorageGCJob, _job_service
+from app.services.thumbnail import _thumbnail_service
+
+
+class JobWorkerPool:
+    def __init__(
+        self,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        session_factory=SessionLocal,
+        minio_factory: Callable[[], Minio] = init_bulk_minio_client,
+        poll_interval: float = JOB_POLL_INTERVAL_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.session_factory = session_factory
+        self.minio_factory = minio_factory
+        self.poll_interval = poll_interval
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._loop(f"{self.worker_prefix}:{index}"))
+            for index in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        # a cancelled chunk is rolled back; its lease expires and another worker picks the job up
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        _thumbnail_service.shutdown()
+
+    async def run_forever(self) -> None:
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    async def _loop(self, worker_id: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                ran = await self.run_once(worker_id)
+            except Exception:
+                logging.exception("Job worker loop error")
+                ran = False
+
+            if not ran:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self, worker_id: str) -> bool:
+        """Claim one job and run a single chunk of it. Returns False when the queue is empty."""
+        async with self.session_factory() as db:
+            job = await _job_service.claim_next(db, worker_id)
+            if job is None:
+                return False
+
+            job_id = job.id
+            handler = JOB_HANDLERS.get(job.kind)
+            if handler is None:
+                await _job_service.fail(db, job_id, f"Unknown job kind: {job.kind}", permanent=True)
+                return True
+
+            try:
+                done = await handler.run_chunk(job, JobContext(db, self.minio_factory))
+            except HTTPException as exc:
+                await db.rollback()
+                # client-style errors (missing folder, bad move target) will not fix themselves on retry
+                await _job_service.fail(db, job_id, str(exc.detail), permanent=exc.status_code < 500)
+                return True
+            except Exception as exc:
+                await db.rollback()
+                await _job_service.fail(db, job_id, str(exc), permanent=False)
+                return True
+
+            if done:
+                _job_service.succeed(job)
+            else:
+                _job_service.release(job)
+            await db.commit()
+            return True
+
+
+async def schedule_periodic_jobs(session_factory=SessionLocal) -> None:
+    if GC_INTERVAL_MINUTES > 0:
+        async with session_factory() as db:
+            job = await _job_service.schedule_storage_gc(db)
+        if job is not None:
+            logging.info(f"Scheduled storage GC job {job.id} for {job.run_after.isoformat()}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Drivium background job worker")
+    parser.add_argument("--reconcile-quotas", action="store_true", help="queue a storage usage recount for all users and exit")
+    parser.add_argument("--gc", action="store_true", help="queue a storage garbage collection run and exit")
+    parser.add_argument("--dry-run", action="store_true", help="with --gc: only report what would be removed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    await check_schema(engine)
+    if args.reconcile_quotas:
+        async with SessionLocal() as db:
+            job = await _job_service.enqueue(db, QuotaReconcileJob.kind, {})
+        logging.info(f"Queued quota reconciliation job {job.id}")
+        return
+    if args.gc:
+        async with SessionLocal() as db:
+            job = await _job_service.enqueue(db, StorageGCJob.kind, {"dry_run": args.dry_run})
+        logging.info(f"Queued storage GC job {job.id}{' (dry run)' if args.dry_run else ''}")
+        return
+
+    await schedule_periodic_jobs()
+
+    pool = JobWorkerPool()
+    logging.info(f"Job worker started with {pool.concurrency} slots")
+    await pool.run_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Throughput benchmark: /drive/folders/{id}/archive over a tree of many small files.
+
+Runs against a live backend (requires ``httpx``). The tree is uploaded through the
+batch API and the presigned URLs, so ``--storage-base`` must reach MinIO the way a
+browser would (e.g. ``http://localhost`` through nginx):
+
+    python scripts/bench_archive.py --base-url http://localhost:8000 \
+        --storage-base http://localhost --files 5000 --file-size 4096 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+
+BATCH_SIZE = 500
+
+
+async def _login(client: httpx.AsyncClient) -> dict[str, str]:
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+    password = "benchmark-password"
+    response = await client.post(
+        "/users/register",
+        json={"username": username, "email": f"{username}@example.com", "password": password},
+    )
+    response.raise_for_status()
+    response = await client.post("/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _build_tree(client, storage, headers, args) -> int:
+    response = await client.post("/drive/folders", json={"name": "archive-bench", "parent_folder_id": None}, headers=headers)
+    response.raise_for_status()
+    root_id = response.json()["id"]
+
+    body = os.urandom(args.file_size)
+    uploads = asyncio.Semaphore(args.concurrency)
+
+    async def put(url: str) -> None:
+        async with uploads:
+            (await storage.put(url, content=body)).raise_for_status()
+
+    started = time.perf_counter()
+    for offset in range(0, args.files, BATCH_SIZE):
+        items = [
+            {
+                "name": f"file_{n}.bin",
+                "size": len(body),
+                "mime_type": "application/octet-stream",
+                "relative_path": f"dir_{n % args.folders}",
+            }
+            for n in range(offset, min(offset + BATCH_SIZE, args.files))
+        ]
+        response = await client.post("/drive/files/batch", json={"folder_id": root_id, "files": items}, headers=headers)
+        response.raise_for_status()
+        tickets = response.json()["files"]
+        await asyncio.gather(*(put(ticket["presigned_url"]) for ticket in tickets))
+        response = await client.patch(
+            "/drive/files/batch/upload-confirm",
+            json={"file_ids": [ticket["file_id"] for ticket in tickets], "success": True},
+            headers=headers,
+        )
+        response.raise_for_status()
+        print(f"uploaded {offset + len(items)}/{args.files} files", end="\r")
+    print(f"\nuploaded {args.files} files in {time.perf_counter() - started:.1f}s")
+    return root_id
+
+
+async def _download(client, headers, root_id: int, compression: str) -> tuple[float, float, int]:
+    started = time.perf_counter()
+    first_byte = None
+    received = 0
+    async with client.stream("GET", f"/drive/folders/{root_id}/archive", params={"compression": compression}, headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            received += len(chunk)
+    return time.perf_counter() - started, first_byte or 0.0, received
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=600) as client, \
+            httpx.AsyncClient(base_url=args.storage_base, timeout=60) as storage:
+        headers = await _login(client)
+        root_id = await _build_tree(client, storage, headers, args)
+
+        totals, firsts = [], []
+        for run in range(args.runs):
+            total, first_byte, received = await _download(client, headers, root_id, args.compression)
+            totals.append(total)
+            firsts.append(first_byte)
+            print(
+                f"run {run + 1}: {received / 1e6:8.1f} MB in {total:6.2f}s "
+                f"({received / 1e6 / total:7.1f} MB/s, {args.files / total:8.0f} files/s, "
+                f"first byte {first_byte * 1000:6.0f}ms)"
+            )
+
+    print(
+        f"median: {statistics.median(totals):6.2f}s, {args.files / statistics.median(totals):8.0f} files/s, "
+        f"first byte {statistics.median(firsts) * 1000:6.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--storage-base", default="http://localhost")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--folders", type=int, default=50)
+    parser.add_argument("--file-size", type=int, default=4096)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--compression", choices=("stored", "deflated"), default="stored")
+    parser.add_argument("--runs", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
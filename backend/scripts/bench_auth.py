@@ -0,0 +1,71 @@
+"""Microbenchmark: per-request authentication cost, in process (no server needed).
+
+Times the pieces of ``get_current_user`` for one token: a full decode with each
+available JWT backend, ``verify_token`` with the verified-token cache warm, and the
+whole dependency on a principal cache hit (the path /drive/folders/contents takes):
+
+    cd backend && PYTHONPATH=. python scripts/bench_auth.py --iterations 20000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+
+def _timed(name: str, fn, iterations: int) -> None:
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<34} {elapsed / iterations * 1e6:8.1f} µs/call")
+
+
+async def _timed_async(name: str, fn, iterations: int) -> None:
+    await fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<34} {elapsed / iterations * 1e6:8.1f} µs/call")
+
+
+async def main(args: argparse.Namespace) -> None:
+    from jose import jwt as jose_jwt
+
+    from app.core.config import ALGORITHM, SECRET_KEY
+    from app.core.principal_cache import principal_cache, token_digest
+    from app.core.security import create_access_token, verified_tokens, verify_token
+    from app.dependencies import get_current_user
+    from app.schemas.auth import TokenData
+    from app.schemas.user import AuthenticatedUser
+
+    token = create_access_token(TokenData(username="bench", user_id=1))
+    digest = token_digest(token)
+
+    _timed("decode: python-jose", lambda: TokenData(**jose_jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])), args.iterations)
+    try:
+        import jwt as pyjwt
+    except ImportError:
+        print(f"{'decode: PyJWT':<34} not installed")
+    else:
+        _timed("decode: PyJWT", lambda: TokenData(**pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])), args.iterations)
+
+    def uncached() -> None:
+        verified_tokens.clear()
+        verify_token(token, digest)
+
+    _timed("verify_token, cache cold", uncached, args.iterations)
+    _timed("verify_token, cache warm", lambda: verify_token(token), args.iterations)
+
+    # a principal cache hit never touches the session, so no database is needed
+    await principal_cache.set(1, digest, AuthenticatedUser(id=1, username="bench", email="bench@example.com", is_active=True))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    await _timed_async("get_current_user, both caches warm", lambda: get_current_user(credentials, None), args.iterations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
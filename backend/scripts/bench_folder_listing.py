@@ -0,0 +1,118 @@
+"""Load benchmark: /drive/folders/contents latency while uploads are being confirmed.
+
+Runs against a live backend (requires ``httpx``):
+
+    python scripts/bench_folder_listing.py --base-url http://localhost:8000 \
+        --listers 20 --uploaders 10 --duration 30
+
+Pass ``--storage-base`` (e.g. ``http://localhost``) to also PUT a small body to each
+presigned URL through nginx before confirming it.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _report(name: str, samples: list[float], duration: float) -> None:
+    if not samples:
+        print(f"{name:<10} no samples")
+        return
+    print(
+        f"{name:<10} n={len(samples):<7} rps={len(samples) / duration:8.1f} "
+        f"p50={_percentile(samples, 50):7.1f}ms p95={_percentile(samples, 95):7.1f}ms "
+        f"p99={_percentile(samples, 99):7.1f}ms max={max(samples):7.1f}ms "
+        f"mean={statistics.fmean(samples):7.1f}ms"
+    )
+
+
+async def _login(client: httpx.AsyncClient) -> dict[str, str]:
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+    password = "benchmark-password"
+    response = await client.post(
+        "/users/register",
+        json={"username": username, "email": f"{username}@example.com", "password": password},
+    )
+    response.raise_for_status()
+    response = await client.post("/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _lister(client, headers, deadline, samples, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/drive/folders/contents", headers=headers)
+        if response.status_code == 200:
+            samples.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(response.status_code)
+
+
+async def _uploader(client, storage, headers, deadline, samples, errors):
+    body = b"x" * 1024
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        ticket = await client.post(
+            "/drive/files",
+            json={"name": f"{uuid.uuid4().hex}.txt", "size": len(body), "mime_type": "text/plain"},
+            headers=headers,
+        )
+        if ticket.status_code != 200:
+            errors.append(ticket.status_code)
+            continue
+        if storage is not None:
+            await storage.put(ticket.json()["presigned_url"], content=body)
+        confirm = await client.patch(
+            f"/drive/files/{ticket.json()['file_id']}/upload-confirm",
+            json={"success": True},
+            headers=headers,
+        )
+        if confirm.status_code == 200:
+            samples.append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(confirm.status_code)
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.listers + args.uploaders + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        storage = httpx.AsyncClient(base_url=args.storage_base, timeout=60) if args.storage_base else None
+        headers = await _login(client)
+
+        listing, uploads, errors = [], [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(_lister(client, headers, deadline, listing, errors) for _ in range(args.listers)),
+            *(_uploader(client, storage, headers, deadline, uploads, errors) for _ in range(args.uploaders)),
+        )
+        elapsed = time.perf_counter() - started
+        if storage is not None:
+            await storage.aclose()
+
+    _report("listing", listing, elapsed)
+    _report("upload", uploads, elapsed)
+    if errors:
+        print(f"errors: {len(errors)} (status codes: {sorted(set(errors))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--storage-base", default=None)
+    parser.add_argument("--listers", type=int, default=20)
+    parser.add_argument("--uploaders", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0)
+    asyncio.run(main(parser.parse_args()))
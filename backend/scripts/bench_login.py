@@ -0,0 +1,100 @@
+"""Load benchmark: /auth/login throughput and latency under concurrency.
+
+Runs against a live backend (requires ``httpx``). While ``--clients`` log in as fast
+as they can, a probe hits ``/health/live`` every ``--probe-interval`` seconds; its
+latency shows whether hashing still blocks the event loop for everyone else:
+
+    python scripts/bench_login.py --base-url http://localhost:8000 --clients 32 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _report(name: str, samples: list[float], duration: float) -> None:
+    if not samples:
+        print(f"{name:<14} no samples")
+        return
+    print(
+        f"{name:<14} n={len(samples):<7} rps={len(samples) / duration:8.1f} "
+        f"p50={_percentile(samples, 50):7.1f}ms p95={_percentile(samples, 95):7.1f}ms "
+        f"p99={_percentile(samples, 99):7.1f}ms max={max(samples):7.1f}ms "
+        f"mean={statistics.fmean(samples):7.1f}ms"
+    )
+
+
+async def _register(client: httpx.AsyncClient) -> dict[str, str]:
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+    credentials = {"username": username, "password": "benchmark-password"}
+    response = await client.post("/users/register", json={**credentials, "email": f"{username}@example.com"})
+    response.raise_for_status()
+    return credentials
+
+
+async def _login_loop(client, credentials, deadline, samples, rejected, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.post("/auth/login", json=credentials)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code == 200:
+            samples.append(elapsed)
+        elif response.status_code == 503:
+            # the hashing queue was full; back off the way a client honouring Retry-After would
+            rejected.append(elapsed)
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        else:
+            errors.append(response.status_code)
+
+
+async def _probe_loop(client, deadline, interval, samples):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        (await client.get("/health/live")).raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.clients + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        users = [await _register(client) for _ in range(args.users)]
+
+        samples, rejected, errors, probes = [], [], [], []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            _probe_loop(client, deadline, args.probe_interval, probes),
+            *(
+                _login_loop(client, users[n % len(users)], deadline, samples, rejected, errors)
+                for n in range(args.clients)
+            ),
+        )
+        elapsed = time.perf_counter() - started
+
+    _report("login", samples, elapsed)
+    _report("rejected (503)", rejected, elapsed)
+    _report("probe", probes, elapsed)
+    if errors:
+        print(f"errors: {len(errors)} (status codes: {sorted(set(errors))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--probe-interval", type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""Load benchmark: /drive/search latency over a large seeded file table.
+
+Runs against a live backend on Postgres (requires ``httpx``). ``--seed`` inserts that
+many UPLOADED file rows for the benchmark user straight into the database, through the
+app's own engine and ``DATABASE_URL``; the objects are not created, so don't download them:
+
+    cd backend && PYTHONPATH=. python scripts/bench_search.py --base-url http://localhost:8000 \
+        --seed 10000000 --searchers 10 --duration 30
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+import sqlalchemy as sa
+
+WORDS = ("report", "invoice", "photo", "scan", "backup", "draft", "contract", "budget", "notes", "slides")
+QUERIES = ("report", "inv", "photo 2021", "budget draft", "ntes", "contract_0", "xyzzy")
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _report(name: str, samples: list[float], duration: float) -> None:
+    if not samples:
+        print(f"{name:<14} no samples")
+        return
+    print(
+        f"{name:<14} n={len(samples):<7} rps={len(samples) / duration:8.1f} "
+        f"p50={_percentile(samples, 50):7.1f}ms p95={_percentile(samples, 95):7.1f}ms "
+        f"p99={_percentile(samples, 99):7.1f}ms max={max(samples):7.1f}ms "
+        f"mean={statistics.fmean(samples):7.1f}ms"
+    )
+
+
+async def _login(client: httpx.AsyncClient) -> tuple[dict[str, str], int]:
+    username = f"bench_{uuid.uuid4().hex[:10]}"
+    password = "benchmark-password"
+    response = await client.post(
+        "/users/register",
+        json={"username": username, "email": f"{username}@example.com", "password": password},
+    )
+    response.raise_for_status()
+    user_id = response.json()["id"]
+    response = await client.post("/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}, user_id
+
+
+async def _seed(user_id: int, count: int, batch: int = 100_000) -> None:
+    from app.database.database import engine
+
+    words = "ARRAY[" + ",".join(f"'{word}'" for word in WORDS) + "]"
+    started = time.perf_counter()
+    for offset in range(0, count, batch):
+        size = min(batch, count - offset)
+        async with engine.begin() as connection:
+            await connection.execute(sa.text(f"""
+                INSERT INTO files (owner_id, name, storage_key, size, mime_type, status, uploaded_at)
+                SELECT :owner_id,
+                       ({words})[1 + n % 10] || ' ' || (2015 + n % 10) || '_' || n || '.pdf',
+                       md5(random()::text || n),
+                       1024 + n % 100000,
+                       'application/pdf',
+                       'UPLOADED',
+                       now() - (n % 1000) * interval '1 day'
+                FROM generate_series(:start, :stop) AS n
+            """), {"owner_id": user_id, "start": offset, "stop": offset + size - 1})
+        print(f"seeded {offset + size}/{count} rows", end="\r")
+    async with engine.begin() as connection:
+        await connection.execute(sa.text("ANALYZE files"))
+    await engine.dispose()
+    print(f"\nseeded {count} rows in {time.perf_counter() - started:.1f}s")
+
+
+async def _searcher(client, headers, deadline, samples, errors):
+    while time.perf_counter() < deadline:
+        query = random.choice(QUERIES)
+        started = time.perf_counter()
+        response = await client.get("/drive/search", params={"q": query, "limit": 50}, headers=headers)
+        if response.status_code == 200:
+            samples.setdefault(query, []).append((time.perf_counter() - started) * 1000)
+        else:
+            errors.append(response.status_code)
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.searchers + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        headers, user_id = await _login(client)
+        if args.seed:
+            await _seed(user_id, args.seed)
+
+        samples, errors = {}, []
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(*(_searcher(client, headers, deadline, samples, errors) for _ in range(args.searchers)))
+        elapsed = time.perf_counter() - started
+
+    _report("all", [sample for query in samples.values() for sample in query], elapsed)
+    for query, query_samples in sorted(samples.items()):
+        _report(repr(query), query_samples, elapsed)
+    if errors:
+        print(f"errors: {len(errors)} (status codes: {sorted(set(errors))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--searchers", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,95 @@
+"""Keyset pagination check for folder listings on SQLite, in process (no server needed).
+
+Builds a scratch database the way an older release left it: rows stamped by the
+database's CURRENT_TIMESTAMP sit next to rows stamped by the app, with ties on
+every sort key. Then it migrates the database and pages through a folder two
+entries at a time with ``DriveService.get_folder_content`` for every sort and
+order. Every folder and file must appear exactly once, in the same order as one
+unpaginated listing:
+
+    cd backend && PYTHONPATH=. python scripts/check_listing_pagination.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+PAGE_SIZE = 2
+
+
+async def main() -> int:
+    workdir = tempfile.mkdtemp(prefix="drivium-pages-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'pages.db')}"
+    # configuration is read at import time
+    import sqlalchemy as sa
+
+    from app.database.base import Base
+    from app.database.database import SessionLocal, engine
+    from app.database.migrations import migrate
+    from app.database.models import File, FileStatus, Folder, User
+    from app.schemas.drive import FileSortField, FolderListingParams, SortOrder
+    from app.schemas.user import AuthenticatedUser
+    from app.services.drive import _drive_service
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        user = User(username="pages", email="pages@example.com", password_hash="!")
+        db.add(user)
+        await db.flush()
+        db.add_all([Folder(owner_id=user.id, name=name, path=None) for name in ("b", "a", "a")])
+        await db.commit()
+        # written before uploaded_at was stamped in Python: the server default has no microseconds
+        for n in range(3):
+            await db.execute(sa.text("""
+                INSERT INTO files (owner_id, folder_id, name, storage_key, size, mime_type, status)
+                VALUES (:owner_id, NULL, :name, :key, 10, 'application/octet-stream', 'PENDING')
+            """), {"owner_id": user.id, "name": f"legacy_{n}.bin", "key": f"legacy-{n}"})
+        await db.commit()
+    await migrate()
+
+    async with SessionLocal() as db:
+        confirmed_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+        for n in range(6):
+            db.add(File(
+                owner_id=user.id, name=f"file_{n % 3}.bin", storage_key=f"key-{n}", size=10 * (n % 2),
+                status=FileStatus.UPLOADED if n % 2 else FileStatus.PENDING,
+                # confirmed rows share one timestamp, pending ones take the model default
+                uploaded_at=confirmed_at if n % 2 else None,
+            ))
+        await db.commit()
+
+    current_user = AuthenticatedUser(id=user.id, username="pages", email="pages@example.com", is_active=True)
+    failures = 0
+    async with SessionLocal() as db:
+        for sort in FileSortField:
+            for order in SortOrder:
+                whole = await _drive_service.get_folder_content(db, current_user, None, FolderListingParams(sort=sort, order=order))
+                expected = [("folder", f.id) for f in whole.folders] + [("file", f.id) for f in whole.files]
+
+                seen, cursor, pages = [], None, 0
+                while pages <= len(expected):
+                    page = await _drive_service.get_folder_content(
+                        db, current_user, None, FolderListingParams(sort=sort, order=order, limit=PAGE_SIZE, cursor=cursor)
+                    )
+                    seen += [("folder", f.id) for f in page.folders] + [("file", f.id) for f in page.files]
+                    pages += 1
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        break
+
+                ok = seen == expected and len(set(seen)) == len(seen)
+                failures += not ok
+                print(f"{'ok' if ok else 'FAIL':<5} {sort.value} {order.value}: {len(seen)} of {len(expected)} entries in {pages} pages"
+                      + ("" if ok else f"  <- got {seen}, expected {expected}"))
+
+    await engine.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+    print("every listing pages through each entry exactly once" if not failures else f"{failures} listing(s) paged incorrectly")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,106 @@
+"""Read-replica routing check with two SQLite files, in process (no server or Postgres needed).
+
+A primary and a replica database live in a temporary directory, and "replication"
+is a copy of the primary file onto the replica (SQLite's backup API), so the test
+controls exactly what the replica has. The replica's copy is then edited, which
+shows where each read was served. Checked:
+- reads are served by a replica that has the caller's writes;
+- the caller's own writes are read back from the primary until a replica has them;
+- reads fall back to the primary once the replica lags by more than REPLICA_MAX_LAG_SECONDS.
+
+    cd backend && PYTHONPATH=. python scripts/check_replica_routing.py
+
+Point the same checks at Postgres by running the backend with DATABASE_REPLICA_URLS set
+and watching ``database_replicas`` in /health/stats.
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+MAX_LAG = 1.5
+INTERVAL = 0.1
+
+
+def main() -> int:
+    workdir = tempfile.mkdtemp(prefix="drivium-replicas-")
+    primary_path, replica_path = os.path.join(workdir, "primary.db"), os.path.join(workdir, "replica.db")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{primary_path}",
+        "DATABASE_REPLICA_URLS": f"sqlite:///{replica_path}",
+        "REPLICA_MAX_LAG_SECONDS": str(MAX_LAG),
+        "REPLICA_HEARTBEAT_INTERVAL_SECONDS": str(INTERVAL),
+        "MIGRATE_ON_STARTUP": "true",
+        "JOB_RUN_IN_PROCESS": "false",
+    })
+    # configuration is read at import time
+    from fastapi.testclient import TestClient
+
+    from app.database.replicas import replica_router
+    from app.main import app
+
+    def replicate() -> None:
+        # everything committed on the primary so far, heartbeat included, reaches the replica
+        time.sleep(INTERVAL * 3)
+        with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+            source.backup(target)
+        time.sleep(INTERVAL * 3)
+
+    def on_replica(sql: str, *params) -> None:
+        with sqlite3.connect(replica_path) as connection:
+            connection.execute(sql, params)
+
+    failures = []
+
+    def check(name: str, ok: bool, detail: object = "") -> None:
+        print(f"{'ok' if ok else 'FAIL':<5} {name}" + (f"  ({detail})" if not ok and detail != "" else ""))
+        if not ok:
+            failures.append(name)
+
+    with TestClient(app) as client:
+        credentials = {"username": "replica_check", "password": "replica-check-password"}
+        client.post("/users/register", json={**credentials, "email": "replica_check@example.com"}).raise_for_status()
+        token = client.post("/auth/login", json=credentials).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def folder_names() -> list[str]:
+            response = client.get("/drive/folders/contents", headers=headers)
+            response.raise_for_status()
+            return [folder["name"] for folder in response.json()["folders"]]
+
+        before = replica_router.stats()
+        check("/users/me right after sign-up is served by the primary", client.get("/users/me", headers=headers).status_code == 200)
+        check("  (the replica is empty, so the read was not routed there)", replica_router.stats()["replica_reads"] == before["replica_reads"])
+
+        client.post("/drive/folders", json={"name": "docs"}, headers=headers).raise_for_status()
+        replicate()
+        on_replica("UPDATE folders SET name = 'docs (replica)' WHERE name = 'docs'")
+        names = folder_names()
+        check("caught-up replica serves the listing", names == ["docs (replica)"], names)
+
+        client.post("/drive/folders", json={"name": "photos"}, headers=headers).raise_for_status()
+        names = folder_names()
+        check("own write is read back from the primary", names == ["docs", "photos"], names)
+        check("  (counted as a sticky read)", replica_router.stats()["sticky_reads"] > before["sticky_reads"])
+
+        replicate()
+        on_replica("UPDATE folders SET name = name || ' (replica)'")
+        names = folder_names()
+        check("replica serves again once it has the write", names == ["docs (replica)", "photos (replica)"], names)
+
+        time.sleep(MAX_LAG + INTERVAL * 3)
+        lagging_before = replica_router.stats()["lagging_reads"]
+        names = folder_names()
+        check("lagging replica is skipped", names == ["docs", "photos"], names)
+        check("  (counted as a lagging read)", replica_router.stats()["lagging_reads"] == lagging_before + 1)
+        print(f"routing stats: {replica_router.stats()}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    print("replica routing behaves as expected" if not failures else f"{len(failures)} check(s) failed")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())